@@ -1,11 +1,17 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.db.models import F
+from django.http import HttpResponseRedirect
 from django.urls import reverse
 from django.utils.html import format_html
 from django.contrib.auth.admin import UserAdmin
+from .services import delete_sales, record_movement
 from .models import (
     User, LoginOTP, Category, Supplier, Product,SystemLog,
     Purchase, PurchaseItem,SystemSetting,SystemConfig,
-    SubCategory, Sales, SalesItem, Customer,AppearanceSettings)
+    SubCategory, Sales, SalesItem, Customer,AppearanceSettings,
+    InvoiceSequence, SaleOutbox, StockMovement, PriceRevision, PriceChange,
+    PurchaseOrder, PurchaseOrderItem)
 
 
 # -----------------------------------------------------
@@ -73,8 +79,42 @@ class SubCategoryAdmin(admin.ModelAdmin):
 # 4. PRODUCT
 # -----------------------------------------------------
 
+STALE_PRODUCT = (
+    "This product's stock or details changed since you opened it. "
+    "Reload the page and apply your changes again."
+)
+
+
+class StaleProduct(Exception):
+    pass
+
+
+class ProductAdminForm(forms.ModelForm):
+    """
+    Optimistic concurrency check: quantity is written back as typed, so a
+    form opened before a sale went through would silently undo that sale.
+    Product.version moves with every stock change; a stale form is refused.
+    clean() catches the common case early; ProductAdmin.save_model makes
+    the write itself conditional on the version.
+    """
+
+    class Meta:
+        model = Product
+        fields = "__all__"
+        widgets = {"version": forms.HiddenInput}
+
+    def clean(self):
+        cleaned = super().clean()
+        if self.instance.pk:
+            current = Product.objects.filter(pk=self.instance.pk).values_list("version", flat=True).first()
+            if cleaned.get("version") != current:
+                raise forms.ValidationError(STALE_PRODUCT)
+        return cleaned
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
+    form = ProductAdminForm
     list_display = (
         "product_id", "name", "category", "brand",
         "cost_price", "selling_price", "quantity", "status"
@@ -84,6 +124,29 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ("product_id", "name", "brand", "supplier_name")
     readonly_fields = ("product_id",)
 
+    def changeform_view(self, request, object_id=None, form_url="", extra_context=None):
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except StaleProduct:
+            # raised inside the admin's save transaction, so nothing was written
+            self.message_user(request, STALE_PRODUCT, messages.ERROR)
+            return HttpResponseRedirect(request.path)
+
+    def save_model(self, request, obj, form, change):
+        # keep the stock ledger in step with quantities typed in here
+        before = form.initial.get("quantity", 0) if change else 0
+        if change:
+            # claim the version the form was opened at: a sale or another
+            # admin that got there first (after clean() ran) has moved it on
+            version = form.cleaned_data["version"]
+            claimed = Product.objects.filter(pk=obj.pk, version=version).update(version=F("version") + 1)
+            if not claimed:
+                raise StaleProduct
+            obj.version = version + 1
+        super().save_model(request, obj, form, change)
+        record_movement(obj.pk, obj.quantity - (before or 0),
+                        "ADJUSTMENT" if change else "OPENING", f"admin:{request.user}")
+
 
 # -----------------------------------------------------
 # 5. PURCHASE + PURCHASE ITEM
@@ -106,6 +169,113 @@ class PurchaseAdmin(admin.ModelAdmin):
     search_fields = ("purchase_no", "supplier__supplier_name")
     inlines = [PurchaseItemInline]
 
+
+class PurchaseOrderItemInline(admin.TabularInline):
+    model = PurchaseOrderItem
+    extra = 0
+    fields = ("product", "qty", "unit_cost", "daily_sales", "days_of_cover")
+    readonly_fields = ("daily_sales", "days_of_cover")
+    raw_id_fields = ("product",)
+
+
+@admin.register(PurchaseOrder)
+class PurchaseOrderAdmin(admin.ModelAdmin):
+    # DRAFT orders come from `manage.py suggest_purchase_orders`
+    list_display = ("id", "supplier", "status", "total", "created_at", "notes")
+    list_filter = ("status", "supplier")
+    list_editable = ("status",)
+    date_hierarchy = "created_at"
+    inlines = [PurchaseOrderItemInline]
+
+# -----------------------------------------------------
+# 5b. SALES
+# -----------------------------------------------------
+
+@admin.action(description="Delete selected sales and restore stock")
+def delete_sales_restore_stock(modeladmin, request, queryset):
+    deleted = delete_sales(queryset.values_list("pk", flat=True))
+    modeladmin.message_user(request, f"Deleted {deleted} sales and restored stock.")
+
+
+@admin.register(Sales)
+class SalesAdmin(admin.ModelAdmin):
+    list_display = ("invoice_no", "date", "customer_name", "grand_total", "payment_status")
+    list_filter = ("payment_status", "date")
+    search_fields = ("invoice_no", "customer_name")
+    date_hierarchy = "date"
+    # the built-in delete_selected would skip stock restoration
+    actions = [delete_sales_restore_stock]
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+
+# -----------------------------------------------------
+# 6. INVOICE NUMBERING
+# -----------------------------------------------------
+
+@admin.register(InvoiceSequence)
+class InvoiceSequenceAdmin(admin.ModelAdmin):
+    list_display = ("series", "financial_year", "next_value")
+    list_filter = ("financial_year",)
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "product", "qty", "reason", "reference")
+    list_filter = ("reason",)
+    search_fields = ("product__name", "product__product_id", "reference")
+    date_hierarchy = "created_at"
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PriceRevision)
+class PriceRevisionAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "rule", "value", "category", "subcategory", "brand", "status", "products", "created_by")
+    list_filter = ("rule",)
+    date_hierarchy = "created_at"
+
+    def has_add_permission(self, request):
+        return False   # runs through the Revise Prices page
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PriceChange)
+class PriceChangeAdmin(admin.ModelAdmin):
+    list_display = ("revision", "product", "old_price", "new_price")
+    list_select_related = ("revision", "product")
+    search_fields = ("product__name", "product__product_id")
+    raw_id_fields = ("revision", "product")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SaleOutbox)
+class SaleOutboxAdmin(admin.ModelAdmin):
+    list_display = ("invoice_no", "status", "attempts", "created_at", "processed_at", "sale")
+    list_filter = ("status",)
+    search_fields = ("invoice_no",)
+    readonly_fields = ("payload", "error")
+
 # -----------------------------------------------------
 # 7. LOGIN OTP
 # -----------------------------------------------------
@@ -0,0 +1,169 @@
+# app/catalog.py
+#
+# Process-local product catalogue for barcode scans at the POS (scan()).
+# The sale and purchase forms pick products through the search endpoint
+# instead (templates/product_picker.html), so pages never carry it.
+#
+# Scans only need a handful of product fields, so instead of querying on
+# every scan each worker process keeps one compact copy (a __slots__
+# object per product) and rebuilds it lazily when it goes stale.
+#
+# Staleness is tracked with a version token kept in Django's cache:
+# Product post_save / post_delete (see signals.py) and bulk writers that
+# bypass signals call invalidate(), which bumps it. With a shared cache
+# backend every process sees the bump; with the default local-memory cache
+# only the current one does, which is what runserver needs.
+#
+# Stock moves far more often than the catalogue and goes through set-based
+# UPDATEs that fire no signals, so services.adjust_stock() patches the
+# quantities of the current process in place (apply_stock) rather than
+# throwing the whole catalogue away on every sale; received purchases
+# patch cost prices the same way (apply_costs). Quantities here are a
+# hint for the cashier; posting always works on the database row.
+#
+# A delta arrives after its commit, so a rebuild running at the same time
+# may already have read it. Every stock UPDATE bumps Product.version:
+# entries keep the version they were read at, each delta comes with the
+# version its UPDATE produced, and a delta the entry already includes is
+# skipped.
+
+import threading
+import uuid
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast
+
+from .models import Product
+from .pricing import to_cents
+
+
+VERSION_KEY = "catalog:version"
+DECIMAL_FIELDS = ("cost_price", "selling_price", "discount", "tax")
+
+
+class CatalogEntry:
+    __slots__ = (
+        "id", "product_id", "barcode", "name", "cost_price", "selling_price",
+        "discount", "tax", "quantity", "status", "version",
+    )
+
+    def __init__(self, *values):
+        for field, value in zip(self.__slots__, values):
+            setattr(self, field, value)
+
+    def __str__(self):
+        return self.name
+
+
+class Catalog:
+    def __init__(self):
+        self.version = None
+        self.entries = []      # Product pk order
+        self.by_id = {}
+        self.by_code = {}      # product_id and barcode -> entry, for scanners
+        self._lock = threading.Lock()
+
+    def _current_version(self):
+        return cache.get_or_set(VERSION_KEY, _new_version, timeout=None)
+
+    def _load(self, version):
+        # Prices and tax rates repeat across a catalogue, and turning every
+        # DECIMAL column into a Decimal is most of the cost of a plain
+        # queryset. Read them as floats and convert each distinct value
+        # once; equal values also end up sharing one Decimal object.
+        decimals = {None: None}
+
+        def to_decimal(value):
+            try:
+                return decimals[value]
+            except KeyError:
+                return decimals.setdefault(value, to_cents(Decimal(repr(value))))
+
+        rows = Product.objects.order_by("pk").values_list(
+            "id", "product_id", "barcode", "name",
+            *[Cast(f, FloatField()) for f in DECIMAL_FIELDS],
+            "quantity", "status", "version",
+        )
+        statuses = {}
+        entries = [
+            CatalogEntry(
+                pk, code, barcode, name,
+                to_decimal(cost), to_decimal(price), to_decimal(discount), to_decimal(tax),
+                qty, statuses.setdefault(status, status), row_version,
+            )
+            for pk, code, barcode, name, cost, price, discount, tax, qty, status, row_version
+            in rows.iterator(chunk_size=5000)
+        ]
+        self.by_id = {e.id: e for e in entries}
+        self.by_code = {e.product_id: e for e in entries}
+        self.by_code.update((e.barcode, e) for e in entries if e.barcode)
+        self.entries = entries
+        self.version = version
+
+    def get(self):
+        version = self._current_version()
+        if self.version != version:
+            with self._lock:
+                if self.version != version:
+                    self._load(version)
+        return self
+
+    def apply_stock(self, deltas, versions):
+        """
+        Apply {product pk: qty delta} to the cached quantities. `versions`
+        is {product pk: Product.version written with the delta}; entries
+        read at that version or later already include it.
+        """
+        with self._lock:
+            for pid, delta in deltas.items():
+                entry = self.by_id.get(pid)
+                if entry is not None and entry.version < versions.get(pid, 0):
+                    entry.quantity += delta
+
+    def apply_costs(self, costs):
+        """Apply {product pk: new cost_price} to the cached entries."""
+        with self._lock:
+            for pid, cost in costs.items():
+                entry = self.by_id.get(pid)
+                if entry is not None:
+                    entry.cost_price = cost
+
+
+def _new_version():
+    # A random token rather than a counter: if the cache evicts the key the
+    # next version can never collide with one a process already holds.
+    return uuid.uuid4().hex
+
+
+catalog = Catalog()
+
+
+def get_catalog():
+    return catalog.get()
+
+
+def scan(code):
+    """
+    Resolve a scanned product code or barcode to a CatalogEntry (or None).
+    Normally a dict hit; a product newer than this process's catalogue is
+    found through the unique indexes on product_id and barcode.
+    """
+    code = code.strip()
+    if not code:
+        return None
+    entry = get_catalog().by_code.get(code)
+    if entry is None:
+        row = (
+            Product.objects.filter(Q(product_id=code) | Q(barcode=code))
+            .values_list(*CatalogEntry.__slots__)
+            .first()
+        )
+        entry = CatalogEntry(*row) if row else None
+    return entry
+
+
+def invalidate():
+    """Mark every process's catalogue stale; it is rebuilt on next use."""
+    cache.set(VERSION_KEY, _new_version(), timeout=None)
@@ -0,0 +1,220 @@
+# app/datatable.py
+#
+# Generic JSON data-table endpoint (views.datatable_json) for the big
+# lists: products, suppliers, sales and purchases.
+#
+# Each resource declares what a client may ask for, and nothing else is
+# reachable:
+#
+#   columns    name -> field path; ?columns=a,b picks a subset and only
+#              those fields are SELECTed (values()), so wide text such as
+#              addresses, notes and descriptions never leaves the database
+#              unless asked for
+#   defaults   the columns sent when ?columns= is absent
+#   sorts      name -> indexed field; ?sort=name / -name
+#   filters    name -> how a query-string value narrows the queryset;
+#              every one of them can use an index
+#
+# Pages are keyset pages (pagination.keyset_page) with the usual opaque
+# ?after= cursor. The first page also carries a row count, counted only
+# up to COUNT_CAP rows so it stays cheap on large tables: past the cap
+# it is reported as a lower bound ("exact": false).
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+
+from .models import Product, Purchase, Sales, Supplier
+from .pagination import keyset_page
+
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+COUNT_CAP = 10000
+
+
+class FilterError(ValueError):
+    pass
+
+
+# ---------------------------
+# Filters
+# ---------------------------
+
+def _prefix(field):
+    """
+    Starts-with as a range on the field's index (LIKE could not use it),
+    tried as typed, capitalised and upper-cased (PurchaseSearchForm does
+    the same with numbers).
+    """
+    def apply(qs, value):
+        q = Q()
+        for term in {value, value[:1].upper() + value[1:], value.upper()}:
+            q |= Q(**{f"{field}__gte": term, f"{field}__lt": term + "\uffff"})
+        return qs.filter(q)
+    return apply
+
+
+def _exact(field):
+    """Equality; the value goes through the model field's to_python()."""
+    def apply(qs, value):
+        target = qs.model._meta.get_field(field)
+        if target.is_relation:
+            target = target.target_field
+        try:
+            value = target.to_python(value)
+        except ValidationError:
+            raise FilterError(f"Invalid value for {field}: {value!r}")
+        return qs.filter(**{field: value})
+    return apply
+
+
+def _date(lookup):
+    def apply(qs, value):
+        try:
+            day = qs.model._meta.get_field("date").to_python(value)
+        except ValidationError:
+            day = None
+        if day is None:
+            raise FilterError(f"Invalid date: {value!r}")
+        return qs.filter(**{f"date__{lookup}": day})
+    return apply
+
+
+def _low_stock(qs, value):
+    # served by the partial product_reorder_idx
+    return qs.filter(quantity__lte=F("reorder_level")) if value not in ("", "0", "false") else qs
+
+
+# ---------------------------
+# Resources
+# ---------------------------
+
+RESOURCES = {
+    "products": {
+        "queryset": lambda: Product.objects.all(),
+        "columns": {
+            "id": "id", "code": "product_id", "barcode": "barcode", "name": "name",
+            "category": "category__category_name", "subcategory": "subcategory__subcategory_name",
+            "brand": "brand", "supplier": "supplier_name", "cost_price": "cost_price",
+            "selling_price": "selling_price", "discount": "discount", "tax": "tax",
+            "quantity": "quantity", "reorder_level": "reorder_level", "status": "status",
+            "description": "description", "notes": "notes",
+        },
+        "defaults": ["id", "code", "name", "category", "brand", "selling_price", "quantity", "status"],
+        "sorts": {"name": "name", "code": "product_id", "id": "id"},
+        "default_sort": "name",
+        "filters": {
+            "q": _prefix("name"),
+            "code": _prefix("product_id"),
+            "category": _exact("category"),
+            "subcategory": _exact("subcategory"),
+            "low_stock": _low_stock,
+        },
+    },
+    "suppliers": {
+        "queryset": lambda: Supplier.objects.all(),
+        "columns": {
+            "id": "id", "name": "supplier_name", "company": "company_name", "phone": "phone",
+            "email": "email", "city": "city", "state": "state", "gst": "gst_number",
+            "address": "address", "notes": "notes",
+        },
+        "defaults": ["id", "name", "company", "phone", "email", "city"],
+        "sorts": {"name": "supplier_name", "id": "id"},
+        "default_sort": "name",
+        "filters": {"q": _prefix("supplier_name")},
+    },
+    "sales": {
+        "queryset": lambda: Sales.objects.all(),
+        "columns": {
+            "id": "id", "invoice": "invoice_no", "date": "date", "customer": "customer_name",
+            "subtotal": "subtotal", "tax": "total_tax", "total": "grand_total",
+            "status": "payment_status", "notes": "notes",
+        },
+        "defaults": ["id", "invoice", "date", "customer", "total", "status"],
+        "sorts": {"id": "id", "invoice": "invoice_no"},
+        "default_sort": "-id",
+        "filters": {
+            "q": _prefix("invoice_no"),
+            # sales_date_idx
+            "date_from": _date("gte"),
+            "date_to": _date("lte"),
+        },
+    },
+    "purchases": {
+        "queryset": lambda: Purchase.objects.all(),
+        "columns": {
+            "id": "id", "number": "purchase_no", "date": "date", "supplier_id": "supplier_id",
+            "supplier": "supplier__supplier_name", "subtotal": "subtotal", "tax": "tax_total",
+            "discount": "discount_total", "other_charges": "other_charges", "total": "grand_total",
+            "paid": "amount_paid", "balance": "balance", "status": "payment_status", "notes": "notes",
+        },
+        "defaults": ["id", "number", "date", "supplier", "total", "balance", "status"],
+        "sorts": {"date": "date", "number": "purchase_no"},
+        "default_sort": "-date",
+        # supplier, status and dates each lead one of the purchase_*_idx indexes
+        "filters": {
+            "q": _prefix("purchase_no"),
+            "supplier": _exact("supplier"),
+            "status": _exact("payment_status"),
+            "date_from": _date("gte"),
+            "date_to": _date("lte"),
+        },
+    },
+}
+
+
+# ---------------------------
+# Query
+# ---------------------------
+
+def approximate_count(qs, cap=COUNT_CAP):
+    """Rows in `qs`, counted no further than `cap`: {"count", "exact"}."""
+    n = qs.order_by()[:cap].count()
+    return {"count": n, "exact": n < cap}
+
+
+def table_page(resource, params):
+    """
+    One page of `resource` for the query-string `params` (a QueryDict or
+    dict): {"columns", "sort", "results", "next"} plus "total" on the
+    first page. Raises KeyError for an unknown resource and FilterError /
+    ValueError for bad parameters.
+    """
+    spec = RESOURCES[resource]
+
+    names = [c for c in (params.get("columns") or "").split(",") if c] or spec["defaults"]
+    unknown = [c for c in names if c not in spec["columns"]]
+    if unknown:
+        raise FilterError(f"Unknown column(s): {', '.join(unknown)}")
+
+    sort = params.get("sort") or spec["default_sort"]
+    if sort.lstrip("-") not in spec["sorts"]:
+        raise FilterError(f"Cannot sort by {sort!r}; use one of {', '.join(spec['sorts'])}")
+    key = spec["sorts"][sort.lstrip("-")]
+
+    try:
+        limit = min(max(int(params.get("limit", DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        limit = DEFAULT_LIMIT
+
+    qs = spec["queryset"]()
+    for name, apply in spec["filters"].items():
+        value = (params.get(name) or "").strip()
+        if value:
+            qs = apply(qs, value)
+
+    # the cursor needs the sort key and id, whether or not they were asked for
+    fields = [spec["columns"][c] for c in names]
+    rows, next_cursor = keyset_page(
+        qs.values(*dict.fromkeys(fields + [key, "id"])), key, params.get("after"), limit, sort.startswith("-"),
+    )
+
+    page = {
+        "columns": names,
+        "sort": sort,
+        "results": [{name: row[field] for name, field in zip(names, fields)} for row in rows],
+        "next": next_cursor,
+    }
+    if not params.get("after"):
+        page["total"] = approximate_count(qs)
+    return page
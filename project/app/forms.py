@@ -1,11 +1,13 @@
 from django import forms
+from django.db.models import Q
 from django.contrib.auth import get_user_model
 from django.forms import inlineformset_factory, BaseInlineFormSet
 from django.contrib.auth.forms import UserCreationForm, SetPasswordForm
 from django.utils import timezone
 from .models import (
     Supplier, Product, Category, SubCategory,
-    Purchase, PurchaseItem,Sales, SalesItem,SystemConfig, SystemLog, AppearanceSettings)
+    Purchase, PurchaseItem,Sales, SalesItem,SystemConfig, SystemLog, AppearanceSettings,
+    PriceRevision)
 from .models import Product, Category, SubCategory, Supplier
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
 from django.forms import modelformset_factory
@@ -114,6 +116,7 @@ class ProductForm(forms.ModelForm):
         model = Product
         fields = [
             "product_id",
+            "barcode",
             "name",
             "category",
             "subcategory",
@@ -132,6 +135,7 @@ class ProductForm(forms.ModelForm):
         ]
         widgets = {
             "product_id": forms.TextInput(attrs={"class": "form-control"}),
+            "barcode": forms.TextInput(attrs={"class": "form-control"}),
             "name": forms.TextInput(attrs={"class": "form-control"}),
             "category": forms.Select(attrs={"class": "form-control", "onchange": "this.form.submit()"}),
             "subcategory": forms.Select(attrs={"class": "form-control"}),
@@ -173,6 +177,43 @@ class ProductForm(forms.ModelForm):
             self.fields["subcategory"].queryset = SubCategory.objects.filter(category=self.instance.category)
 
 
+# ============================================
+# BULK PRICE REVISION FORM
+# ============================================
+
+class PriceRevisionForm(forms.ModelForm):
+
+    class Meta:
+        model = PriceRevision
+        fields = ["category", "subcategory", "brand", "status", "rule", "value", "note"]
+        widgets = {
+            "category": forms.Select(attrs={"class": "form-control"}),
+            "subcategory": forms.Select(attrs={"class": "form-control"}),
+            "brand": forms.TextInput(attrs={"class": "form-control"}),
+            "status": forms.Select(attrs={"class": "form-control"}),
+            "rule": forms.Select(attrs={"class": "form-control"}),
+            "value": forms.NumberInput(attrs={"class": "form-control", "step": "0.01"}),
+            "note": forms.TextInput(attrs={"class": "form-control"}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["subcategory"].queryset = SubCategory.objects.select_related("category")
+        self.fields["subcategory"].label_from_instance = (
+            lambda s: f"{s.category} / {s.subcategory_name}"
+        )
+
+    def clean(self):
+        cleaned = super().clean()
+        category, subcategory = cleaned.get("category"), cleaned.get("subcategory")
+        if subcategory and category and subcategory.category_id != category.pk:
+            self.add_error("subcategory", "This subcategory is not in the chosen category.")
+        if cleaned.get("rule") in ("PERCENT", "MARGIN") and cleaned.get("value") is not None \
+                and cleaned["value"] <= -100:
+            self.add_error("value", "A percentage must be above -100.")
+        return cleaned
+
+
 # ============================================
 # SUPPLIER FORM
 # ============================================
@@ -228,6 +269,7 @@ class PurchaseForm(forms.ModelForm):
             "discount_total": forms.NumberInput(attrs={"class": "form-control"}),
             "tax_total": forms.NumberInput(attrs={"class": "form-control"}),
             "other_charges": forms.NumberInput(attrs={"class": "form-control"}),
+            "cost_allocation": forms.Select(attrs={"class": "form-select"}),
             "grand_total": forms.NumberInput(attrs={"class": "form-control", "readonly": "readonly"}),
             "amount_paid": forms.NumberInput(attrs={"class": "form-control"}),
             "balance": forms.NumberInput(attrs={"class": "form-control", "readonly": "readonly"}),
@@ -237,16 +279,122 @@ class PurchaseForm(forms.ModelForm):
             "notes": forms.Textarea(attrs={"class": "form-control", "rows": 3}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # older clients don't post it; fall back to the model default
+        self.fields["cost_allocation"].required = False
+
+    def clean_cost_allocation(self):
+        return self.cleaned_data.get("cost_allocation") or Purchase._meta.get_field("cost_allocation").default
+
+
+class PurchaseSearchForm(forms.Form):
+    """GET filters of the purchase list; every one of them can use an index."""
+    q = forms.CharField(required=False, max_length=50, label="Purchase No",
+                        widget=forms.TextInput(attrs={"class": "form-control", "placeholder": "Purchase no. starts with"}))
+    supplier = forms.CharField(required=False, max_length=150,
+                               widget=forms.TextInput(attrs={"class": "form-control", "placeholder": "Supplier"}))
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={"class": "form-control", "type": "date"}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={"class": "form-control", "type": "date"}))
+    status = forms.ChoiceField(required=False, choices=[("", "Any status")] + Purchase.PAYMENT_STATUS,
+                               widget=forms.Select(attrs={"class": "form-select"}))
+
+    def filter(self, qs):
+        data = self.cleaned_data
+        if data["q"]:
+            # prefix ranges on the unique purchase_no index (LIKE could not
+            # use it); tried as typed and upper-cased
+            prefix = Q()
+            for term in {data["q"], data["q"].upper()}:
+                prefix |= Q(purchase_no__gte=term, purchase_no__lt=term + "\uffff")
+            qs = qs.filter(prefix)
+        if data["supplier"]:
+            qs = qs.filter(supplier__in=Supplier.objects.filter(supplier_name__icontains=data["supplier"]))
+        if data["date_from"]:
+            qs = qs.filter(date__gte=data["date_from"])
+        if data["date_to"]:
+            qs = qs.filter(date__lte=data["date_to"])
+        if data["status"]:
+            qs = qs.filter(payment_status=data["status"])
+        return qs
+
+
+class PreloadedProductField(forms.ModelChoiceField):
+    """
+    ModelChoiceField that resolves the posted pk from a dict of products
+    loaded up front (see BasePurchaseItemFormSet) instead of running one
+    query per line.
+    """
+    products = None
+
+    def to_python(self, value):
+        if self.products is None or value in self.empty_values:
+            return super().to_python(value)
+        try:
+            return self.products[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages["invalid_choice"], code="invalid_choice")
+
 
 class PurchaseItemForm(forms.ModelForm):
+    # line_total is not posted: services / pricing compute it
     class Meta:
         model = PurchaseItem
-        fields = ["product", "qty", "unit_price", "discount", "tax", "line_total"]
+        fields = ["product", "qty", "unit_price", "discount", "tax"]
+        field_classes = {"product": PreloadedProductField}
+
+    def __init__(self, *args, products=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["product"].products = products
+        self.fields["qty"].required = True
+        self.fields["unit_price"].required = True
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        if self.fields["product"].products is not None:
+            # already resolved from the preloaded products; model validation
+            # would check that it exists again with a query per line
+            exclude.add("product")
+        return exclude
+
+    def clean_qty(self):
+        qty = self.cleaned_data["qty"]
+        if qty <= 0 or qty != qty.to_integral_value():
+            raise forms.ValidationError("Enter a whole quantity of at least 1.")
+        return qty
+
+    def clean_unit_price(self):
+        price = self.cleaned_data["unit_price"]
+        if price < 0:
+            raise forms.ValidationError("Unit price cannot be negative.")
+        return price
+
+
+class BasePurchaseItemFormSet(BaseInlineFormSet):
+    """Loads the products of every posted line with a single query."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.products = None
+        if self.is_bound:
+            ids = set()
+            for i in range(self.total_form_count()):
+                value = self.data.get(self.add_prefix(i) + "-product")
+                if value and str(value).isdigit():
+                    ids.add(int(value))
+            self.products = Product.objects.in_bulk(ids)
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs["products"] = self.products
+        return kwargs
+
 
 PurchaseItemFormSet = forms.inlineformset_factory(
     parent_model=Purchase,
     model=PurchaseItem,
     form=PurchaseItemForm,
+    formset=BasePurchaseItemFormSet,
     extra=0,
     can_delete=True
 )
@@ -0,0 +1,92 @@
+# app/idempotency.py
+#
+# Idempotency keys for form and API submissions.
+#
+# Forms carry a hidden `idempotency_key` (from the context processor below)
+# and API clients can send an `Idempotency-Key` header. The first POST with
+# a key runs the view and stores its response in the same transaction; a
+# retry with the same key gets the stored response back without running
+# the view again, so a double-submitted sale is not posted twice.
+
+import uuid
+from datetime import timedelta
+from functools import wraps
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+
+def ttl():
+    return timedelta(hours=getattr(settings, "IDEMPOTENCY_KEY_TTL_HOURS", 24))
+
+
+def purge_expired():
+    """Delete keys older than IDEMPOTENCY_KEY_TTL_HOURS (uses the created_at index)."""
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=timezone.now() - ttl()).delete()
+    return deleted
+
+
+def idempotency_key(request):
+    """Context processor: a fresh key for every rendered form."""
+    return {"idempotency_key": lambda: uuid.uuid4().hex}
+
+
+def _replay(request, record):
+    if record.location:
+        messages.info(request, "This form was already submitted; showing the original result.")
+        return HttpResponseRedirect(record.location)
+    return HttpResponse(record.body, status=record.status_code, content_type=record.content_type)
+
+
+def idempotent(view):
+    """
+    Make a POST view safe to retry. Only redirects and JSON responses are
+    stored; anything else (e.g. a form re-rendered with errors) changed
+    nothing, so the key is released and the client may retry with it. A
+    redirect back to the submitting page is the same failure (the sale
+    views send a PostingError such as insufficient stock back to the form
+    that way), so it releases the key too.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get("Idempotency-Key") or request.POST.get("idempotency_key")
+        if request.method != "POST" or not key:
+            return view(request, *args, **kwargs)
+
+        key = key[:64]
+        user = request.user if request.user.is_authenticated else None
+        endpoint = view.__name__
+
+        with transaction.atomic():
+            IdempotencyKey.objects.filter(key=key, created_at__lt=timezone.now() - ttl()).delete()
+            record, created = IdempotencyKey.objects.get_or_create(
+                key=key, defaults={"user": user, "endpoint": endpoint}
+            )
+            if not created:
+                if record.user_id != (user.pk if user else None) or record.endpoint != endpoint:
+                    return HttpResponse("Idempotency key already used for another request.", status=422)
+                return _replay(request, record)
+
+            response = view(request, *args, **kwargs)
+
+            content_type = response.get("Content-Type", "")
+            if 300 <= response.status_code < 400 and urlsplit(response["Location"]).path != request.path:
+                record.location = response["Location"]
+            elif content_type.startswith("application/json") and not response.streaming:
+                record.body = response.content.decode(response.charset)
+                record.content_type = content_type
+            else:
+                record.delete()
+                return response
+
+            record.status_code = response.status_code
+            record.save(update_fields=["status_code", "location", "body", "content_type"])
+            return response
+
+    return wrapper
@@ -0,0 +1,84 @@
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.catalog import Catalog, invalidate
+from app.models import Product
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the in-process product catalogue against per-request "
+        "queries. Tops the table up to --products synthetic rows inside a "
+        "transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=200000)
+        parser.add_argument("--requests", type=int, default=1000,
+                            help="Warm lookups to time.")
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self.seed(opts["products"])
+                self.run(opts)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, target):
+        missing = target - Product.objects.count()
+        if missing <= 0:
+            return
+        Product.objects.bulk_create(
+            [
+                Product(product_id=f"BENCH{i:07d}", name=f"Bench product {i}",
+                        cost_price=Decimal("7.50"), selling_price=Decimal("10.00"),
+                        discount=Decimal("0"), tax=Decimal("18"),
+                        quantity=100, reorder_level=10)
+                for i in range(missing)
+            ],
+            batch_size=5000,
+        )
+
+    def run(self, opts):
+        n = Product.objects.count()
+
+        t0 = time.perf_counter()
+        rows = list(Product.objects.all())
+        query_ms = (time.perf_counter() - t0) * 1000
+        del rows
+
+        # memory first: tracemalloc would skew the build timing below
+        invalidate()
+        tracemalloc.start()
+        cat = Catalog().get()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del cat
+
+        invalidate()
+        cat = Catalog()
+        t0 = time.perf_counter()
+        cat.get()
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        ids = [e.id for e in cat.entries[:: max(1, n // opts["requests"])]]
+        t0 = time.perf_counter()
+        for pk in ids:
+            cat.get().by_id[pk]
+        warm_us = (time.perf_counter() - t0) / len(ids) * 1e6
+
+        self.stdout.write(f"products          {n}")
+        self.stdout.write(f"ORM full query    {query_ms:8.1f} ms per request")
+        self.stdout.write(f"catalogue build   {build_ms:8.1f} ms once per version")
+        self.stdout.write(f"catalogue memory  {size / 2**20:8.1f} MiB ({size / n:.0f} B/product)")
+        self.stdout.write(f"warm lookup       {warm_us:8.2f} us per request")
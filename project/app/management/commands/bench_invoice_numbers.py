@@ -0,0 +1,74 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from app.models import InvoiceSequence
+from app.sequences import InvoiceNumberAllocator
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the invoice number allocator under parallel load. Each "
+        "worker thread simulates one worker process with its own allocator "
+        "and DB connection. Uses a throwaway series that is removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--per-worker", type=int, default=500)
+        parser.add_argument("--block-sizes", default="1,10,50",
+                            help="Comma separated block sizes to compare.")
+        parser.add_argument("--series", default="BENCH")
+
+    def handle(self, *args, **opts):
+        series = opts["series"]
+        for size in [int(s) for s in opts["block_sizes"].split(",")]:
+            InvoiceSequence.objects.filter(series=series).delete()
+            issued, errors, elapsed = self.run_once(
+                series, size, opts["workers"], opts["per_worker"]
+            )
+            dupes = len(issued) - len(set(issued))
+            rate = len(issued) / elapsed if elapsed else 0
+            self.stdout.write(
+                f"block={size:<4} workers={opts['workers']:<3} "
+                f"issued={len(issued):<7} {rate:10.0f} alloc/s  "
+                f"duplicates={dupes} errors={errors}"
+            )
+            if dupes:
+                self.stderr.write(self.style.ERROR("Duplicate invoice numbers issued!"))
+
+        InvoiceSequence.objects.filter(series=series).delete()
+
+    def run_once(self, series, block_size, workers, per_worker):
+        issued = []
+        errors = [0]
+        lock = threading.Lock()
+        start = threading.Barrier(workers + 1)
+
+        def worker():
+            allocator = InvoiceNumberAllocator(block_size=block_size)
+            mine = []
+            start.wait()
+            try:
+                for _ in range(per_worker):
+                    try:
+                        with transaction.atomic():
+                            mine.append(allocator.next(series))
+                    except Exception:
+                        with lock:
+                            errors[0] += 1
+            finally:
+                connection.close()
+            with lock:
+                issued.extend(mine)
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for t in threads:
+            t.start()
+        start.wait()
+        t0 = time.perf_counter()
+        for t in threads:
+            t.join()
+        return issued, errors[0], time.perf_counter() - t0
@@ -0,0 +1,63 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from app.models import Product, PurchaseItem
+from app.pricing import price_purchase_items, price_sale_lines
+
+
+class Command(BaseCommand):
+    help = "Benchmark the Decimal pricing engine on large synthetic invoices (no DB access)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lines", type=int, default=10000)
+        parser.add_argument("--products", type=int, default=2000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(42)
+        products = {
+            pk: Product(
+                pk=pk,
+                selling_price=Decimal(rnd.randint(100, 99999)) / 100,
+                discount=Decimal(rnd.choice([0, 0, 5, 10])),
+                tax=rnd.choice([Decimal(5), Decimal(12), Decimal(18), None]),
+            )
+            for pk in range(1, opts["products"] + 1)
+        }
+
+        def sale_lines():
+            return [
+                {"product_id": rnd.randint(1, opts["products"]), "qty": rnd.randint(1, 20),
+                 "price": None, "discount": None, "tax": None}
+                for _ in range(opts["lines"])
+            ]
+
+        def purchase_items():
+            return [
+                PurchaseItem(qty=Decimal(rnd.randint(1, 500)),
+                             unit_price=Decimal(rnd.randint(100, 99999)) / 100,
+                             discount=Decimal(rnd.randint(0, 500)) / 100,
+                             tax=Decimal(rnd.randint(0, 900)) / 100)
+                for _ in range(opts["lines"])
+            ]
+
+        self.run("sales", opts, sale_lines,
+                 lambda lines: price_sale_lines(lines, products, default_tax=Decimal(18)))
+        self.run("purchases", opts, purchase_items,
+                 lambda items: price_purchase_items(items, Decimal("250.00"), Decimal(0)))
+
+    def run(self, label, opts, make, price):
+        best = None
+        for _ in range(opts["repeat"]):
+            batch = make()
+            t0 = time.perf_counter()
+            totals = price(batch)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        self.stdout.write(
+            f"{label:<10} {opts['lines']} lines: best {best * 1000:.1f} ms "
+            f"({opts['lines'] / best:,.0f} lines/s), grand total {totals['grand_total']}"
+        )
@@ -0,0 +1,110 @@
+import multiprocessing
+import random
+import time
+from array import array
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from app.catalog import CatalogEntry, catalog, scan
+from app.models import Product
+
+
+PREFIX = "BENCHSCAN"
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate continuous scanner input from many checkout lanes and "
+        "compare the catalogue hash map with a unique-index query per scan. "
+        "Each lane is a separate process. "
+        "Uses throwaway products that are removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=50000)
+        parser.add_argument("--lanes", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument("--unknown", type=float, default=0.02,
+                            help="Share of scans that match no product.")
+
+    def handle(self, *args, **opts):
+        n = opts["products"]
+        Product.objects.bulk_create(
+            [
+                Product(product_id=f"{PREFIX}{i:07d}", barcode=f"89{i:011d}",
+                        name=f"Scan bench {i}", selling_price=Decimal("10.00"),
+                        tax=Decimal("18"), discount=Decimal("0"), quantity=50, reorder_level=5)
+                for i in range(n)
+            ],
+            batch_size=5000,
+        )
+        try:
+            catalog.get()   # warm, as a long-running worker would be
+            for label in ("unique index", "hash map"):
+                scans, errors, elapsed, p99 = self.run_once(label, n, opts)
+                self.stdout.write(
+                    f"{label:<13} lanes={opts['lanes']:<3} {scans / elapsed:10.0f} scans/s  "
+                    f"p99 {p99 * 1e6:7.0f} us  errors={errors}"
+                )
+        finally:
+            Product.objects.filter(product_id__startswith=PREFIX).delete()
+
+    def run_once(self, mode, n, opts):
+        # Lanes are forked processes, like preforked web workers sharing the
+        # warmed catalogue: as threads, lanes waiting on SQLite would spend
+        # most of their time queueing for the GIL rather than working.
+        ctx = multiprocessing.get_context("fork")
+        deadline = time.time() + 0.5 + opts["seconds"]
+        connection.close()   # children must open their own connections
+        with ctx.Pool(opts["lanes"]) as pool:
+            results = pool.map(_lane, [(k, mode, n, opts["unknown"], deadline - opts["seconds"], deadline)
+                                       for k in range(opts["lanes"])])
+
+        latencies = array("d")
+        for scans_lat in results:
+            latencies.frombytes(scans_lat[1])
+        errors = sum(r[0] for r in results)
+        p99 = sorted(latencies)[int(len(latencies) * 0.99)] if latencies else 0
+        return len(latencies), errors, opts["seconds"], p99
+
+
+def lookup_db(code):
+    row = (
+        Product.objects.filter(Q(product_id=code) | Q(barcode=code))
+        .values_list(*CatalogEntry.__slots__)
+        .first()
+    )
+    return CatalogEntry(*row) if row else None
+
+
+def _lane(args):
+    """One checkout lane: scan random codes between `begin` and `end`."""
+    seed, mode, n, unknown, begin, end = args
+    lookup = scan if mode == "hash map" else lookup_db
+    rnd = random.Random(seed)
+    latencies = array("d")
+    errors = 0
+
+    while time.time() < begin:
+        time.sleep(0.01)
+    try:
+        while time.time() < end:
+            i = rnd.randrange(n)
+            roll = rnd.random()
+            if roll < unknown:
+                code, expect = f"UNKNOWN{i}", None
+            elif roll < 0.6:
+                code, expect = f"89{i:011d}", i
+            else:
+                code, expect = f"{PREFIX}{i:07d}", i
+            t0 = time.perf_counter()
+            entry = lookup(code)
+            latencies.append(time.perf_counter() - t0)
+            if (entry is None) != (expect is None):
+                errors += 1
+    finally:
+        connection.close()
+    return errors, latencies.tobytes()
@@ -0,0 +1,102 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.models import Product
+from app.search import search_products
+
+
+class Rollback(Exception):
+    pass
+
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ne", "to", "su", "vi", "pa", "de",
+             "cho", "co", "la", "te", "an", "ber", "ton", "ix", "ul", "gra"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure product typeahead latency (p50/p99 per query shape). Tops "
+        "the table up to --products synthetic rows inside a transaction "
+        "that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1000000)
+        parser.add_argument("--queries", type=int, default=500, help="Queries per shape.")
+
+    def handle(self, *args, **opts):
+        self.rnd = random.Random(7)
+        try:
+            with transaction.atomic():
+                words = self.seed(opts["products"])
+                self.run(words, opts["queries"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, target):
+        rnd = self.rnd
+        words = sorted({
+            "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+            for _ in range(8000)
+        })
+        brands = [w.title() for w in rnd.sample(words, 500)]
+        missing = target - Product.objects.count()
+
+        t0 = time.perf_counter()
+        for start in range(0, max(missing, 0), 10000):
+            Product.objects.bulk_create([
+                Product(
+                    product_id=f"BENCH{i:07d}",
+                    name=" ".join(rnd.choice(words) for _ in range(rnd.randint(2, 4))).title(),
+                    brand=rnd.choice(brands), supplier_name=rnd.choice(brands) + " Traders",
+                    selling_price=Decimal("10.00"), quantity=10, reorder_level=1,
+                )
+                for i in range(start, min(start + 10000, missing))
+            ])
+        if missing > 0:
+            self.stdout.write(f"seeded {missing} products in {time.perf_counter() - t0:.0f}s")
+        return words
+
+    def typo(self, word):
+        i = self.rnd.randrange(1, len(word) - 1)
+        return self.rnd.choice([
+            word[:i] + word[i + 1:],            # missing character
+            word[:i] + "x" + word[i + 1:],      # wrong character
+            word[:i] + "q" + word[i:],          # extra character
+        ])
+
+    def run(self, words, n):
+        rnd = self.rnd
+        long_words = [w for w in words if len(w) >= 6]
+        shapes = {
+            "2 letters": lambda: rnd.choice(words)[:2],
+            "3 letters": lambda: rnd.choice(words)[:3],
+            "whole word": lambda: rnd.choice(words),
+            "two words": lambda: f"{rnd.choice(words)} {rnd.choice(words)[:3]}",
+            "code prefix": lambda: f"BENCH{rnd.randrange(10 ** 6):07d}"[:9],
+            "substring": lambda: rnd.choice(long_words)[1:5],
+            "typo": lambda: self.typo(rnd.choice(long_words)),
+        }
+        overall = []
+        for label, make in shapes.items():
+            times = []
+            for _ in range(n):
+                q = make()
+                t0 = time.perf_counter()
+                search_products(q)
+                times.append(time.perf_counter() - t0)
+            overall += times
+            self.report(label, times)
+        self.report("all", overall)
+
+    def report(self, label, times):
+        times = sorted(times)
+        pick = lambda p: times[min(len(times) - 1, int(len(times) * p))] * 1000
+        self.stdout.write(
+            f"{label:<12} p50 {pick(0.5):6.2f} ms  p99 {pick(0.99):6.2f} ms  max {times[-1] * 1000:6.2f} ms"
+        )
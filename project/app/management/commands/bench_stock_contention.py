@@ -0,0 +1,122 @@
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from app.models import Product, StockMovement
+from app.services import InsufficientStock, adjust_stock, retry_on_conflict
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer one hot SKU from many threads, selling one unit per "
+        "transaction, and check for lost updates and oversold stock. "
+        "Compares the old read-modify-write, SELECT ... FOR UPDATE and the "
+        "conditional UPDATE used by services.adjust_stock. Writes to the "
+        "configured database (the worker threads need their own connections, "
+        "so it cannot run inside one rolled-back transaction): each run uses "
+        "a throwaway inactive product with a unique BENCH-HOT-<random> code, "
+        "deleted with its ledger rows afterwards. Prefer a copy of the "
+        "database over the live one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--per-worker", type=int, default=200)
+        parser.add_argument("--stock", type=int, default=None,
+                            help="Opening stock (default: 3/4 of the attempts, so the SKU sells out).")
+        parser.add_argument("--strategies", default="naive,select_for_update,conditional")
+
+    def handle(self, *args, **opts):
+        attempts = opts["workers"] * opts["per_worker"]
+        stock = opts["stock"] if opts["stock"] is not None else attempts * 3 // 4
+
+        for name in opts["strategies"].split(","):
+            sell = getattr(self, f"sell_{name}")
+            # a unique code never collides with, or overwrites, a real product
+            product = Product.objects.create(
+                product_id=f"BENCH-HOT-{uuid.uuid4().hex[:12]}", name="Bench hot SKU",
+                quantity=stock, reorder_level=0, status="inactive",
+            )
+            try:
+                StockMovement.objects.create(product=product, qty=stock, reason="OPENING")
+                sold, short, errors, elapsed = self.run_once(sell, product.pk, opts["workers"], opts["per_worker"])
+                product.refresh_from_db()
+                ledger = product.movements.aggregate(q=Sum("qty"))["q"]
+            finally:
+                product.delete()
+
+            lost = product.quantity - (stock - sold)
+            self.stdout.write(
+                f"{name:<18} sold={sold:<6} short={short:<6} errors={errors:<4} "
+                f"{sold / elapsed:9.0f} sales/s  final={product.quantity:<5} "
+                f"lost_updates={lost:<5} ledger={ledger}"
+            )
+            if lost or product.quantity < 0:
+                self.stderr.write(self.style.WARNING(f"{name}: stock is wrong."))
+
+    # -- strategies --------------------------------------------------
+    # Each sells one unit and returns True, or False when out of stock.
+
+    def sell_naive(self, pk):
+        # what the views used to do: read, subtract in Python, save
+        product = Product.objects.get(pk=pk)
+        if product.quantity < 1:
+            return False
+        product.quantity -= 1
+        product.save(update_fields=["quantity"])
+        StockMovement.objects.create(product_id=pk, qty=-1, reason="SALE")
+        return True
+
+    def sell_select_for_update(self, pk):
+        with transaction.atomic():
+            product = Product.objects.select_for_update().get(pk=pk)
+            if product.quantity < 1:
+                return False
+            product.quantity -= 1
+            product.version += 1
+            product.save(update_fields=["quantity", "version"])
+            StockMovement.objects.create(product_id=pk, qty=-1, reason="SALE")
+            return True
+
+    def sell_conditional(self, pk):
+        try:
+            adjust_stock({pk: -1}, "SALE")
+        except InsufficientStock:
+            return False
+        return True
+
+    # -- driver ------------------------------------------------------
+
+    def run_once(self, sell, pk, workers, per_worker):
+        counts = {"sold": 0, "short": 0, "errors": 0}
+        lock = threading.Lock()
+        start = threading.Barrier(workers + 1)
+
+        def worker():
+            mine = {"sold": 0, "short": 0, "errors": 0}
+            start.wait()
+            try:
+                for _ in range(per_worker):
+                    try:
+                        ok = retry_on_conflict(sell, pk) if sell != self.sell_naive else sell(pk)
+                        mine["sold" if ok else "short"] += 1
+                    except Exception:
+                        mine["errors"] += 1
+            finally:
+                connection.close()
+            with lock:
+                for k, v in mine.items():
+                    counts[k] += v
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for t in threads:
+            t.start()
+        start.wait()
+        t0 = time.perf_counter()
+        for t in threads:
+            t.join()
+        return counts["sold"], counts["short"], counts["errors"], time.perf_counter() - t0
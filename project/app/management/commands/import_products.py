@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.product_import import COLUMNS, ImportFileError, ProductImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update products from a supplier price list (CSV or XLSX, "
+        "first sheet), matched on product_id. Columns: " + ", ".join(COLUMNS) + ". "
+        "Only product_id is required; blank cells leave the product as it is. "
+        "quantity is the opening stock of new products and is ignored for "
+        "existing ones. Rejected rows are written to an error report CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "xlsx"],
+                            help="Defaults to the file extension.")
+        parser.add_argument("--chunk-size", type=int, default=2000,
+                            help="Rows per transaction.")
+        parser.add_argument("--errors",
+                            help="Error report path (default: <path>.errors.csv).")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Validate and report without saving anything.")
+
+    def handle(self, *args, **opts):
+        path = opts["path"]
+        fmt = opts["format"] or ("xlsx" if path.lower().endswith((".xlsx", ".xlsm")) else "csv")
+        report_path = opts["errors"] or f"{path}.errors.csv"
+        started = time.perf_counter()
+
+        with open(report_path, "w", newline="", encoding="utf-8") as report:
+            importer = ProductImporter(report, chunk_size=opts["chunk_size"], dry_run=opts["dry_run"])
+            if fmt == "xlsx":
+                fh = open(path, "rb")
+            else:
+                fh = open(path, newline="", encoding="utf-8-sig")
+            try:
+                with fh:
+                    stats = importer.run(fh, fmt)
+            except ImportFileError as exc:
+                raise CommandError(str(exc))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Checked' if opts['dry_run'] else 'Done'} in {elapsed:.1f}s: {stats['rows']} rows "
+            f"({stats['rows'] / (elapsed or 1e-9):,.0f}/s), {stats['created']} created, "
+            f"{stats['updated']} updated, {stats['unchanged']} unchanged, {stats['errors']} rejected."
+        ))
+        if stats["errors"]:
+            self.stdout.write(f"Rejected rows: {report_path}")
@@ -0,0 +1,309 @@
+import csv
+import json
+import os
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date as date_cls
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app.models import ImportCheckpoint, Product, Sales, SalesItem
+from app.pricing import default_tax_rate, price_sale_lines
+from app.sequences import DEFAULT_SERIES, financial_year, format_invoice_no, reserve_block
+from app.services import adjust_stock
+
+
+PAYMENT_STATUSES = {value for value, _ in Sales.PAYMENT_STATUS_CHOICES}
+INVOICE_NO_LENGTH = Sales._meta.get_field("invoice_no").max_length
+
+COLUMNS = (
+    "invoice", "customer_name", "date", "product_id",
+    "qty", "price", "discount", "tax", "payment_status",
+)
+
+
+# ---------------------------
+# Record parsing (runs in worker processes with --workers)
+# ---------------------------
+
+def _dec(value):
+    if value is None or str(value).strip() == "":
+        return None
+    return Decimal(str(value).strip())
+
+
+def parse_record(record, fmt, header):
+    """
+    Turn one raw record (a JSONL line or a CSV row list) into a row dict,
+    or an (invoice, error string) pair; invoice is None when it could not
+    be read. Blank price/discount/tax stay None and are filled from the
+    product by the pricing module.
+    """
+    invoice = None
+    try:
+        if fmt == "jsonl":
+            data = json.loads(record)
+        else:
+            data = dict(zip(header, record))
+        invoice = str(data["invoice"])
+
+        row = {
+            "invoice": invoice,
+            "customer_name": data.get("customer_name") or None,
+            "date": date_cls.fromisoformat(str(data["date"])[:10]),
+            "product_id": str(data["product_id"]).strip(),
+            "qty": int(data["qty"]),
+            "price": _dec(data.get("price")),
+            "discount": _dec(data.get("discount")),
+            "tax": _dec(data.get("tax")),
+            "payment_status": (data.get("payment_status") or "PAID").upper(),
+        }
+        # SalesItem.qty is unsigned: one such row would fail its whole chunk
+        if row["qty"] <= 0:
+            raise ValueError(f"qty must be positive, got {row['qty']}")
+        if row["price"] is not None and row["price"] < 0:
+            raise ValueError(f"price must not be negative, got {row['price']}")
+        if row["payment_status"] not in PAYMENT_STATUSES:
+            raise ValueError(f"unknown payment_status {row['payment_status']!r}")
+        return row
+    except (KeyError, ValueError, TypeError, InvalidOperation, json.JSONDecodeError) as exc:
+        return invoice, f"{type(exc).__name__}: {exc}"
+
+
+def record_invoice(row):
+    """The invoice a parsed row or parse error belongs to (None if unknown)."""
+    return row["invoice"] if isinstance(row, dict) else row[0]
+
+
+def parse_chunk(args):
+    records, fmt, header = args
+    return [parse_record(r, fmt, header) for r in records]
+
+
+# ---------------------------
+# Command
+# ---------------------------
+
+class Command(BaseCommand):
+    help = (
+        "Stream historical sales from a CSV or JSONL file into Sales/SalesItem. "
+        "One record per line item; consecutive records with the same `invoice` "
+        "form one sale. Columns: " + ", ".join(COLUMNS) + ". "
+        "`product_id` is the product code (Product.product_id)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"],
+                            help="Defaults to the file extension.")
+        parser.add_argument("--chunk-size", type=int, default=5000,
+                            help="Records per transaction.")
+        parser.add_argument("--workers", type=int, default=0,
+                            help="Parse records in this many processes (0 = in-process).")
+        parser.add_argument("--series", default=DEFAULT_SERIES)
+        parser.add_argument("--keep-invoice-no", action="store_true",
+                            help="Use the file's invoice column as invoice_no "
+                                 "instead of allocating new numbers. Invoices "
+                                 "longer than the invoice_no field are skipped.")
+        parser.add_argument("--adjust-stock", action="store_true",
+                            help="Take the imported quantities out of Product.quantity.")
+        parser.add_argument("--restart", action="store_true",
+                            help="Ignore any saved checkpoint for this file.")
+
+    # -- input -------------------------------------------------------
+
+    def read_records(self, fh, fmt):
+        if fmt == "jsonl":
+            return None, (line for line in fh if line.strip())
+        reader = csv.reader(fh)
+        header = [h.strip() for h in next(reader)]
+        missing = {"invoice", "date", "product_id", "qty"} - set(header)
+        if missing:
+            raise CommandError(f"Missing CSV column(s): {', '.join(sorted(missing))}")
+        return header, reader
+
+    def parsed_chunks(self, records, fmt, header, chunk_size, workers):
+        raw_chunks = iter(lambda: list(islice(records, chunk_size)), [])
+        if workers <= 0:
+            for chunk in raw_chunks:
+                yield parse_chunk((chunk, fmt, header))
+            return
+        # Executor.map() would read the whole file up front; keep a bounded
+        # window of chunks in flight instead.
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            window = deque()
+            for chunk in raw_chunks:
+                window.append(pool.submit(parse_chunk, (chunk, fmt, header)))
+                if len(window) > workers * 2:
+                    yield window.popleft().result()
+            while window:
+                yield window.popleft().result()
+
+    # -- main --------------------------------------------------------
+
+    def handle(self, *args, **opts):
+        path = opts["path"]
+        fmt = opts["format"] or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+        checkpoint_name = f"import_sales:{os.path.abspath(path)}"
+
+        if opts["restart"]:
+            ImportCheckpoint.objects.filter(name=checkpoint_name).delete()
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(name=checkpoint_name)
+        skip = checkpoint.rows_done
+        if skip:
+            self.stdout.write(f"Resuming after {skip} records.")
+
+        self.products = dict(Product.objects.values_list("product_id", "id"))
+        self.default_tax = default_tax_rate()
+        self.opts = opts
+        self.stats = defaultdict(int)
+        started = time.perf_counter()
+
+        with open(path, newline="", encoding="utf-8") as fh:
+            header, records = self.read_records(fh, fmt)
+            records = islice(records, skip, None)
+
+            position = skip
+            pending = []   # records of the invoice still open at chunk end
+            for chunk in self.parsed_chunks(records, fmt, header, opts["chunk_size"], opts["workers"]):
+                rows = pending + chunk
+                # keep the trailing invoice back: it may continue in the next chunk
+                cut, last = len(rows), None
+                while cut > 0:
+                    invoice = record_invoice(rows[cut - 1])
+                    if invoice is not None:
+                        if last is None:
+                            last = invoice
+                        elif invoice != last:
+                            break
+                    cut -= 1
+                if cut == 0:
+                    pending = rows
+                    continue
+                pending = rows[cut:]
+
+                position += cut
+                self.commit_rows(rows[:cut], checkpoint, position)
+                self.report(started, position - skip)
+
+            if pending:
+                position += len(pending)
+                self.commit_rows(pending, checkpoint, position)
+
+        elapsed = time.perf_counter() - started
+        self.report(started, position - skip, final=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {elapsed:.1f}s: {self.stats['sales']} sales, {self.stats['items']} items, "
+            f"{self.stats['errors']} bad records, {self.stats['skipped_sales']} sales skipped."
+        ))
+
+    def report(self, started, rows, final=False):
+        if self.opts["verbosity"] < 2 and not final:
+            return
+        elapsed = time.perf_counter() - started or 1e-9
+        self.stdout.write(
+            f"{rows} records, {self.stats['sales']} sales "
+            f"({rows / elapsed:,.0f} records/s, {self.stats['sales'] / elapsed:,.0f} sales/s)"
+        )
+
+    # -- writing -----------------------------------------------------
+
+    def group_sales(self, rows, first_row_no):
+        """
+        Split parsed rows into per-invoice groups. An invoice with any bad
+        record is skipped whole rather than imported with lines missing.
+        """
+        groups, bad = [], set()
+        for offset, row in enumerate(rows):
+            row_no = first_row_no + offset
+            if not isinstance(row, dict):
+                invoice, error = row
+                self.stats["errors"] += 1
+                self.stderr.write(f"record {row_no}: {error}")
+                if invoice is not None:
+                    bad.add(invoice)
+                continue
+            if self.opts["keep_invoice_no"] and len(row["invoice"]) > INVOICE_NO_LENGTH:
+                # truncated, two invoices could collide on invoice_no
+                self.stats["errors"] += 1
+                self.stderr.write(
+                    f"record {row_no}: invoice {row['invoice']!r} is longer than {INVOICE_NO_LENGTH} characters"
+                )
+                bad.add(row["invoice"])
+                continue
+            if row["product_id"] not in self.products:
+                self.stats["errors"] += 1
+                self.stderr.write(f"record {row_no}: unknown product {row['product_id']!r}")
+                bad.add(row["invoice"])
+                continue
+            if groups and groups[-1][0]["invoice"] == row["invoice"]:
+                groups[-1].append(row)
+            else:
+                groups.append([row])
+
+        keep = [g for g in groups if g[0]["invoice"] not in bad]
+        self.stats["skipped_sales"] += len(bad)
+        return keep
+
+    def invoice_numbers(self, groups):
+        if self.opts["keep_invoice_no"]:
+            return [g[0]["invoice"] for g in groups]
+
+        by_fy = defaultdict(list)
+        for i, g in enumerate(groups):
+            by_fy[financial_year(g[0]["date"])].append(i)
+
+        numbers = [None] * len(groups)
+        for fy, idxs in by_fy.items():
+            block = reserve_block(self.opts["series"], fy, len(idxs))
+            for i, n in zip(idxs, block):
+                numbers[i] = format_invoice_no(self.opts["series"], fy, n)
+        return numbers
+
+    @transaction.atomic
+    def commit_rows(self, rows, checkpoint, position):
+        groups = self.group_sales(rows, position - len(rows) + 1)
+
+        if groups:
+            products = Product.objects.in_bulk(
+                {self.products[r["product_id"]] for g in groups for r in g}
+            )
+            sales, priced = [], []
+            for g, invoice_no in zip(groups, self.invoice_numbers(groups)):
+                lines = [
+                    {"product_id": self.products[r["product_id"]], "qty": r["qty"],
+                     "price": r["price"], "discount": r["discount"], "tax": r["tax"]}
+                    for r in g
+                ]
+                totals = price_sale_lines(lines, products, default_tax=self.default_tax)
+                priced.append(lines)
+                sales.append(Sales(
+                    invoice_no=invoice_no,
+                    customer_name=g[0]["customer_name"],
+                    date=g[0]["date"],
+                    payment_status=g[0]["payment_status"],
+                    **totals,
+                ))
+            Sales.objects.bulk_create(sales)
+
+            items, sold, movements = [], defaultdict(int), []
+            for sale, lines in zip(sales, priced):
+                for line in lines:
+                    items.append(SalesItem(sale_id=sale.pk, **line))
+                    sold[line["product_id"]] -= line["qty"]
+                    movements.append((line["product_id"], -line["qty"], sale.invoice_no))
+            SalesItem.objects.bulk_create(items, batch_size=2000)
+
+            if self.opts["adjust_stock"]:
+                # history: the stock left the shelf whether or not we had it on record
+                adjust_stock(sold, "IMPORT", movements=movements, allow_negative=True)
+
+            self.stats["sales"] += len(sales)
+            self.stats["items"] += len(items)
+
+        checkpoint.rows_done = position
+        checkpoint.save(update_fields=["rows_done", "updated_at"])
@@ -0,0 +1,83 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from app.outbox import claim_batch, process_batch, release_stale
+from app.services import retry_on_conflict
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain the SaleOutbox queue, committing queued sales in grouped "
+        "transactions. Runs forever unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--interval", type=float, default=0.5,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--once", action="store_true",
+                            help="Exit once the queue is empty.")
+
+    def release(self):
+        released = release_stale()
+        if released:
+            self.stdout.write(f"Re-queued {released} stale entries.")
+
+    def handle(self, *args, **opts):
+        self.release()
+
+        stop = threading.Event()
+        totals = {"done": 0, "failed": 0}
+        lock = threading.Lock()
+        lease = getattr(settings, "SALE_OUTBOX_LEASE_SECONDS", 300)
+
+        def worker():
+            # a busy queue is never empty, so also release once per lease
+            next_release = time.monotonic() + lease
+            try:
+                while not stop.is_set():
+                    try:
+                        if time.monotonic() >= next_release:
+                            self.release()
+                            next_release = time.monotonic() + lease
+                        ids = claim_batch(opts["batch_size"])
+                        if not ids:
+                            if opts["once"]:
+                                return
+                            self.release()
+                            next_release = time.monotonic() + lease
+                            time.sleep(opts["interval"])
+                            continue
+                        done, failed = retry_on_conflict(process_batch, ids)
+                    except OperationalError as exc:
+                        # claimed entries stay PROCESSING until their lease
+                        # runs out and the next release_stale() re-queues them
+                        self.stderr.write(f"Worker error, retrying: {exc}")
+                        time.sleep(opts["interval"])
+                        continue
+                    with lock:
+                        totals["done"] += done
+                        totals["failed"] += failed
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(opts["workers"])]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=1)
+        except KeyboardInterrupt:
+            stop.set()
+            for t in threads:
+                t.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Committed {totals['done']} sales, {totals['failed']} failed attempts."
+        ))
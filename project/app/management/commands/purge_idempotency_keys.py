@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from app.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete idempotency keys older than IDEMPOTENCY_KEY_TTL_HOURS. Run from cron."
+
+    def handle(self, *args, **opts):
+        self.stdout.write(f"Purged {purge_expired()} expired idempotency keys.")
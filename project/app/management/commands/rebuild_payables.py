@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.payables import aging_report, aging_totals, rebuild_payables
+
+
+class Command(BaseCommand):
+    help = "Recompute the SupplierPayable summary from app_purchase (after bulk writes that skip signals)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true",
+                            help="Rebuild inside a transaction, report suppliers whose totals change, then roll back.")
+
+    def handle(self, *args, **opts):
+        t0 = time.perf_counter()
+        if opts["check"]:
+            before = {r["supplier_id"]: r["outstanding"] for r in aging_report()}
+            with transaction.atomic():
+                rebuild_payables()
+                after = {r["supplier_id"]: r["outstanding"] for r in aging_report()}
+                transaction.set_rollback(True)
+            bad = {pk for pk in before.keys() | after.keys() if before.get(pk) != after.get(pk)}
+            for pk in sorted(bad):
+                self.stdout.write(f"supplier {pk}: summary={before.get(pk, 0)} purchases={after.get(pk, 0)}")
+            self.stdout.write(f"{len(bad)} supplier(s) out of step ({time.perf_counter() - t0:.2f}s).")
+            return
+
+        with transaction.atomic():
+            rows = rebuild_payables()
+        total = aging_totals(aging_report())["outstanding"]
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {rows} payable rows ({total} outstanding) in {time.perf_counter() - t0:.2f}s."
+        ))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.stock import drift, rebuild_quantities
+
+
+class Command(BaseCommand):
+    help = "Recompute Product.quantity from the StockMovement ledger in one set-based UPDATE."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true",
+                            help="Only report products whose quantity disagrees with the ledger.")
+
+    def handle(self, *args, **opts):
+        t0 = time.perf_counter()
+        if opts["check"]:
+            bad = drift()
+            for pk, (qty, ledger) in sorted(bad.items()):
+                self.stdout.write(f"product {pk}: quantity={qty} ledger={ledger}")
+            self.stdout.write(f"{len(bad)} product(s) out of step ({time.perf_counter() - t0:.2f}s).")
+            return
+
+        with transaction.atomic():
+            updated = rebuild_quantities()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt quantity of {updated} products in {time.perf_counter() - t0:.2f}s."
+        ))
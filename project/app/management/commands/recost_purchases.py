@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.services import recost_purchases
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-price every purchase (line totals, other-charge allocation, landed "
+        "costs, header totals) and set product cost prices from each product's "
+        "latest receipt. One pass over the purchases."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500,
+                            help="Purchases re-priced per batch of UPDATEs.")
+
+    def handle(self, *args, **opts):
+        t0 = time.perf_counter()
+        stats = recost_purchases(opts["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-costed {stats['purchases']} purchases ({stats['lines']} lines), "
+            f"{stats['products']} product cost prices in {time.perf_counter() - t0:.2f}s."
+        ))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.stock import take_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a StockSnapshot row for every product (previous snapshot + "
+        "movements since). Schedule it, e.g. nightly, to keep stock-as-of "
+        "queries fast."
+    )
+
+    def handle(self, *args, **opts):
+        t0 = time.perf_counter()
+        with transaction.atomic():
+            rows = take_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot of {rows} products in {time.perf_counter() - t0:.2f}s."
+        ))
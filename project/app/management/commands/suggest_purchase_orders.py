@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import reorder
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace the DRAFT purchase orders with reorder suggestions computed "
+        "from sales velocity. Run it periodically from cron, e.g. nightly "
+        "after snapshot_stock: "
+        "30 2 * * * cd /path/to/project && python manage.py suggest_purchase_orders"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--windows", type=int, nargs="+", default=list(reorder.DEFAULT_WINDOWS),
+                            help="Sales windows in days; their daily rates are averaged.")
+        parser.add_argument("--lead-days", type=int, default=reorder.LEAD_DAYS,
+                            help="Days a supplier takes to deliver.")
+        parser.add_argument("--cover-days", type=int, default=reorder.COVER_DAYS,
+                            help="Days of sales each order should cover after delivery.")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Compute and report, but keep the current drafts.")
+
+    def handle(self, *args, **opts):
+        if min(opts["windows"]) < 1 or opts["lead_days"] < 0 or opts["cover_days"] < 0:
+            raise CommandError("Windows must be at least 1 day; lead and cover days cannot be negative.")
+
+        t0 = time.perf_counter()
+        stats = reorder.generate_draft_orders(
+            opts["windows"], opts["lead_days"], opts["cover_days"], dry_run=opts["dry_run"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['suggested']} of {stats['scanned']} products to reorder in "
+            f"{stats['orders']} draft orders ({stats['unassigned']} without a supplier)"
+            f"{' [dry run]' if opts['dry_run'] else ''} in {time.perf_counter() - t0:.2f}s."
+        ))
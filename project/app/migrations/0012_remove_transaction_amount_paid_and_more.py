@@ -14,7 +14,7 @@ class Migration(migrations.Migration):
 
     operations = [
         migrations.RemoveField(
-            model_name='item.qty',
+            model_name='transaction',
             name='amount_paid',
         ),
         migrations.RemoveField(
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_remove_transactionline_account_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('series', models.CharField(max_length=10)),
+                ('financial_year', models.CharField(max_length=7)),
+                ('next_value', models.PositiveIntegerField(default=1)),
+            ],
+            options={
+                'unique_together': {('series', 'financial_year')},
+            },
+        ),
+        migrations.DeleteModel(
+            name='Transaction',
+        ),
+    ]
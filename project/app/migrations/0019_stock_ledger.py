@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def opening_balances(apps, schema_editor):
+    """Seed the ledger with each product's current quantity."""
+    Product = apps.get_model("app", "Product")
+    StockMovement = apps.get_model("app", "StockMovement")
+    now = django.utils.timezone.now()
+    StockMovement.objects.bulk_create(
+        [
+            StockMovement(product_id=pk, qty=qty, reason="OPENING", created_at=now)
+            for pk, qty in Product.objects.exclude(quantity=0).values_list("pk", "quantity")
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('qty', models.IntegerField()),
+                ('reason', models.CharField(choices=[('OPENING', 'Opening balance'), ('SALE', 'Sale'), ('SALE_EDIT', 'Sale edited'), ('SALE_DELETE', 'Sale deleted'), ('PURCHASE', 'Purchase'), ('PURCHASE_EDIT', 'Purchase edited'), ('PURCHASE_DELETE', 'Purchase deleted'), ('IMPORT', 'Import'), ('ADJUSTMENT', 'Manual adjustment')], max_length=20)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='app.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'created_at'], name='app_stockmo_product_c47384_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('quantity', models.IntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='app.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['taken_at'], name='app_stocksn_taken_a_19336b_idx')],
+                'unique_together': {('product', 'taken_at')},
+            },
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations
+
+
+# SQLite only: other databases fall back to LIKE queries in app/search.py.
+INDEX_SQL = [
+    """CREATE VIRTUAL TABLE app_product_fts USING fts5(
+        name, product_id, brand, supplier_name,
+        content='app_product', content_rowid='id', prefix='2 3'
+    )""",
+    """CREATE VIRTUAL TABLE app_product_trigram USING fts5(
+        name, brand,
+        content='app_product', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER app_product_search_ai AFTER INSERT ON app_product BEGIN
+        INSERT INTO app_product_fts(rowid, name, product_id, brand, supplier_name)
+            VALUES (new.id, new.name, new.product_id, new.brand, new.supplier_name);
+        INSERT INTO app_product_trigram(rowid, name, brand) VALUES (new.id, new.name, new.brand);
+    END""",
+    """CREATE TRIGGER app_product_search_ad AFTER DELETE ON app_product BEGIN
+        INSERT INTO app_product_fts(app_product_fts, rowid, name, product_id, brand, supplier_name)
+            VALUES ('delete', old.id, old.name, old.product_id, old.brand, old.supplier_name);
+        INSERT INTO app_product_trigram(app_product_trigram, rowid, name, brand)
+            VALUES ('delete', old.id, old.name, old.brand);
+    END""",
+    """CREATE TRIGGER app_product_search_au
+        AFTER UPDATE OF name, product_id, brand, supplier_name ON app_product BEGIN
+        INSERT INTO app_product_fts(app_product_fts, rowid, name, product_id, brand, supplier_name)
+            VALUES ('delete', old.id, old.name, old.product_id, old.brand, old.supplier_name);
+        INSERT INTO app_product_trigram(app_product_trigram, rowid, name, brand)
+            VALUES ('delete', old.id, old.name, old.brand);
+        INSERT INTO app_product_fts(rowid, name, product_id, brand, supplier_name)
+            VALUES (new.id, new.name, new.product_id, new.brand, new.supplier_name);
+        INSERT INTO app_product_trigram(rowid, name, brand) VALUES (new.id, new.name, new.brand);
+    END""",
+    "INSERT INTO app_product_fts(app_product_fts) VALUES ('rebuild')",
+    "INSERT INTO app_product_trigram(app_product_trigram) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS app_product_search_ai",
+    "DROP TRIGGER IF EXISTS app_product_search_ad",
+    "DROP TRIGGER IF EXISTS app_product_search_au",
+    "DROP TABLE IF EXISTS app_product_fts",
+    "DROP TABLE IF EXISTS app_product_trigram",
+]
+
+
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for sql in INDEX_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for sql in DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0021_product_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:28
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def dedupe_product_ids(apps, schema_editor):
+    """Suffix repeated product codes with the row's pk so they can be unique."""
+    Product = apps.get_model("app", "Product")
+    dupes = (
+        Product.objects.values("product_id")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+        .values_list("product_id", flat=True)
+    )
+    for code in list(dupes):
+        for product in Product.objects.filter(product_id=code).order_by("id")[1:]:
+            product.product_id = f"{code}-{product.pk}"[:50]
+            product.save(update_fields=["product_id"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0022_product_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_product_ids, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='product',
+            name='barcode',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='product_id',
+            field=models.CharField(max_length=50, unique=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill(apps, schema_editor):
+    Purchase = apps.get_model("app", "Purchase")
+    SupplierPayable = apps.get_model("app", "SupplierPayable")
+    rows = (
+        Purchase.objects.filter(balance__gt=0)
+        .values("supplier_id", "date")
+        .annotate(total=Sum("balance"), n=Count("id"))
+    )
+    SupplierPayable.objects.bulk_create(
+        [SupplierPayable(supplier_id=r["supplier_id"], date=r["date"], balance=r["total"], purchases=r["n"])
+         for r in rows],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0025_purchase_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplierPayable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('purchases', models.IntegerField(default=0)),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payables', to='app.supplier')),
+            ],
+            options={
+                'unique_together': {('supplier', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0027_purchase_orders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchase',
+            name='cost_allocation',
+            field=models.CharField(choices=[('VALUE', 'By line value'), ('QUANTITY', 'By quantity')], default='VALUE', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='purchaseitem',
+            name='charges',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='purchaseitem',
+            name='landed_cost',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
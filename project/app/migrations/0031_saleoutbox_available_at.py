@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0030_sales_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saleoutbox',
+            name='available_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 
 
 # =====================================================
@@ -59,6 +60,8 @@ class Supplier(models.Model):
 
     class Meta:
         ordering = ["supplier_name"]
+        # supplier list pages on (supplier_name, id); see pagination.paginate
+        indexes = [models.Index(fields=["supplier_name", "id"], name="supplier_name_idx")]
 
     def __str__(self):
         return self.supplier_name
@@ -97,7 +100,8 @@ class Product(models.Model):
         ('discontinued', 'Discontinued'),
     ]
 
-    product_id = models.CharField(max_length=50)
+    product_id = models.CharField(max_length=50, unique=True)
+    barcode = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=200)
 
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
@@ -113,6 +117,9 @@ class Product(models.Model):
 
     quantity = models.IntegerField()
     reorder_level = models.IntegerField()
+    # Bumped by every stock UPDATE and admin edit; forms that write
+    # quantity back check it to avoid overwriting concurrent changes.
+    version = models.PositiveIntegerField(default=0)
 
     supplier_name = models.CharField(max_length=200, null=True)
     supplier_contact = models.CharField(max_length=20, null=True)
@@ -120,10 +127,120 @@ class Product(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active', null=True, blank=True)
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Partial index holding only the reorder candidates. The
+            # database keeps it current on every stock UPDATE, so low-stock
+            # lookups never scan the whole catalogue (see stock.low_stock).
+            models.Index(
+                fields=["quantity", "id"],
+                condition=models.Q(quantity__lte=models.F("reorder_level")),
+                name="product_reorder_idx",
+            ),
+            # product list sorted by name; see pagination.paginate
+            models.Index(fields=["name", "id"], name="product_name_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class StockMovement(models.Model):
+    """
+    Append-only stock ledger. Every change to Product.quantity writes one
+    row here (see services.adjust_stock), so the current quantity is the
+    sum of a product's movements. Rows are never updated or deleted.
+    """
+    REASON_CHOICES = (
+        ("OPENING", "Opening balance"),
+        ("SALE", "Sale"),
+        ("SALE_EDIT", "Sale edited"),
+        ("SALE_DELETE", "Sale deleted"),
+        ("PURCHASE", "Purchase"),
+        ("PURCHASE_EDIT", "Purchase edited"),
+        ("PURCHASE_DELETE", "Purchase deleted"),
+        ("IMPORT", "Import"),
+        ("ADJUSTMENT", "Manual adjustment"),
+    )
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="movements")
+    qty = models.IntegerField()   # signed: + into stock, - out of stock
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    reference = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["product", "created_at"])]
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("Stock movements are append-only.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.product_id} {self.qty:+d} ({self.reason})"
+
+
+class StockSnapshot(models.Model):
+    """
+    Stock on hand of a product at `taken_at`, including every movement up
+    to and including that instant. Lets "stock as of X" start from the
+    nearest snapshot instead of summing the whole ledger.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="snapshots")
+    taken_at = models.DateTimeField()
+    quantity = models.IntegerField()
+
+    class Meta:
+        unique_together = ("product", "taken_at")
+        indexes = [models.Index(fields=["taken_at"])]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.taken_at}: {self.quantity}"
+
+
+class PriceRevision(models.Model):
+    """
+    One bulk selling-price change (see price_revision.py): the filters and
+    rule it was run with, and a PriceChange row per product it repriced.
+    """
+    RULE_CHOICES = (
+        ("PERCENT", "Percent on selling price"),
+        ("ABSOLUTE", "Amount added to selling price"),
+        ("MARGIN", "Margin percent over cost price"),
+    )
+
+    rule = models.CharField(max_length=10, choices=RULE_CHOICES)
+    value = models.DecimalField(max_digits=10, decimal_places=2)
+
+    # filters; blank = any
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    subcategory = models.ForeignKey(SubCategory, on_delete=models.SET_NULL, null=True, blank=True)
+    brand = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=20, choices=Product.STATUS_CHOICES, blank=True)
+
+    products = models.PositiveIntegerField(default=0)
+    note = models.CharField(max_length=200, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.get_rule_display()} {self.value} on {self.products} products ({self.created_at:%Y-%m-%d})"
+
+
+class PriceChange(models.Model):
+    revision = models.ForeignKey(PriceRevision, on_delete=models.CASCADE, related_name="changes")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="price_changes")
+    old_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        unique_together = ("revision", "product")
+
+    def __str__(self):
+        return f"{self.product_id}: {self.old_price} -> {self.new_price}"
+
+
 # =====================================================
 # 6. SALES & SALES ITEMS
 # =====================================================
@@ -149,6 +266,10 @@ class Sales(models.Model):
 
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        # date-range filters of the data-table API; see datatable.py
+        indexes = [models.Index(fields=["date", "id"], name="sales_date_idx")]
+
     def __str__(self):
         return f"Invoice #{self.invoice_no} - {self.customer_name}"
 
@@ -163,6 +284,95 @@ class SalesItem(models.Model):
 
 
 
+class InvoiceSequence(models.Model):
+    """
+    Next free invoice number per series (prefix) and financial year.
+    Incremented with a single UPDATE so concurrent checkouts never
+    read the same value; see app/sequences.py.
+    """
+    series = models.CharField(max_length=10)
+    financial_year = models.CharField(max_length=7)   # e.g. "2025-26"
+    next_value = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ("series", "financial_year")
+
+    def __str__(self):
+        return f"{self.series} {self.financial_year} -> {self.next_value}"
+
+
+
+class SaleOutbox(models.Model):
+    """
+    Durable queue of validated sales waiting to be committed by the
+    process_sale_outbox worker (see app/outbox.py).
+    """
+    STATUS_CHOICES = (
+        ("PENDING", "Pending"),
+        ("PROCESSING", "Processing"),
+        ("DONE", "Done"),
+        ("FAILED", "Failed"),
+    )
+
+    invoice_no = models.CharField(max_length=20, unique=True)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    sale = models.ForeignKey(Sales, on_delete=models.SET_NULL, null=True, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # a retried entry is not claimed again before this time
+    available_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "id"])]
+
+    def __str__(self):
+        return f"{self.invoice_no} ({self.status})"
+
+
+
+class ImportCheckpoint(models.Model):
+    """
+    How far a bulk import has got. Saved in the same transaction as each
+    imported chunk so an interrupted run can resume where it stopped.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    rows_done = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.rows_done}"
+
+
+
+class IdempotencyKey(models.Model):
+    """
+    Result of a POST submitted with an idempotency key, so a retried
+    submission replays the original response instead of running again.
+    See app/idempotency.py.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    endpoint = models.CharField(max_length=100)
+
+    status_code = models.PositiveSmallIntegerField(null=True)
+    location = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.endpoint} {self.key}"
+
+
+
 # =====================================================
 # 7. PURCHASE & PURCHASE ITEMS
 # =====================================================
@@ -181,6 +391,12 @@ class Purchase(models.Model):
         ("unpaid", "Unpaid"),
     ]
 
+    # how other_charges (freight, duty, ...) is spread over the lines
+    COST_ALLOCATION = [
+        ("VALUE", "By line value"),
+        ("QUANTITY", "By quantity"),
+    ]
+
     purchase_no = models.CharField(max_length=50, unique=True)
     date = models.DateField(default=timezone.now)
     payment_type = models.CharField(max_length=20, choices=PAYMENT_TYPES)
@@ -190,6 +406,7 @@ class Purchase(models.Model):
     discount_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     tax_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     other_charges = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    cost_allocation = models.CharField(max_length=10, choices=COST_ALLOCATION, default="VALUE")
     grand_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -197,6 +414,16 @@ class Purchase(models.Model):
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS)
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        # The purchase list pages newest first on (date, id) (see
+        # pagination.keyset_page); each index serves one filter plus
+        # that order, so every page is a single index seek.
+        indexes = [
+            models.Index(fields=["date", "id"], name="purchase_date_idx"),
+            models.Index(fields=["supplier", "date", "id"], name="purchase_supplier_date_idx"),
+            models.Index(fields=["payment_status", "date", "id"], name="purchase_status_date_idx"),
+        ]
+
     def __str__(self):
         return f"Purchase #{self.purchase_no}"
 
@@ -211,10 +438,82 @@ class PurchaseItem(models.Model):
     tax = models.DecimalField(max_digits=10, decimal_places=2, null=True)
     line_total = models.DecimalField(max_digits=10, decimal_places=2, null=True)
 
+    # this line's share of Purchase.other_charges, and what one unit cost
+    # once discount and that share are counted (tax excluded); see
+    # pricing.allocate_other_charges
+    charges = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    landed_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    # the product's cost_price before this receipt, put back when the
+    # receipt goes and no other remains; see services.restore_cost_prices
+    prior_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
     def __str__(self):
         return f"{self.product.name} x {self.qty}"
 
 
+class SupplierPayable(models.Model):
+    """
+    What we still owe a supplier for purchases dated `date`: the sum of
+    their Purchase.balance and how many are open. Kept up to date by
+    signals on Purchase (see payables.py) so the payables report reads
+    this small table instead of every purchase ever made. Rows that reach
+    zero are deleted.
+    """
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name="payables")
+    date = models.DateField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    purchases = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("supplier", "date")
+
+    def __str__(self):
+        return f"{self.supplier_id} @ {self.date}: {self.balance}"
+
+
+class PurchaseOrder(models.Model):
+    """
+    An order to a supplier that has not been received yet. DRAFT orders
+    are written by `manage.py suggest_purchase_orders` (see reorder.py) and
+    replaced on every run; once ORDERED their lines count as stock on the
+    way. Receiving the goods is still a Purchase, which is what moves
+    stock and payables.
+    """
+    STATUS_CHOICES = (
+        ("DRAFT", "Draft"),
+        ("ORDERED", "Ordered"),
+        ("RECEIVED", "Received"),
+        ("CANCELLED", "Cancelled"),
+    )
+
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name="orders")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="DRAFT")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    notes = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "supplier"], name="purchaseorder_status_idx")]
+
+    def __str__(self):
+        return f"PO {self.pk} ({self.get_status_display()}) - {self.supplier}"
+
+
+class PurchaseOrderItem(models.Model):
+    order = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name="items")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="order_items")
+    qty = models.PositiveIntegerField()
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+
+    # why it was suggested: blended units sold per day and how many days
+    # the stock on hand (plus open orders) would have lasted at that rate
+    daily_sales = models.DecimalField(max_digits=10, decimal_places=3, default=0)
+    days_of_cover = models.DecimalField(max_digits=10, decimal_places=1, null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.product_id} x {self.qty}"
+
+
 # =====================================================
 # 9. OTP & SYSTEM SETTINGS
 # =====================================================
@@ -0,0 +1,187 @@
+# app/outbox.py
+#
+# Queued sale ingestion.
+#
+# With SALES_INGESTION_MODE = "queued" the sale views only validate the
+# invoice, reserve its number and append it to the SaleOutbox table (one
+# small INSERT), then return. The process_sale_outbox worker drains the
+# table and commits many sales per transaction.
+#
+# Replay is crash safe: a sale and its outbox row are marked DONE in the
+# same transaction, so after a crash an entry is either fully posted or
+# still waiting. Entries stuck in PROCESSING longer than the lease are put
+# back to PENDING by release_stale(), which the worker runs whenever the
+# queue is empty and at least once per lease. A failed entry that may be
+# retried waits SALE_OUTBOX_RETRY_SECONDS, doubling on each attempt,
+# before it can be claimed again.
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Product, Sales, SaleOutbox
+from .services import InsufficientStock, PostingError, parse_optional_decimal, post_sale
+
+
+def queued_ingestion_enabled():
+    return getattr(settings, "SALES_INGESTION_MODE", "sync") == "queued"
+
+
+# ---------------------------
+# Producer side (views)
+# ---------------------------
+
+def validate_sale(lines):
+    """Cheap up-front checks so the cashier hears about bad input now."""
+    if not lines:
+        raise PostingError("Please add at least one product.")
+    ids = {line["product_id"] for line in lines}
+    found = set(Product.objects.filter(pk__in=ids).values_list("pk", flat=True))
+    if ids - found:
+        raise PostingError(f"Unknown product(s): {', '.join(map(str, sorted(ids - found)))}")
+
+
+def enqueue_sale(header, lines, invoice_no, user=None):
+    validate_sale(lines)
+    return SaleOutbox.objects.create(
+        invoice_no=invoice_no,
+        payload={"header": header, "lines": lines},
+        created_by=user if user and user.is_authenticated else None,
+    )
+
+
+def sale_status(invoice_no):
+    """Status dict for an invoice, whether it went through the queue or not."""
+    entry = SaleOutbox.objects.filter(invoice_no=invoice_no).first()
+    if entry:
+        return {
+            "invoice_no": entry.invoice_no,
+            "status": entry.status,
+            "sale_id": entry.sale_id,
+            "error": entry.error,
+            "queued_at": entry.created_at,
+            "processed_at": entry.processed_at,
+        }
+
+    sale_id = Sales.objects.filter(invoice_no=invoice_no).values_list("pk", flat=True).first()
+    if sale_id:
+        return {"invoice_no": invoice_no, "status": "DONE", "sale_id": sale_id}
+    return None
+
+
+# ---------------------------
+# Consumer side (worker)
+# ---------------------------
+
+def _decode(payload):
+    lines = []
+    for line in payload["lines"]:
+        lines.append({
+            "product_id": int(line["product_id"]),
+            "qty": int(line["qty"]),
+            "price": parse_optional_decimal(line.get("price")),
+            "discount": parse_optional_decimal(line.get("discount")),
+            "tax": parse_optional_decimal(line.get("tax")),
+        })
+    return payload["header"], lines
+
+
+def release_stale(lease_seconds=None):
+    """Return entries whose worker died mid-batch to the queue."""
+    lease_seconds = lease_seconds or getattr(settings, "SALE_OUTBOX_LEASE_SECONDS", 300)
+    cutoff = timezone.now() - timedelta(seconds=lease_seconds)
+    return SaleOutbox.objects.filter(status="PROCESSING", claimed_at__lt=cutoff).update(
+        status="PENDING", claimed_at=None
+    )
+
+
+def retry_delay(attempts):
+    """Backoff before an entry that has failed `attempts` times is retried."""
+    base = getattr(settings, "SALE_OUTBOX_RETRY_SECONDS", 30)
+    return timedelta(seconds=base * 2 ** max(attempts - 1, 0))
+
+
+def claim_batch(size):
+    """
+    Move up to `size` PENDING entries that are due to PROCESSING and
+    return their ids. The UPDATE re-checks the status, so two workers
+    never claim the same entry.
+    """
+    with transaction.atomic():
+        due = Q(available_at__isnull=True) | Q(available_at__lte=timezone.now())
+        ids = list(
+            SaleOutbox.objects.filter(due, status="PENDING")
+            .order_by("id")
+            .values_list("id", flat=True)[:size]
+        )
+        if not ids:
+            return []
+        now = timezone.now()
+        SaleOutbox.objects.filter(pk__in=ids, status="PENDING").update(
+            status="PROCESSING", claimed_at=now
+        )
+        return list(
+            SaleOutbox.objects.filter(pk__in=ids, status="PROCESSING", claimed_at=now)
+            .values_list("id", flat=True)
+        )
+
+
+def process_batch(ids, max_attempts=None):
+    """
+    Commit a claimed batch in one transaction. Each sale gets its own
+    savepoint so a bad entry is marked FAILED without sinking the rest.
+    Returns (done, failed).
+    """
+    max_attempts = max_attempts or getattr(settings, "SALE_OUTBOX_MAX_ATTEMPTS", 3)
+    done = failed = 0
+
+    with transaction.atomic():
+        entries = list(SaleOutbox.objects.filter(pk__in=ids, status="PROCESSING").order_by("id"))
+        now = timezone.now()
+
+        for entry in entries:
+            entry.attempts += 1
+            entry.processed_at = now
+            try:
+                existing = Sales.objects.filter(invoice_no=entry.invoice_no).first()
+                if existing:
+                    # already posted (e.g. replay after a partial failure)
+                    entry.sale = existing
+                else:
+                    header, lines = _decode(entry.payload)
+                    entry.sale = post_sale(header, lines, invoice_no=entry.invoice_no)
+                entry.status = "DONE"
+                entry.error = ""
+                done += 1
+            except Exception as exc:
+                # short stock will not fix itself on a retry
+                final = isinstance(exc, InsufficientStock) or entry.attempts >= max_attempts
+                entry.status = "FAILED" if final else "PENDING"
+                entry.error = str(exc)
+                entry.claimed_at = None
+                entry.available_at = None if final else now + retry_delay(entry.attempts)
+                failed += 1
+
+        SaleOutbox.objects.bulk_update(
+            entries, ["status", "attempts", "error", "sale", "claimed_at", "processed_at", "available_at"]
+        )
+
+    return done, failed
+
+
+def drain(batch_size=100):
+    """
+    Process batches until no entry is due. Entries waiting out a retry
+    delay are left for a later run. Returns (done, failed).
+    """
+    done = failed = 0
+    while True:
+        ids = claim_batch(batch_size)
+        if not ids:
+            return done, failed
+        d, f = process_batch(ids)
+        done += d
+        failed += f
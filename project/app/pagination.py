@@ -0,0 +1,121 @@
+# app/pagination.py
+#
+# Keyset ("seek") pagination for list views.
+#
+# OFFSET pagination makes the database walk past every earlier row, so
+# page 5,000 costs 5,000 pages of work. Here a page is "the next `limit`
+# rows after the last row of the previous page" in a fixed (key, id)
+# order; with an index on (key, id) (plus any equality filters in front)
+# every page is one index seek, however deep.
+#
+# The cursor handed to the client is the last row's "<key>:<id>".
+#
+# List views go through paginate(), which reads ?sort=, ?per_page= and
+# ?after= from the request. Only columns listed in a view's `sorts` can
+# be sorted on, and each of them has a (column, id) or unique index.
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+PAGE_SIZES = (25, 50, 100, 200)
+DEFAULT_PAGE_SIZE = 50
+
+
+def keyset_page(qs, key, after=None, limit=50, descending=True):
+    """
+    One page of `qs` ordered by (key, id), newest first when `descending`.
+    `after` is a cursor from the previous page (or None for the first).
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Raises ValueError for a malformed cursor.
+    """
+    if after:
+        value, pk = decode_cursor(qs.model, key, after)
+        op = "lt" if descending else "gt"
+        # "key <= value" first keeps it a plain index range on every backend
+        qs = qs.filter(
+            Q(**{f"{key}__{op}e": value}),
+            Q(**{f"{key}__{op}": value}) | Q(**{f"id__{op}": pk}),
+        )
+
+    order = [f"-{key}", "-id"] if descending else [key, "id"]
+    if key == "id":
+        order = order[:1]
+    rows = list(qs.order_by(*order)[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1], key) if more else None
+    return rows, next_cursor
+
+
+def encode_cursor(row, key):
+    value = row[key] if isinstance(row, dict) else getattr(row, key)
+    pk = row["id"] if isinstance(row, dict) else row.pk
+    return f"{value.isoformat() if hasattr(value, 'isoformat') else value}:{pk}"
+
+
+def decode_cursor(model, key, cursor):
+    value, _, pk = str(cursor).rpartition(":")
+    try:
+        value, pk = model._meta.get_field(key).to_python(value), int(pk)
+    except (ValidationError, ValueError):
+        value = None
+    if value is None:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return value, pk
+
+
+def paginate(request, qs, sorts, default_sort, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Keyset-paginate `qs` for a list view. `sorts` maps the names allowed
+    in ?sort= to indexed model fields; "-name" sorts descending. The page
+    size comes from ?per_page= (one of PAGE_SIZES) and the position from
+    ?after=. Returns the template context: rows, sort, per_page,
+    first_url, next_url, size_urls (page size -> link) and sort_urls
+    (name -> link that sorts by that column, or reverses it when it is
+    the current one).
+    Raises ValueError for a malformed cursor.
+    """
+    sort = request.GET.get("sort") or default_sort
+    if sort.lstrip("-") not in sorts:
+        sort = default_sort
+    try:
+        per_page = int(request.GET.get("per_page", page_size))
+    except ValueError:
+        per_page = page_size
+    if per_page not in PAGE_SIZES:
+        per_page = page_size
+
+    rows, next_cursor = keyset_page(
+        qs, sorts[sort.lstrip("-")], request.GET.get("after"), per_page, sort.startswith("-"),
+    )
+
+    params = request.GET.copy()
+    params.pop("after", None)
+    next_url = None
+    if next_cursor:
+        following = params.copy()
+        following["after"] = next_cursor
+        next_url = f"?{following.urlencode()}"
+
+    size_urls = {}
+    for size in PAGE_SIZES:
+        resized = params.copy()
+        resized["per_page"] = size
+        size_urls[size] = f"?{resized.urlencode()}"
+
+    sort_urls = {}
+    for name in sorts:
+        resort = params.copy()
+        resort["sort"] = f"-{name}" if sort == name else name
+        sort_urls[name] = f"?{resort.urlencode()}"
+
+    return {
+        "rows": rows,
+        "sort": sort,
+        "per_page": per_page,
+        "first_url": f"?{params.urlencode()}" if "after" in request.GET else None,
+        "next_url": next_url,
+        "size_urls": size_urls,
+        "sort_urls": sort_urls,
+    }
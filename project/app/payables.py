@@ -0,0 +1,157 @@
+# app/payables.py
+#
+# Supplier payables and aging.
+#
+# Ageing buckets move every day, so what is kept precomputed is the open
+# balance per (supplier, purchase date) in SupplierPayable. Every change
+# to a purchase moves its balance from its old (supplier, date) to its
+# new one:
+#
+#   created   + balance
+#   edited    - old balance at old key, + new balance at new key
+#   paid      the same as edited (amount_paid lowers the balance)
+#   deleted   - balance
+#
+# signals.py reads the stored balance in pre_save and calls
+# move_balance() from post_save / post_delete, so every view and the admin are covered; bulk writes
+# that skip signals must call rebuild_payables() afterwards (or run
+# `manage.py rebuild_payables`).
+#
+# The report then buckets that table by age in a single aggregate over
+# rows with an open balance, never touching app_purchase.
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.utils import timezone
+
+from .models import Purchase, SupplierPayable
+
+
+ZERO = Decimal("0")
+BUCKETS = (
+    # name, oldest age in days (inclusive), youngest
+    ("current", 30, None),
+    ("days_31_60", 60, 31),
+    ("days_61_90", 90, 61),
+    ("over_90", None, 91),
+)
+
+
+# ---------------------------
+# Incremental upkeep
+# ---------------------------
+
+def _key(supplier_id, day, balance):
+    """(supplier_id, date, open balance) of one purchase, or None when settled."""
+    balance = Decimal(balance or 0)
+    if not supplier_id or balance <= 0:
+        return None
+    return supplier_id, Purchase._meta.get_field("date").to_python(day), balance
+
+
+def open_balance(purchase):
+    """What a saved-or-about-to-be-saved Purchase contributes."""
+    return _key(purchase.supplier_id, purchase.date, purchase.balance)
+
+
+def stored_balance(pk):
+    """The same for the row as it is in the database (before a save)."""
+    row = Purchase.objects.filter(pk=pk).values_list("supplier_id", "date", "balance").first()
+    return _key(*row) if row else None
+
+
+def _add(supplier_id, day, amount, count):
+    updated = SupplierPayable.objects.filter(supplier_id=supplier_id, date=day).update(
+        balance=F("balance") + amount, purchases=F("purchases") + count,
+    )
+    if not updated:
+        if count < 0 or amount <= 0:
+            # already gone, e.g. cascaded away with its supplier
+            return
+        SupplierPayable.objects.create(supplier_id=supplier_id, date=day, balance=amount, purchases=count)
+    elif count < 0:
+        SupplierPayable.objects.filter(supplier_id=supplier_id, date=day, purchases__lte=0).delete()
+
+
+def move_balance(before, after):
+    """Apply the change of one purchase from `before` to `after` (either may be None)."""
+    if before == after:
+        return
+    with transaction.atomic():
+        if before and after and before[:2] == after[:2]:
+            _add(before[0], before[1], after[2] - before[2], 0)
+            return
+        if before:
+            _add(before[0], before[1], -before[2], -1)
+        if after:
+            _add(after[0], after[1], after[2], 1)
+
+
+def rebuild_payables():
+    """
+    Recompute SupplierPayable from app_purchase in one grouped query; for
+    after bulk writes that skipped the signals. Returns the number of rows.
+    """
+    rows = (
+        Purchase.objects.filter(balance__gt=0)
+        .values("supplier_id", "date")
+        .annotate(total=Sum("balance"), n=Count("id"))
+    )
+    SupplierPayable.objects.all().delete()
+    created = SupplierPayable.objects.bulk_create(
+        [SupplierPayable(supplier_id=r["supplier_id"], date=r["date"], balance=r["total"], purchases=r["n"])
+         for r in rows],
+        batch_size=2000,
+    )
+    return len(created)
+
+
+# ---------------------------
+# Report
+# ---------------------------
+
+def _bucket_filter(today, oldest, youngest):
+    q = Q()
+    if oldest is not None:
+        q &= Q(date__gte=today - timedelta(days=oldest))
+    if youngest is not None:
+        q &= Q(date__lte=today - timedelta(days=youngest))
+    return q
+
+
+def aging_report(as_of=None, supplier_id=None):
+    """
+    Outstanding payables per supplier as of `as_of` (default today),
+    largest first: dicts with supplier_id, supplier_name, outstanding,
+    purchases, oldest (purchase date) and one amount per BUCKETS entry.
+    Purchases dated in the future count as current.
+    """
+    today = as_of or timezone.localdate()
+    qs = SupplierPayable.objects.all()
+    if supplier_id is not None:
+        qs = qs.filter(supplier_id=supplier_id)
+
+    buckets = {name: Sum("balance", filter=_bucket_filter(today, oldest, youngest), default=ZERO)
+               for name, oldest, youngest in BUCKETS}
+    return list(
+        qs.values("supplier_id")
+        .annotate(
+            supplier_name=F("supplier__supplier_name"),
+            outstanding=Sum("balance"),
+            purchases=Sum("purchases"),
+            oldest=Min("date"),
+            **buckets,
+        )
+        .order_by("-outstanding")
+    )
+
+
+def aging_totals(rows):
+    """Column totals of aging_report() rows."""
+    return {
+        key: sum((r[key] for r in rows), ZERO)
+        for key in ("outstanding", *(name for name, _, _ in BUCKETS))
+    }
@@ -0,0 +1,127 @@
+# app/price_revision.py
+#
+# Bulk selling-price revisions ("+5% on all beverages").
+#
+# A revision picks products by category, subcategory, brand and status
+# and reprices them with one rule:
+#
+#   PERCENT   selling_price * (1 + value/100)
+#   ABSOLUTE  selling_price + value
+#   MARGIN    cost_price * (1 + value/100)
+#
+# The new price is an SQL expression, so nothing is loaded into Python:
+# applying a revision is one INSERT ... SELECT that writes the audit rows
+# (PriceChange: old and new price per product) and one UPDATE that copies
+# the new prices from them, whatever the number of products. Products the
+# rule cannot price (no base price, or a result below zero) or would not
+# change are left out, and the preview counts them.
+#
+# The UPDATE fires no signals, so the catalogue is invalidated on commit.
+
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Round
+
+from . import catalog
+from .models import PriceChange, PriceRevision, Product
+from .pricing import to_cents
+
+
+HUNDRED = Decimal("100")
+BASE_FIELD = {"PERCENT": "selling_price", "ABSOLUTE": "selling_price", "MARGIN": "cost_price"}
+
+
+def product_filter(category=None, subcategory=None, brand="", status=""):
+    """Q for the products a revision applies to; empty filters match all."""
+    q = Q()
+    if category:
+        q &= Q(category=category)
+    if subcategory:
+        q &= Q(subcategory=subcategory)
+    if brand:
+        q &= Q(brand__iexact=brand)
+    if status:
+        q &= Q(status=status)
+    return q
+
+
+def new_price(rule, value):
+    """The rule's new selling price as an expression over Product columns."""
+    value = Decimal(value)
+    base = F(BASE_FIELD[rule])
+    money = DecimalField(max_digits=10, decimal_places=2)
+    if rule == "ABSOLUTE":
+        price = base + Value(value, output_field=money)
+    else:
+        factor = 1 + value / HUNDRED
+        price = base * Value(factor, output_field=DecimalField(max_digits=12, decimal_places=6))
+    return Round(price, 2, output_field=money)
+
+
+def _candidates(rule, value, filters):
+    return (
+        Product.objects.filter(product_filter(**filters), **{f"{BASE_FIELD[rule]}__isnull": False})
+        .annotate(new_price=new_price(rule, value))
+    )
+
+
+# Rows that actually get repriced: priceable and different from today.
+REPRICED = Q(new_price__gte=0) & ~Q(selling_price=F("new_price"))
+
+
+def preview_revision(rule, value, sample=10, **filters):
+    """
+    What apply_revision() would do, without writing anything:
+    {"matched": products the filters select, "repriced": products that
+    would change, "skipped": matched but unpriceable or unchanged,
+    "sample": a few {product_id, name, old_price, new_price} rows}.
+    """
+    matched = Product.objects.filter(product_filter(**filters)).count()
+    repriced = _candidates(rule, value, filters).aggregate(n=Count("id", filter=REPRICED))["n"]
+    rows = (
+        _candidates(rule, value, filters).filter(REPRICED)
+        .order_by("name")
+        .values("product_id", "name", "new_price", old_price=F("selling_price"))[:sample]
+    )
+    # the database hands back the rounded expression unquantized (SQLite:
+    # a float); show it as the DECIMAL(10, 2) column apply will store
+    sample = [
+        {**row, "new_price": to_cents(row["new_price"]), "old_price": to_cents(row["old_price"])}
+        for row in rows
+    ]
+    return {"matched": matched, "repriced": repriced, "skipped": matched - repriced, "sample": sample}
+
+
+@transaction.atomic
+def apply_revision(rule, value, user=None, note="", **filters):
+    """Reprice the selected products; returns the saved PriceRevision."""
+    revision = PriceRevision.objects.create(
+        rule=rule, value=value, note=note, created_by=user,
+        category=filters.get("category"), subcategory=filters.get("subcategory"),
+        brand=filters.get("brand") or "", status=filters.get("status") or "",
+    )
+
+    select = (
+        _candidates(rule, value, filters).filter(REPRICED)
+        .values_list(Value(revision.pk), "id", "selling_price", "new_price")
+    )
+    sql, params = select.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {PriceChange._meta.db_table} (revision_id, product_id, old_price, new_price) {sql}",
+            params,
+        )
+        revision.products = cursor.rowcount
+
+    if revision.products:
+        Product.objects.filter(price_changes__revision=revision).update(
+            selling_price=Subquery(
+                PriceChange.objects.filter(revision=revision, product=OuterRef("pk")).values("new_price")
+            ),
+            version=F("version") + 1,
+        )
+        transaction.on_commit(catalog.invalidate)
+    revision.save(update_fields=["products"])
+    return revision
@@ -0,0 +1,180 @@
+# app/pricing.py
+#
+# Server-side invoice arithmetic. Totals sent by the browser are never
+# trusted; every view, the outbox worker and the bulk importers price
+# lines through here so the numbers always agree.
+#
+# All maths is Decimal. Each line's discount and tax are rounded to cents
+# and the invoice totals are sums of the rounded line amounts, so printed
+# lines always add up to the printed total.
+#
+# Sales lines (dicts, see services.parse_sale_lines) carry discount and
+# tax as PERCENTAGES. Purchase lines (PurchaseItem objects) carry them as
+# AMOUNTS, which is what the purchase form has always entered.
+#
+# A purchase's other_charges (freight, duty, ...) are spread over its
+# lines by value or by quantity, so each line knows its landed unit cost:
+# (gross - discount + share of charges) / qty. Tax is not part of it; it
+# is claimed back, not a cost.
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+
+
+ZERO = Decimal("0")
+CENT = Decimal("0.01")
+HUNDRED = Decimal("100")
+
+
+def to_cents(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def as_decimal(value):
+    if value is None:
+        return ZERO
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+
+def default_tax_rate():
+    """SystemConfig.default_tax as a Decimal percentage (0 if not configured)."""
+    from .models import SystemConfig
+
+    rate = SystemConfig.objects.values_list("default_tax", flat=True).first()
+    return as_decimal(rate)
+
+
+# ---------------------------
+# Sales
+# ---------------------------
+
+def sale_line_amounts(qty, price, discount_pct, tax_pct):
+    """Return (taxable, tax, total) for one sales line, rounded to cents."""
+    gross = to_cents(price * qty)
+    discount = to_cents(gross * discount_pct / HUNDRED)
+    taxable = gross - discount
+    tax = to_cents(taxable * tax_pct / HUNDRED)
+    return taxable, tax, taxable + tax
+
+
+def price_sale_lines(lines, products, default_tax=None, allow_overrides=None):
+    """
+    Price every line of a sale in one pass and return the invoice totals.
+
+    `products` maps product pk -> Product (as from in_bulk). A line's
+    price, discount and tax come from the line when given (the cashier may
+    override them) and otherwise from the product: selling_price,
+    Product.discount and Product.tax, falling back to
+    SystemConfig.default_tax. With PRICING_ALLOW_LINE_OVERRIDES = False the
+    product values always win.
+
+    Fills in price/discount/tax/total on each line dict and returns
+    {"subtotal", "total_tax", "grand_total"}.
+    """
+    if allow_overrides is None:
+        allow_overrides = getattr(settings, "PRICING_ALLOW_LINE_OVERRIDES", True)
+    if default_tax is None and any(
+        p.tax is None for p in (products[line["product_id"]] for line in lines)
+    ):
+        default_tax = default_tax_rate()
+
+    subtotal = total_tax = ZERO
+    for line in lines:
+        product = products[line["product_id"]]
+
+        price = line.get("price") if allow_overrides else None
+        discount = line.get("discount") if allow_overrides else None
+        tax = line.get("tax") if allow_overrides else None
+
+        if price is None:
+            price = product.selling_price
+        if discount is None:
+            discount = product.discount
+        if tax is None:
+            tax = product.tax if product.tax is not None else default_tax
+
+        price, discount, tax = as_decimal(price), as_decimal(discount), as_decimal(tax)
+        taxable, tax_amount, total = sale_line_amounts(line["qty"], price, discount, tax)
+
+        line["price"], line["discount"], line["tax"], line["total"] = price, discount, tax, total
+        subtotal += taxable
+        total_tax += tax_amount
+
+    return {
+        "subtotal": subtotal,
+        "total_tax": total_tax,
+        "grand_total": subtotal + total_tax,
+    }
+
+
+# ---------------------------
+# Purchases
+# ---------------------------
+
+def allocate(total, weights):
+    """
+    Split `total` in proportion to `weights`, in cents that add up to it
+    exactly: each share is the rounded running total minus the previous
+    one. Equal shares when the weights sum to zero.
+    """
+    weights = [max(as_decimal(w), ZERO) for w in weights]
+    whole = sum(weights, ZERO)
+    if not whole:
+        weights, whole = [Decimal(1)] * len(weights), Decimal(len(weights))
+    shares, running, placed = [], ZERO, ZERO
+    for weight in weights:
+        running += weight
+        upto = to_cents(total * running / whole)
+        shares.append(upto - placed)
+        placed = upto
+    return shares
+
+
+def allocate_other_charges(items, other_charges, basis="VALUE"):
+    """
+    Set `charges` (share of other_charges) and `landed_cost` (per unit) on
+    priced PurchaseItem objects. `basis` is Purchase.cost_allocation:
+    VALUE spreads by net line value, QUANTITY by units.
+    """
+    if basis == "QUANTITY":
+        weights = [item.qty for item in items]
+    else:
+        weights = [item.line_total - as_decimal(item.tax) for item in items]
+    for item, share in zip(items, allocate(as_decimal(other_charges), weights)):
+        qty = as_decimal(item.qty)
+        item.charges = share
+        item.landed_cost = (
+            to_cents(max(item.line_total - as_decimal(item.tax) + share, ZERO) / qty) if qty > 0 else None
+        )
+
+
+def price_purchase_items(items, other_charges=ZERO, amount_paid=ZERO, basis="VALUE"):
+    """
+    Price PurchaseItem objects in one pass (discount and tax are amounts
+    per line), set each item's line_total, charges and landed_cost, and
+    return the header totals: subtotal, discount_total, tax_total,
+    grand_total and balance.
+    """
+    subtotal = discount_total = tax_total = ZERO
+    for item in items:
+        gross = to_cents(as_decimal(item.qty) * as_decimal(item.unit_price))
+        discount = as_decimal(item.discount)
+        tax = as_decimal(item.tax)
+
+        item.line_total = gross - discount + tax
+        subtotal += gross
+        discount_total += discount
+        tax_total += tax
+
+    allocate_other_charges(items, other_charges, basis)
+    grand_total = subtotal - discount_total + tax_total + as_decimal(other_charges)
+    return {
+        "subtotal": subtotal,
+        "discount_total": discount_total,
+        "tax_total": tax_total,
+        "grand_total": grand_total,
+        "balance": max(grand_total - as_decimal(amount_paid), ZERO),
+    }
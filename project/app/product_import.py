@@ -0,0 +1,370 @@
+# app/product_import.py
+#
+# Bulk product upsert from supplier price lists (CSV or XLSX).
+#
+# Files are read a row at a time (csv.reader, or openpyxl in read-only
+# mode, which streams the sheet XML instead of building every cell) and
+# written in chunks of `chunk_size` rows, one transaction each:
+#
+#   1. parse and validate the rows of the chunk
+#   2. load the products of the chunk by product_id in one query
+#   3. drop rows that would change nothing, fill blank cells of the rest
+#      from the existing product (a blank cell means "leave as is")
+#   4. one bulk_create(update_conflicts=True) keyed on product_id inserts
+#      new products and updates existing ones
+#
+# Rejected rows go straight to a CSV error report, so neither the file nor
+# the report is ever held in memory.
+#
+# Stock is not a price-list column: `quantity` is only used as the opening
+# stock of products the import creates (with an OPENING ledger row).
+# Existing products keep their quantity, which only moves through
+# services.adjust_stock().
+#
+# bulk_create fires no signals, so the catalogue is invalidated after each
+# chunk commits; the FTS triggers (see search.py) keep search in step.
+
+import csv
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F
+
+from . import catalog
+from .models import Category, Product, StockMovement, SubCategory
+
+try:
+    import openpyxl
+except Exception:
+    openpyxl = None
+
+
+TEXT_FIELDS = {
+    # column: max length (None = TextField)
+    "name": 200,
+    "barcode": 64,
+    "brand": 100,
+    "description": None,
+    "supplier_name": 200,
+    "supplier_contact": 20,
+    "notes": None,
+}
+DECIMAL_FIELDS = {
+    # column: upper bound from max_digits / decimal_places
+    "cost_price": Decimal("100000000"),
+    "selling_price": Decimal("100000000"),
+    "discount": Decimal("1000"),
+    "tax": Decimal("1000"),
+}
+COLUMNS = (
+    "product_id", *TEXT_FIELDS, *DECIMAL_FIELDS,
+    "category", "subcategory", "reorder_level", "status", "quantity",
+)
+# Written on conflict. product_id is the key and quantity is stock.
+UPDATABLE = tuple(c for c in COLUMNS if c not in ("product_id", "quantity"))
+
+CENT = Decimal("0.01")
+STATUSES = {
+    **{key.lower(): key for key, _ in Product.STATUS_CHOICES},
+    **{label.lower(): key for key, label in Product.STATUS_CHOICES},
+}
+
+
+class ImportFileError(ValueError):
+    """The file as a whole cannot be imported (bad format or header)."""
+
+
+# ---------------------------
+# Reading
+# ---------------------------
+
+def _header(cells):
+    return [str(c or "").strip().lower().replace(" ", "_") for c in cells]
+
+
+def _check_decodes(fh, block=1 << 16):
+    """
+    Decode the whole text file once, a block at a time, before any row is
+    imported: chunks commit as they go, so a bad byte found halfway would
+    leave the file half imported.
+    """
+    try:
+        for _ in iter(lambda: fh.read(block), ""):
+            pass
+    except UnicodeDecodeError as exc:
+        raise ImportFileError(f"Not a readable CSV file: {exc}")
+    fh.seek(0)
+
+
+def read_rows(fh, fmt):
+    """
+    (header, rows) for an open file: `rows` yields (row_no, cells) with
+    row_no counted from 1 at the header, as a spreadsheet shows it. CSV
+    files must be opened in text mode, XLSX files in binary mode.
+    """
+    if fmt == "xlsx":
+        if openpyxl is None:
+            raise ImportFileError("XLSX import needs openpyxl installed.")
+        try:
+            book = openpyxl.load_workbook(fh, read_only=True, data_only=True)
+        except Exception as exc:
+            raise ImportFileError(f"Not a readable XLSX file: {exc}")
+        records = book.active.iter_rows(values_only=True)
+    elif fmt == "csv":
+        _check_decodes(fh)
+        records = csv.reader(fh)
+    else:
+        raise ImportFileError(f"Unsupported format {fmt!r}.")
+
+    try:
+        header = _header(next(records))
+    except StopIteration:
+        raise ImportFileError("The file is empty.")
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise ImportFileError(f"Not a readable CSV file: {exc}")
+    if "product_id" not in header:
+        raise ImportFileError("Missing column: product_id.")
+    return header, enumerate(records, start=2)
+
+
+def _cell(value):
+    """Cell value as a stripped string ('' when blank)."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)   # Excel keeps codes and counts as floats
+    return str(value).strip()
+
+
+# ---------------------------
+# Parsing
+# ---------------------------
+
+class RowParser:
+    """
+    Turns one row into {field: value} for the columns that are filled in,
+    or a list of error messages. Category and subcategory names are
+    resolved from lookup tables loaded once per import.
+    """
+
+    def __init__(self, header):
+        self.header = header
+        self.columns = [c for c in header if c in COLUMNS]
+        self.categories = {
+            name.lower(): pk
+            for pk, name in Category.objects.exclude(category_name=None).values_list("id", "category_name")
+        }
+        self.subcategories = {
+            (cat, name.lower()): pk
+            for pk, cat, name in SubCategory.objects.exclude(subcategory_name=None)
+            .values_list("id", "category_id", "subcategory_name")
+        }
+
+    def parse(self, cells):
+        raw = {c: _cell(v) for c, v in zip(self.header, cells) if c in COLUMNS}
+        values, errors = {}, []
+
+        for column, text in raw.items():
+            if not text:
+                continue
+            try:
+                if column == "product_id":
+                    values[column] = self._text(text, 50)
+                elif column in TEXT_FIELDS:
+                    values[column] = self._text(text, TEXT_FIELDS[column])
+                elif column in DECIMAL_FIELDS:
+                    values[column] = self._decimal(text, DECIMAL_FIELDS[column])
+                elif column in ("quantity", "reorder_level"):
+                    values[column] = self._count(text)
+                elif column == "status":
+                    if text.lower() not in STATUSES:
+                        raise ValueError(f"unknown status {text!r}")
+                    values[column] = STATUSES[text.lower()]
+                elif column == "category":
+                    if text.lower() not in self.categories:
+                        raise ValueError(f"unknown category {text!r}")
+                    values["category_id"] = self.categories[text.lower()]
+            except ValueError as exc:
+                errors.append(f"{column}: {exc}")
+
+        if raw.get("subcategory"):
+            if "category_id" in values:
+                key = (values["category_id"], raw["subcategory"].lower())
+                if key in self.subcategories:
+                    values["subcategory_id"] = self.subcategories[key]
+                else:
+                    errors.append(f"subcategory: {raw['subcategory']!r} is not in category {raw['category']!r}")
+            elif not raw.get("category"):
+                errors.append("subcategory: needs the category column filled in")
+
+        if "product_id" not in values and not any("product_id" in e for e in errors):
+            errors.append("product_id: required")
+        return errors or values
+
+    @staticmethod
+    def _text(text, max_length):
+        if max_length and len(text) > max_length:
+            raise ValueError(f"longer than {max_length} characters")
+        return text
+
+    @staticmethod
+    def _decimal(text, bound):
+        value = RowParser._number(text.replace(",", ""))
+        if 0 <= value < bound:
+            value = value.quantize(CENT, ROUND_HALF_UP)
+        if not 0 <= value < bound:
+            raise ValueError(f"out of range: {text}")
+        return value
+
+    @staticmethod
+    def _count(text):
+        value = RowParser._number(text)
+        if value < 0 or value != value.to_integral_value():
+            raise ValueError(f"not a whole number: {text!r}")
+        return int(value)
+
+    @staticmethod
+    def _number(text):
+        try:
+            value = Decimal(text)
+        except InvalidOperation:
+            value = None
+        if value is None or not value.is_finite():
+            raise ValueError(f"not a number: {text!r}")
+        return value
+
+
+# ---------------------------
+# Writing
+# ---------------------------
+
+# Parsed column -> Product field
+FIELD = {"category": "category_id", "subcategory": "subcategory_id"}
+
+
+def _fields(columns):
+    return [FIELD.get(c, c) for c in columns if c in UPDATABLE]
+
+
+class ProductImporter:
+    """
+    Upsert products from `fh`, writing rejected rows to `report` (a text
+    file, as CSV: row, product_id, error). `stats` counts rows, created,
+    updated, unchanged and errors.
+    """
+
+    def __init__(self, report, chunk_size=2000, dry_run=False):
+        self.report = csv.writer(report)
+        self.report.writerow(["row", "product_id", "error"])
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.stats = dict.fromkeys(("rows", "created", "updated", "unchanged", "errors"), 0)
+
+    def run(self, fh, fmt):
+        header, rows = read_rows(fh, fmt)
+        self.parser = RowParser(header)
+        self.fields = _fields(self.parser.columns)
+        self.code_col = header.index("product_id")
+
+        rows = ((n, cells) for n, cells in rows if any(_cell(v) for v in cells))
+        for chunk in iter(lambda: list(islice(rows, self.chunk_size)), []):
+            self.import_chunk(chunk)
+        return self.stats
+
+    def reject(self, row_no, product_id, error):
+        self.stats["errors"] += 1
+        self.report.writerow([row_no, product_id, error])
+
+    def parse_chunk(self, chunk):
+        """{product_id: (row_no, values)}; the last row wins for repeated codes."""
+        parsed = {}
+        for row_no, cells in chunk:
+            self.stats["rows"] += 1
+            values = self.parser.parse(cells)
+            if isinstance(values, list):
+                code = _cell(cells[self.code_col]) if self.code_col < len(cells) else ""
+                self.reject(row_no, code, "; ".join(values))
+                continue
+            code = values["product_id"]
+            if code in parsed:
+                self.reject(parsed[code][0], code, f"product_id repeated on row {row_no}, which was used instead")
+            parsed[code] = (row_no, values)
+        return parsed
+
+    def check_barcodes(self, parsed):
+        """Reject rows whose barcode is taken by another product."""
+        claimed = {}
+        for code, (row_no, values) in list(parsed.items()):
+            barcode = values.get("barcode")
+            if barcode is None:
+                continue
+            if barcode in claimed:
+                self.reject(row_no, code, f"barcode: also given on row {parsed[claimed[barcode]][0]}")
+                del parsed[code]
+            else:
+                claimed[barcode] = code
+
+        owners = Product.objects.filter(barcode__in=claimed).values_list("barcode", "product_id")
+        for barcode, owner in owners:
+            code = claimed[barcode]
+            if owner != code:
+                self.reject(parsed[code][0], code, f"barcode: already used by product {owner}")
+                del parsed[code]
+
+    @transaction.atomic
+    def import_chunk(self, chunk):
+        parsed = self.parse_chunk(chunk)
+        self.check_barcodes(parsed)
+        if not parsed:
+            return
+
+        existing = {
+            row["product_id"]: row
+            for row in Product.objects.filter(product_id__in=parsed).values("id", "product_id", *self.fields)
+        }
+
+        objs, created, updated = [], [], []
+        for code, (row_no, values) in parsed.items():
+            current = existing.get(code)
+            if current is None:
+                if "name" not in values:
+                    self.reject(row_no, code, "name: required for a new product")
+                    continue
+                values.setdefault("quantity", 0)
+                values.setdefault("reorder_level", 0)
+                created.append(code)
+            else:
+                changes = {f: v for f, v in values.items() if f in self.fields and current[f] != v}
+                if not changes:
+                    self.stats["unchanged"] += 1
+                    continue
+                values = {**current, **changes}
+                del values["id"]
+                # the conflict branch never writes it, but INSERT needs a value
+                values["quantity"] = 0
+                values.setdefault("reorder_level", 0)
+                updated.append(current["id"])
+            objs.append(Product(**values))
+
+        if objs:
+            if self.fields:
+                Product.objects.bulk_create(
+                    objs, update_conflicts=True, unique_fields=["product_id"], update_fields=self.fields,
+                )
+            else:
+                Product.objects.bulk_create(objs)
+        if updated:
+            Product.objects.filter(id__in=updated).update(version=F("version") + 1)
+        if created:
+            new = Product.objects.filter(product_id__in=created, quantity__gt=0).values_list("id", "quantity")
+            StockMovement.objects.bulk_create(
+                [StockMovement(product_id=pk, qty=qty, reason="OPENING", reference="import") for pk, qty in new]
+            )
+
+        self.stats["created"] += len(created)
+        self.stats["updated"] += len(updated)
+        if self.dry_run:
+            transaction.set_rollback(True)
+        else:
+            transaction.on_commit(catalog.invalidate)
@@ -0,0 +1,199 @@
+# app/reorder.py
+#
+# Purchase-order suggestions from sales velocity.
+#
+# One grouped query sums SalesItem.qty per product for every window at
+# once (SUM ... FILTER per window), so the database returns one short row
+# per product that sold anything, never the raw history. Everything after
+# that is one pass of plain arithmetic per product:
+#
+#   daily_sales    mean of the per-window rates; recent sales fall in
+#                  every window, so they weigh the most
+#   position       quantity on hand + lines of ORDERED purchase orders
+#   days_of_cover  position / daily_sales
+#   reorder        position <= max(reorder_level, daily_sales * lead days)
+#   order qty      enough to last lead + cover days, and to clear the
+#                  reorder level
+#
+# Suggested lines are grouped by the supplier each product was last
+# bought from (falling back to Product.supplier_name) into DRAFT
+# PurchaseOrders. Each run replaces the previous drafts.
+
+import math
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .models import (
+    Product, PurchaseItem, PurchaseOrder, PurchaseOrderItem, SalesItem, Supplier,
+)
+
+
+DEFAULT_WINDOWS = (30, 90, 365)
+LEAD_DAYS = 7
+COVER_DAYS = 30
+EXCLUDED_STATUSES = ("inactive", "discontinued")
+
+
+# ---------------------------
+# Loading
+# ---------------------------
+
+def _products():
+    """(id, quantity, reorder_level) of every product that may be reordered."""
+    return list(
+        Product.objects.exclude(status__in=EXCLUDED_STATUSES)
+        .order_by("id")
+        .values_list("id", "quantity", "reorder_level")
+    )
+
+
+def _units_sold(windows, today):
+    """{product_id: [units sold in each window]} for products that sold anything."""
+    keys = [f"w{w}" for w in windows]
+    per_window = {
+        key: Sum("qty", filter=Q(sale__date__gt=today - timedelta(days=w)))
+        for key, w in zip(keys, windows)
+    }
+    rows = (
+        SalesItem.objects.filter(
+            product__isnull=False,
+            sale__date__gt=today - timedelta(days=max(windows)),
+            sale__date__lte=today,
+        )
+        .values("product_id")
+        .annotate(**per_window)
+        .values_list("product_id", *keys)
+    )
+    return {pk: [float(units or 0) for units in sold] for pk, *sold in rows}
+
+
+def _on_order():
+    """{product_id: units on ORDERED purchase orders}."""
+    rows = (
+        PurchaseOrderItem.objects.filter(order__status="ORDERED")
+        .values("product_id")
+        .annotate(q=Sum("qty"))
+        .values_list("product_id", "q")
+    )
+    return {pk: float(q or 0) for pk, q in rows}
+
+
+# ---------------------------
+# Velocity
+# ---------------------------
+
+def suggest(windows=DEFAULT_WINDOWS, lead_days=LEAD_DAYS, cover_days=COVER_DAYS, today=None):
+    """
+    Products to reorder as a dict of equal-length lists: product_id,
+    qty, daily_sales, days_of_cover (inf when nothing sold).
+    """
+    today = today or timezone.localdate()
+    windows = tuple(sorted(set(windows)))
+
+    products = _products()
+    sold = _units_sold(windows, today)
+    on_order = _on_order()
+    none_sold = [0.0] * len(windows)
+
+    out = {"product_id": [], "qty": [], "daily_sales": [], "days_of_cover": []}
+    for pk, quantity, reorder_level in products:
+        daily = sum(units / w for units, w in zip(sold.get(pk, none_sold), windows)) / len(windows)
+        position = max(quantity, 0) + on_order.get(pk, 0.0)
+
+        reorder_point = max(reorder_level, daily * lead_days)
+        target = max(daily * (lead_days + cover_days), reorder_level + 1)
+        qty = math.ceil(target - position)
+        if position > reorder_point or qty <= 0:
+            continue
+
+        out["product_id"].append(pk)
+        out["qty"].append(qty)
+        out["daily_sales"].append(daily)
+        out["days_of_cover"].append(position / daily if daily > 0 else math.inf)
+    out["scanned"] = len(products)
+    return out
+
+
+# ---------------------------
+# Draft orders
+# ---------------------------
+
+def _suppliers_and_costs(product_ids, chunk=500):
+    """{product_id: (supplier_id or None, cost_price)}."""
+    last_supplier = (
+        PurchaseItem.objects.filter(product=OuterRef("pk"))
+        .order_by("-id")
+        .values("purchase__supplier_id")[:1]
+    )
+    by_name = dict(
+        Supplier.objects.annotate(key=Lower("supplier_name")).values_list("key", "id")
+    )
+    out = {}
+    for i in range(0, len(product_ids), chunk):
+        rows = (
+            Product.objects.filter(pk__in=product_ids[i:i + chunk])
+            .annotate(last_supplier=Subquery(last_supplier))
+            .values_list("id", "last_supplier", "supplier_name", "cost_price")
+        )
+        for pk, supplier_id, name, cost in rows:
+            out[pk] = (supplier_id or by_name.get((name or "").strip().lower()), cost)
+    return out
+
+
+def _decimal(value, places):
+    return None if not math.isfinite(value) else Decimal(f"{value:.{places}f}")
+
+
+@transaction.atomic
+def generate_draft_orders(windows=DEFAULT_WINDOWS, lead_days=LEAD_DAYS, cover_days=COVER_DAYS,
+                          today=None, dry_run=False):
+    """
+    Replace the DRAFT purchase orders with today's suggestions, one order
+    per supplier. Returns counts: scanned, suggested, orders, unassigned
+    (products with no known supplier, left out).
+    """
+    s = suggest(windows, lead_days, cover_days, today)
+    ids = s["product_id"]
+    sources = _suppliers_and_costs(ids)
+
+    lines = defaultdict(list)
+    unassigned = 0
+    for pk, qty, daily, cover in zip(ids, s["qty"], s["daily_sales"], s["days_of_cover"]):
+        supplier_id, cost = sources.get(pk, (None, None))
+        if supplier_id is None:
+            unassigned += 1
+            continue
+        lines[supplier_id].append(PurchaseOrderItem(
+            product_id=pk, qty=qty, unit_cost=cost,
+            daily_sales=_decimal(daily, 3), days_of_cover=_decimal(cover, 1),
+        ))
+
+    stats = {
+        "scanned": s["scanned"], "suggested": len(ids) - unassigned,
+        "orders": len(lines), "unassigned": unassigned,
+    }
+    if dry_run:
+        return stats
+
+    PurchaseOrder.objects.filter(status="DRAFT").delete()
+    orders = PurchaseOrder.objects.bulk_create([
+        PurchaseOrder(
+            supplier_id=supplier_id,
+            total=sum((i.qty * i.unit_cost for i in items if i.unit_cost is not None), Decimal("0")),
+            notes=f"Suggested: {len(items)} products, {lead_days}+{cover_days} days cover",
+        )
+        for supplier_id, items in lines.items()
+    ])
+    for order, items in zip(orders, lines.values()):
+        for item in items:
+            item.order = order
+    PurchaseOrderItem.objects.bulk_create(
+        [item for items in lines.values() for item in items], batch_size=2000,
+    )
+    return stats
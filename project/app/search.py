@@ -0,0 +1,278 @@
+# app/search.py
+#
+# Product typeahead over SQLite FTS5.
+#
+# Two external-content FTS5 tables index app_product without copying its
+# text. Migration 0022 creates them on SQLite, with triggers on
+# app_product that keep them in step with every INSERT, DELETE and UPDATE
+# of the indexed columns, so bulk writes are covered too and stock
+# UPDATEs cost nothing. ensure_index() puts the triggers back after
+# migrations that rebuild app_product:
+#
+#   app_product_fts      unicode61 words of name, product_id, brand and
+#                        supplier_name, with prefix indexes for typeahead
+#   app_product_trigram  trigrams of name and brand, for substring and
+#                        typo-tolerant matching
+#
+# FTS5's bm25 ORDER BY rank has to score every match, which for a short
+# prefix is a large part of the catalogue. Instead each step fetches at
+# most CANDIDATES rowids unranked (an index walk that stops early) and the
+# candidates are ranked here in Python, keeping latency flat in catalogue
+# size. An unranked cap can drop the best match when a term is common, so
+# exact code/barcode hits and names starting with the query are read
+# first, straight from their B-tree indexes, and FTS only fills the rest.
+
+import re
+from difflib import SequenceMatcher
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+
+CANDIDATES = 100
+FIELDS = (
+    "id", "product_id", "name", "brand", "cost_price", "selling_price", "discount", "tax", "quantity", "status",
+)
+
+WORDS_TABLE = "app_product_fts"
+TRIGRAM_TABLE = "app_product_trigram"
+
+
+SCHEMA_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {WORDS_TABLE} USING fts5(
+        name, product_id, brand, supplier_name,
+        content='app_product', content_rowid='id', prefix='2 3'
+    )""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TRIGRAM_TABLE} USING fts5(
+        name, brand,
+        content='app_product', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS app_product_search_ai AFTER INSERT ON app_product BEGIN
+        INSERT INTO {WORDS_TABLE}(rowid, name, product_id, brand, supplier_name)
+            VALUES (new.id, new.name, new.product_id, new.brand, new.supplier_name);
+        INSERT INTO {TRIGRAM_TABLE}(rowid, name, brand) VALUES (new.id, new.name, new.brand);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS app_product_search_ad AFTER DELETE ON app_product BEGIN
+        INSERT INTO {WORDS_TABLE}({WORDS_TABLE}, rowid, name, product_id, brand, supplier_name)
+            VALUES ('delete', old.id, old.name, old.product_id, old.brand, old.supplier_name);
+        INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, name, brand)
+            VALUES ('delete', old.id, old.name, old.brand);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS app_product_search_au
+        AFTER UPDATE OF name, product_id, brand, supplier_name ON app_product BEGIN
+        INSERT INTO {WORDS_TABLE}({WORDS_TABLE}, rowid, name, product_id, brand, supplier_name)
+            VALUES ('delete', old.id, old.name, old.product_id, old.brand, old.supplier_name);
+        INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, name, brand)
+            VALUES ('delete', old.id, old.name, old.brand);
+        INSERT INTO {WORDS_TABLE}(rowid, name, product_id, brand, supplier_name)
+            VALUES (new.id, new.name, new.product_id, new.brand, new.supplier_name);
+        INSERT INTO {TRIGRAM_TABLE}(rowid, name, brand) VALUES (new.id, new.name, new.brand);
+    END""",
+]
+TRIGGERS = ("app_product_search_ai", "app_product_search_ad", "app_product_search_au")
+
+
+def fts_available():
+    return connection.vendor == "sqlite"
+
+
+def rebuild_index():
+    """Re-index every product, e.g. after restoring app_product by hand."""
+    with connection.cursor() as cursor:
+        for table in (WORDS_TABLE, TRIGRAM_TABLE):
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+def ensure_index():
+    """
+    Put back missing sync triggers and re-index. Django rebuilds a SQLite
+    table for many schema changes (new unique fields, altered columns) and
+    the triggers go with the old table, so this runs after every migrate
+    (see signals.py). Does nothing until migration 0022 has created the
+    FTS tables.
+    """
+    if not fts_available():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s, %s)",
+            [WORDS_TABLE, TRIGRAM_TABLE, *TRIGGERS],
+        )
+        present = {name for (name,) in cursor.fetchall()}
+        if not {WORDS_TABLE, TRIGRAM_TABLE} <= present or set(TRIGGERS) <= present:
+            return False
+        for sql in SCHEMA_SQL:
+            cursor.execute(sql)
+    rebuild_index()
+    return True
+
+
+# ---------------------------
+# Query building
+# ---------------------------
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _typo_halves(word):
+    """
+    Split `word` in two. With a single wrong, missing or extra character
+    only one half can be affected, so the other occurs verbatim in the
+    intended word (pigeonhole); halves under 3 characters cannot be looked
+    up in the trigram index and are dropped.
+    """
+    mid = len(word) // 2
+    return [half for half in (word[:mid], word[mid:]) if len(half) >= 3]
+
+
+def _one_edit(a, b):
+    """True when `a` and `b` differ by at most one wrong, missing or extra character."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i + 1:] == b[i + 1:] if len(a) == len(b) else a[i:] == b[i + 1:]
+
+
+def _near_word(word, text):
+    """Some word of `text` starts with `word`, allowing one typo."""
+    n = len(word)
+    return any(
+        _one_edit(word, w[:size]) for w in text.split() for size in (n - 1, n, n + 1)
+    )
+
+
+def _fetch(table, match, exclude):
+    ids = RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s LIMIT %s", [match, CANDIDATES])
+    return [r for r in Product.objects.filter(id__in=ids).values(*FIELDS) if r["id"] not in exclude]
+
+
+def _casings(text):
+    return {text, text.lower(), text.upper(), text.capitalize(), text.title()}
+
+
+def _direct_hits(query, limit):
+    """
+    Products whose code or barcode is exactly `query`, then names starting
+    with it, as index range reads on product_name_idx. Each casing of the
+    query is looked up as typed: case-insensitive LIKE would scan the table
+    on SQLite.
+    """
+    casings = _casings(query)
+    rows = list(
+        Product.objects.filter(Q(product_id__in=casings) | Q(barcode__in=casings)).values(*FIELDS)
+    )
+    for prefix in sorted(casings):
+        rows += Product.objects.filter(
+            name__gte=prefix, name__lt=prefix + "\U0010ffff"
+        ).order_by("name", "id").values(*FIELDS)[:limit]
+    seen, unique = set(), []
+    for row in rows:
+        if row["id"] not in seen:
+            seen.add(row["id"])
+            unique.append(row)
+    return unique
+
+
+def _text(row):
+    return f"{row['name']} {row['brand'] or ''}".lower()
+
+
+def _rank(query, tokens, rows):
+    q = query.lower()
+
+    def score(row):
+        code, name = row["product_id"].lower(), row["name"].lower()
+        words = name.split()
+        return (
+            code != q,
+            name != q,
+            not code.startswith(q),
+            not name.startswith(q),
+            -sum(any(w.startswith(t) for w in words) for t in tokens),
+            -SequenceMatcher(None, q, name).ratio(),
+            len(name),
+        )
+
+    return sorted(rows, key=score)
+
+
+# ---------------------------
+# Search
+# ---------------------------
+
+def search_products(query, limit=20):
+    """
+    Typeahead matches for `query`, best first, as dicts of FIELDS.
+
+    0. the exact code or barcode, and names starting with the query
+    1. every word is a prefix of a word in name, code, brand or supplier
+    2. otherwise every word of 3+ characters occurs anywhere in name/brand
+    3. otherwise the longest word, allowing one typo; words under 6
+       characters are matched by their trigrams or first two characters
+       and kept when a name/brand word starts with them, give or take one
+       character
+    Each later step only runs while fewer than `limit` rows were found.
+    """
+    query = query.strip()
+    tokens = [t.lower() for t in re.findall(r"\w+", query)]
+    if not tokens:
+        return []
+    direct = _direct_hits(query, limit)
+    if not fts_available():
+        return _search_orm(tokens, limit, direct)
+
+    seen = {r["id"] for r in direct}
+    rows = direct + _fetch(WORDS_TABLE, " AND ".join(_quote(t) + "*" for t in tokens), seen)
+
+    long_tokens = [t for t in tokens if len(t) >= 3]
+    if len(rows) < limit and long_tokens:
+        # Look up only the longest (most selective) word; intersecting
+        # several trigram phrases in FTS5 is what gets slow when nothing
+        # matches. The other words are checked on the candidates.
+        seen.update(r["id"] for r in rows)
+        word = max(long_tokens, key=len)
+        rows += [
+            r for r in _fetch(TRIGRAM_TABLE, _quote(word), seen)
+            if all(t in _text(r) for t in long_tokens)
+        ]
+
+        for half in _typo_halves(word):
+            if len(rows) >= limit:
+                break
+            seen.update(r["id"] for r in rows)
+            rows += _fetch(TRIGRAM_TABLE, _quote(half), seen)
+
+        if len(word) < 6:
+            # Typeahead words are mostly this short, with at most one
+            # usable half. Take candidates sharing any trigram or the
+            # first two characters instead, and check them here.
+            grams = " OR ".join(_quote(word[i:i + 3]) for i in range(len(word) - 2))
+            for table, match in (
+                (TRIGRAM_TABLE, grams),
+                (WORDS_TABLE, "{name brand} : " + _quote(word[:2]) + "*"),
+            ):
+                if len(rows) >= limit:
+                    break
+                seen.update(r["id"] for r in rows)
+                rows += [r for r in _fetch(table, match, seen) if _near_word(word, _text(r))]
+
+    return _rank(query, tokens, rows)[:limit]
+
+
+def _search_orm(tokens, limit, direct=()):
+    """Plain LIKE search for databases without FTS5 (no typo tolerance)."""
+    qs = Product.objects.exclude(pk__in=[r["id"] for r in direct])
+    for t in tokens:
+        qs = qs.filter(
+            Q(name__icontains=t) | Q(product_id__icontains=t)
+            | Q(brand__icontains=t) | Q(supplier_name__icontains=t)
+        )
+    return (list(direct) + list(qs.values(*FIELDS)[:limit]))[:limit]
@@ -0,0 +1,120 @@
+# app/sequences.py
+#
+# Race-free invoice numbering.
+#
+# Numbers come from the InvoiceSequence table, one row per series and
+# financial year. A worker reserves a whole block of numbers with a single
+# UPDATE ... SET next_value = next_value + N and then hands them out from
+# memory, so only one sale in every block takes the write lock on the
+# sequence row.
+#
+# Gaps: with INVOICE_NUMBER_BLOCK_SIZE = 1 (the default) every number is
+# reserved inside the sale's transaction and rolls back with it, so
+# numbering is gap-free. With larger blocks the unused rest of a block is
+# lost when the process exits, and a cached number taken by a sale that
+# then fails is not handed out again. Queued sales that end FAILED in the
+# outbox keep their number either way.
+
+import threading
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import InvoiceSequence
+
+
+DEFAULT_SERIES = "INV"
+
+
+def financial_year(date=None):
+    """Return the financial year label ("2025-26") that `date` falls in."""
+    date = date or timezone.localdate()
+    start_month = getattr(settings, "FINANCIAL_YEAR_START_MONTH", 4)
+    start = date.year if date.month >= start_month else date.year - 1
+    if start_month == 1:
+        return str(start)
+    return f"{start}-{(start + 1) % 100:02d}"
+
+
+def format_invoice_no(series, fy, number):
+    return f"{series}-{fy}-{number:04d}"
+
+
+def reserve_block(series, fy, size):
+    """
+    Atomically reserve `size` numbers for (series, fy) and return them as
+    a range. The UPDATE runs first so the write lock is taken straight
+    away instead of upgrading from a read lock.
+    """
+    qs = InvoiceSequence.objects.filter(series=series, financial_year=fy)
+
+    with transaction.atomic():
+        if not qs.update(next_value=F("next_value") + size):
+            try:
+                with transaction.atomic():
+                    InvoiceSequence.objects.create(
+                        series=series, financial_year=fy, next_value=1 + size
+                    )
+            except IntegrityError:
+                # another worker created the row first
+                qs.update(next_value=F("next_value") + size)
+        end = qs.values_list("next_value", flat=True).get()
+
+    return range(end - size, end)
+
+
+class InvoiceNumberAllocator:
+    """
+    Process-local allocator handing out invoice numbers from reserved
+    blocks. One instance is shared by all threads of a worker process.
+
+    A freshly reserved block is only cached once the reserving transaction
+    commits: if the sale rolls back, so does the sequence row, and the
+    numbers must not be handed out again from memory.
+
+    Numbers left in a block when the process exits are skipped, so with a
+    block size above 1 invoice numbers can have gaps and are not strictly
+    in time order across workers.
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size or getattr(settings, "INVOICE_NUMBER_BLOCK_SIZE", 1)
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def _take_cached(self, key):
+        with self._lock:
+            block = self._blocks.get(key)
+            if block:
+                number, self._blocks[key] = block[0], block[1:]
+                return number
+        return None
+
+    def _cache(self, key, block):
+        with self._lock:
+            self._blocks[key] = block
+
+    def next(self, series=DEFAULT_SERIES, date=None):
+        fy = financial_year(date)
+        key = (series, fy)
+
+        number = self._take_cached(key)
+        if number is None:
+            block = reserve_block(series, fy, self.block_size)
+            number, rest = block[0], block[1:]
+            if rest:
+                transaction.on_commit(lambda: self._cache(key, rest))
+
+        return format_invoice_no(series, fy, number)
+
+    def reset(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+invoice_numbers = InvoiceNumberAllocator()
+
+
+def next_invoice_no(series=DEFAULT_SERIES, date=None):
+    return invoice_numbers.next(series, date)
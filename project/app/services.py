@@ -0,0 +1,651 @@
+# app/services.py
+#
+# Posting services shared by the admin and staff views. Everything in here
+# works on whole invoices at once: products are loaded with one query,
+# lines are written with bulk_create and stock is moved with set-based
+# UPDATEs, so the number of round trips does not grow with line count.
+
+import random
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import (
+    Case, DecimalField, Exists, F, IntegerField, Min, OuterRef, Q, Subquery, Sum, Value, When,
+    prefetch_related_objects,
+)
+from django.utils import timezone
+
+from . import catalog
+from .models import Product, Purchase, PurchaseItem, Sales, SalesItem, StockMovement
+from .payables import rebuild_payables
+from .pricing import ZERO, as_decimal, price_purchase_items, price_sale_lines, to_cents
+
+
+class PostingError(Exception):
+    """Raised when a sale cannot be posted (unknown product, bad qty...)."""
+
+
+class InsufficientStock(PostingError):
+    """
+    A guarded stock decrement found less on hand than requested.
+    `shortages` maps product pk -> (available, requested).
+    """
+
+    def __init__(self, shortages, names=None):
+        self.shortages = shortages
+        names = names or {}
+        super().__init__("Insufficient stock: " + "; ".join(
+            f"{names.get(pid, pid)} has {available}, {requested} requested"
+            for pid, (available, requested) in sorted(shortages.items())
+        ))
+
+
+# ---------------------------
+# Request parsing
+# ---------------------------
+
+def parse_decimal(value):
+    try:
+        return Decimal(str(value or 0).replace(",", ""))
+    except InvalidOperation:
+        raise PostingError(f"Invalid amount: {value!r}")
+
+
+def parse_optional_decimal(value):
+    """Like parse_decimal, but a blank field stays None (use the default)."""
+    if value is None or str(value).strip() == "":
+        return None
+    return parse_decimal(value)
+
+
+def parse_sale_lines(data):
+    """
+    Read the product[] / qty[] / price[] ... row arrays posted by the sale
+    forms and return a list of line dicts. Empty product rows are skipped.
+    Blank price/discount/tax are left as None for the pricing module to
+    fill in; the posted line totals are ignored.
+    """
+    rows = zip(
+        data.getlist("product[]"),
+        data.getlist("qty[]"),
+        data.getlist("price[]"),
+        data.getlist("discount[]"),
+        data.getlist("tax[]"),
+    )
+
+    lines = []
+    for p, q, pr, d, t in rows:
+        if p == "":
+            continue  # skip empty rows
+        try:
+            product_id = int(p)
+            qty = int(q or 0)
+        except (TypeError, ValueError):
+            raise PostingError(f"Invalid product or quantity: {p!r} x {q!r}")
+        if qty <= 0:
+            raise PostingError("Quantity must be at least 1.")
+
+        lines.append({
+            "product_id": product_id,
+            "qty": qty,
+            "price": parse_optional_decimal(pr),
+            "discount": parse_optional_decimal(d),
+            "tax": parse_optional_decimal(t),
+        })
+    return lines
+
+
+def parse_sale_header(data):
+    """
+    Header fields posted by the sale forms. Totals are not read: they are
+    computed server-side by pricing.price_sale_lines().
+    """
+    return {
+        "customer_name": data.get("customer_name"),
+        "date": data.get("date") or None,
+    }
+
+
+# ---------------------------
+# Stock helpers
+# ---------------------------
+
+def qty_by_product(lines):
+    """Sum line quantities per product id."""
+    totals = defaultdict(int)
+    for line in lines:
+        totals[line["product_id"]] += line["qty"]
+    return dict(totals)
+
+
+def adjust_stock(deltas, reason, reference="", movements=None, allow_negative=False):
+    """
+    Apply {product_id: delta} to Product.quantity with a single UPDATE and
+    append the matching StockMovement rows with a single INSERT.
+    Negative deltas take stock out, positive ones put it back.
+
+    The UPDATE is conditional: unless `allow_negative` is set, a row with
+    a negative delta only matches while quantity + delta >= 0, so
+    concurrent tills can never sell the same last unit twice and no
+    read-modify-write is needed. If any product falls short nothing is
+    written and InsufficientStock is raised. Every updated row also gets
+    its version bumped.
+
+    `movements` may give the ledger rows explicitly as
+    (product_id, qty, reference) tuples when one change spans several
+    documents (e.g. bulk deletion); they must sum to `deltas`.
+    """
+    deltas = {pid: d for pid, d in deltas.items() if d}
+    if not deltas:
+        return 0
+
+    if len(deltas) == 1:
+        change = Value(next(iter(deltas.values())))
+    else:
+        change = Case(
+            *[When(pk=pid, then=Value(d)) for pid, d in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    products = Product.objects.filter(pk__in=deltas.keys())
+    guarded = not allow_negative and any(d < 0 for d in deltas.values())
+    if guarded:
+        # only stock going out is checked: putting units back must succeed
+        # even on a product that is already below zero
+        restocked = [pid for pid, d in deltas.items() if d > 0]
+        products = products.alias(after=F("quantity") + change).filter(
+            Q(after__gte=0) | Q(pk__in=restocked)
+        )
+
+    # A single-row UPDATE that does not match changed nothing; with several
+    # rows the ones that did match must be undone before reporting.
+    savepoint = guarded and len(deltas) > 1
+    with transaction.atomic() if savepoint else nullcontext():
+        updated = products.update(quantity=F("quantity") + change, version=F("version") + 1)
+        short = guarded and updated < len(deltas)
+        if short and savepoint:
+            transaction.set_rollback(True)
+    if short:
+        raise_shortages(deltas)
+
+    if movements is None:
+        movements = [(pid, d, reference) for pid, d in deltas.items()]
+    now = timezone.now()
+    StockMovement.objects.bulk_create([
+        StockMovement(product_id=pid, qty=qty, reason=reason, reference=ref, created_at=now)
+        for pid, qty, ref in movements
+        if qty
+    ])
+    # the versions this UPDATE wrote tell the catalogue whether a snapshot
+    # it is loading meanwhile already has these quantities
+    versions = dict(Product.objects.filter(pk__in=deltas.keys()).values_list("pk", "version"))
+    transaction.on_commit(lambda: catalog.catalog.apply_stock(deltas, versions))
+    return updated
+
+
+def raise_shortages(deltas):
+    """
+    Work out which products a rolled-back guarded UPDATE fell short on and
+    raise InsufficientStock. Only runs on the failure path.
+    """
+    on_hand = {
+        pk: (name, qty)
+        for pk, name, qty in Product.objects.filter(pk__in=deltas.keys())
+        .values_list("pk", "name", "quantity")
+    }
+    shortages = {
+        pid: (on_hand.get(pid, (None, 0))[1], -d)
+        for pid, d in deltas.items()
+        if d < 0 and on_hand.get(pid, (None, 0))[1] + d < 0
+    }
+    missing = deltas.keys() - on_hand.keys()
+    if missing and not shortages:
+        raise PostingError(f"Unknown product(s): {', '.join(map(str, sorted(missing)))}")
+    raise InsufficientStock(shortages, {pk: name for pk, (name, _) in on_hand.items()})
+
+
+# ---------------------------
+# Retry policy
+# ---------------------------
+#
+# InsufficientStock is final: retrying cannot help until stock arrives.
+# Lock timeouts, deadlocks and serialization failures are transient and
+# the whole transaction can simply be run again. Views leave that to the
+# client (the idempotency key makes resubmitting safe); background callers
+# that own their transaction use retry_on_conflict().
+
+TRANSIENT_ERRORS = ("database is locked", "deadlock detected", "could not serialize")
+
+
+def is_transient(exc):
+    return isinstance(exc, OperationalError) and any(m in str(exc) for m in TRANSIENT_ERRORS)
+
+
+def retry_on_conflict(func, *args, attempts=None, backoff=0.05, **kwargs):
+    """
+    Call func(*args, **kwargs) in a transaction, running it again with
+    jittered exponential backoff when it fails with a transient database
+    error. Must not be called inside another transaction.
+    """
+    attempts = attempts or getattr(settings, "STOCK_CONFLICT_RETRIES", 3)
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic():
+                return func(*args, **kwargs)
+        except OperationalError as exc:
+            if attempt == attempts or not is_transient(exc):
+                raise
+            time.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+
+# ---------------------------
+# Sales posting
+# ---------------------------
+
+def load_products(lines):
+    """in_bulk() the products of `lines`, failing on unknown ids."""
+    ids = {line["product_id"] for line in lines}
+    products = Product.objects.in_bulk(ids)
+    missing = ids - products.keys()
+    if missing:
+        raise PostingError(f"Unknown product(s): {', '.join(map(str, sorted(missing)))}")
+    return products
+
+
+def build_sale_items(sale, lines, products):
+    return [
+        SalesItem(
+            sale=sale,
+            product=products[line["product_id"]],
+            qty=line["qty"],
+            price=line["price"],
+            discount=line["discount"],
+            tax=line["tax"],
+            total=line["total"],
+        )
+        for line in lines
+    ]
+
+
+@transaction.atomic
+def post_sale(header, lines, invoice_no):
+    """
+    Create a Sales row with all of its items and take the sold quantities
+    out of stock.
+
+    Lines are priced server-side (pricing.price_sale_lines), so the header
+    totals never come from the client.
+
+    Costs a fixed number of queries regardless of line count: one to load
+    the products, one INSERT for the header, one bulk INSERT for the lines
+    and one UPDATE for stock.
+    """
+    if not lines:
+        raise PostingError("Please add at least one product.")
+
+    products = load_products(lines)
+    totals = price_sale_lines(lines, products)
+
+    sale = Sales.objects.create(invoice_no=invoice_no, **header, **totals)
+    SalesItem.objects.bulk_create(build_sale_items(sale, lines, products))
+
+    adjust_stock({pid: -qty for pid, qty in qty_by_product(lines).items()}, "SALE", invoice_no)
+    return sale
+
+
+# ---------------------------
+# Sales editing
+# ---------------------------
+
+LINE_FIELDS = ("qty", "price", "discount", "tax", "total")
+
+
+def diff_sale_lines(items, lines):
+    """
+    Compare the existing SalesItem rows of a sale with the submitted lines.
+
+    Rows are matched per product in the order they appear, so re-saving an
+    unchanged invoice produces an empty diff. Returns a dict with the
+    `added` line dicts, the `changed` SalesItem objects (already updated in
+    memory), the `removed` SalesItem objects and the net `stock` delta per
+    product id (positive = goes back on the shelf).
+    """
+    old_by_product = defaultdict(list)
+    for item in items:
+        old_by_product[item.product_id].append(item)
+
+    new_by_product = defaultdict(list)
+    for line in lines:
+        new_by_product[line["product_id"]].append(line)
+
+    added, changed, removed = [], [], []
+    stock = defaultdict(int)
+
+    for pid in old_by_product.keys() | new_by_product.keys():
+        old = old_by_product.get(pid, [])
+        new = new_by_product.get(pid, [])
+
+        for item, line in zip(old, new):
+            if any(getattr(item, f) != line[f] for f in LINE_FIELDS):
+                stock[pid] += item.qty - line["qty"]
+                for f in LINE_FIELDS:
+                    setattr(item, f, line[f])
+                changed.append(item)
+
+        for item in old[len(new):]:
+            stock[pid] += item.qty
+            removed.append(item)
+
+        for line in new[len(old):]:
+            stock[pid] -= line["qty"]
+            added.append(line)
+
+    return {
+        "added": added,
+        "changed": changed,
+        "removed": removed,
+        "stock": {pid: d for pid, d in stock.items() if d},
+    }
+
+
+@transaction.atomic
+def update_sale(sale, header, lines):
+    """
+    Apply an edited invoice: update the header, then write only the lines
+    that were added, changed or removed and move stock by the net
+    difference. Work is proportional to what changed, not to invoice size.
+    """
+    if not lines:
+        raise PostingError("Please add at least one product.")
+
+    products = load_products(lines)
+    header = {**header, **price_sale_lines(lines, products)}
+
+    diff = diff_sale_lines(list(sale.items.all()), lines)
+    if diff["added"]:
+        SalesItem.objects.bulk_create(build_sale_items(sale, diff["added"], products))
+
+    if diff["changed"]:
+        SalesItem.objects.bulk_update(diff["changed"], LINE_FIELDS)
+
+    if diff["removed"]:
+        SalesItem.objects.filter(pk__in=[i.pk for i in diff["removed"]]).delete()
+
+    adjust_stock(diff["stock"], "SALE_EDIT", sale.invoice_no)
+
+    for field, value in header.items():
+        setattr(sale, field, value)
+    sale.save(update_fields=list(header))
+
+    return diff
+
+
+# ---------------------------
+# Sales deletion
+# ---------------------------
+
+@transaction.atomic
+def delete_sales(sale_ids):
+    """
+    Delete the given sales and put their stock back.
+
+    One aggregate query, one stock UPDATE, one ledger INSERT and two
+    DELETEs no matter how many sales or lines are involved; the stock
+    UPDATE grows with the number of distinct products, not with line
+    count. Returns the number
+    of sales deleted.
+    """
+    sale_ids = list(sale_ids)
+    if not sale_ids:
+        return 0
+
+    per_sale = list(
+        SalesItem.objects.filter(sale_id__in=sale_ids, product__isnull=False)
+        .values("sale__invoice_no", "product_id")
+        .annotate(qty=Sum("qty"))
+        .values_list("product_id", "qty", "sale__invoice_no")
+    )
+    returned = defaultdict(int)
+    for pid, qty, _ in per_sale:
+        returned[pid] += qty
+    adjust_stock(returned, "SALE_DELETE", movements=per_sale)
+
+    SalesItem.objects.filter(sale_id__in=sale_ids).delete()
+    deleted, _ = Sales.objects.filter(pk__in=sale_ids).delete()
+    return deleted
+
+
+# ---------------------------
+# Purchases & manual stock
+# ---------------------------
+
+def record_movement(product_id, qty, reason, reference=""):
+    """
+    Ledger row for a quantity that was already written to the product
+    (opening stock of a new product, a manual correction in the admin).
+    """
+    if qty:
+        StockMovement.objects.create(product_id=product_id, qty=qty, reason=reason, reference=reference)
+
+
+@transaction.atomic
+def receive_purchase(purchase, items):
+    """
+    Post a new goods receipt: the Purchase header (totals priced here from
+    `items`), its PurchaseItem lines, the received stock and the new cost
+    prices. The number of queries does not depend on the number of lines.
+    """
+    totals = price_purchase_items(items, purchase.other_charges, purchase.amount_paid, purchase.cost_allocation)
+    for field, value in totals.items():
+        setattr(purchase, field, value)
+    purchase.save()
+
+    for item in items:
+        item.purchase = purchase
+    record_prior_costs(items)
+    PurchaseItem.objects.bulk_create(items)
+
+    received = defaultdict(int)
+    for item in items:
+        received[item.product_id] += int(item.qty)
+    # receipts only add stock; a product already below zero still takes them
+    adjust_stock(received, "PURCHASE", purchase.purchase_no, allow_negative=True)
+    update_cost_prices(items)
+    return purchase
+
+
+def update_cost_prices(items, purchase_id=None):
+    """
+    Set each product's cost_price to its landed cost on this receipt: net
+    line value plus its share of other charges, summed over its lines and
+    divided by the quantity received (see pricing.allocate_other_charges).
+    When re-costing an existing purchase (`purchase_id`), products received
+    again by a later purchase keep that newer cost.
+    """
+    costs = landed_costs(items)
+    if costs and purchase_id is not None:
+        newer = PurchaseItem.objects.filter(product_id__in=costs, purchase_id__gt=purchase_id)
+        for pid in set(newer.values_list("product_id", flat=True)):
+            del costs[pid]
+    write_cost_prices(costs)
+    return costs
+
+
+def record_prior_costs(items, purchase_id=None):
+    """
+    Set prior_cost on lines new to a product (unsaved, or an edited line
+    switched to another product) to the product's cost before this
+    receipt: that of another line of the same product already on
+    purchase `purchase_id`, otherwise the product's current cost_price.
+    """
+    stored = dict(
+        PurchaseItem.objects.filter(pk__in=[item.pk for item in items if item.pk])
+        .values_list("pk", "product_id")
+    ) if purchase_id is not None else {}
+    fresh = [item for item in items if item.pk is None or stored.get(item.pk) != item.product_id]
+    pids = {item.product_id for item in fresh}
+    if not pids:
+        return
+    priors = dict(Product.objects.filter(pk__in=pids).values_list("pk", "cost_price"))
+    if purchase_id is not None:
+        priors.update(
+            PurchaseItem.objects.filter(purchase_id=purchase_id, product_id__in=pids, prior_cost__isnull=False)
+            .values_list("product_id", "prior_cost")
+        )
+    for item in fresh:
+        item.prior_cost = priors.get(item.product_id)
+
+
+def receipt_prior_costs(purchase_id):
+    """{product_id: prior_cost} of a purchase's lines, read before they are removed."""
+    return dict(
+        PurchaseItem.objects.filter(purchase_id=purchase_id)
+        .order_by("-id")
+        .values_list("product_id", "prior_cost")
+    )
+
+
+def restore_cost_prices(purchase_id, priors):
+    """
+    Products that lost their receipt lines on purchase `purchase_id` (a
+    line removed, or the purchase deleted) go back to the landed cost of
+    their latest remaining receipt, or to the cost they had before the
+    removed receipt (`priors`, from receipt_prior_costs) when none is
+    left. The next receipt of each product takes over that prior cost,
+    since the one it recorded came from the removed receipt. Lines
+    recorded before prior_cost existed have none, and those products
+    keep their current cost.
+    """
+    if not priors:
+        return {}
+    latest = (
+        PurchaseItem.objects.filter(product_id=OuterRef("product_id"))
+        .order_by("-purchase_id")
+        .values("purchase_id")[:1]
+    )
+    items = PurchaseItem.objects.filter(product_id__in=priors, purchase_id=Subquery(latest))
+    costs = landed_costs(items)
+
+    known = {pid: cost for pid, cost in priors.items() if cost is not None}
+    following = (
+        PurchaseItem.objects.filter(product_id__in=known, purchase_id__gt=purchase_id)
+        .values("product_id")
+        .annotate(next_id=Min("purchase_id"))
+        .values_list("product_id", "next_id")
+    )
+    following = dict(following)
+    if following:
+        PurchaseItem.objects.filter(
+            Q(*[Q(product_id=pid, purchase_id=nid) for pid, nid in following.items()], _connector=Q.OR)
+        ).update(prior_cost=Case(
+            *[When(product_id=pid, then=Value(known[pid])) for pid in following],
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))
+
+    for pid, cost in known.items():
+        # products with no purchase lines left at all
+        costs.setdefault(pid, cost)
+    write_cost_prices(costs)
+    return costs
+
+
+def landed_costs(items):
+    """{product_id: landed unit cost} over priced PurchaseItem objects."""
+    qty, landed = defaultdict(Decimal), defaultdict(Decimal)
+    for item in items:
+        qty[item.product_id] += as_decimal(item.qty)
+        landed[item.product_id] += item.line_total - as_decimal(item.tax) + as_decimal(item.charges)
+    return {pid: to_cents(max(landed[pid], ZERO) / qty[pid]) for pid in qty if qty[pid] > 0}
+
+
+def write_cost_prices(costs, chunk=500):
+    """{product_id: cost} to Product.cost_price, one CASE UPDATE per `chunk` products."""
+    pids = list(costs)
+    for i in range(0, len(pids), chunk):
+        part = pids[i:i + chunk]
+        Product.objects.filter(pk__in=part).update(cost_price=Case(
+            *[When(pk=pid, then=Value(costs[pid])) for pid in part],
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))
+    if costs:
+        transaction.on_commit(lambda: catalog.catalog.apply_costs(costs))
+
+
+PURCHASE_TOTALS = ("subtotal", "discount_total", "tax_total", "grand_total", "balance")
+
+
+@transaction.atomic
+def recost_purchases(chunk=500):
+    """
+    Re-price every stored purchase, oldest first, in one pass of `chunk`
+    purchases at a time: line totals, other-charge shares, landed costs
+    and header totals are bulk-updated per chunk, and each product ends
+    up with the landed cost of its latest receipt. Purchases without
+    lines (header-only legacy entries) keep their stored totals. Returns
+    counts of purchases, lines and products.
+    """
+    costs, purchases, lines, last = {}, 0, 0, 0
+    with_lines = Purchase.objects.filter(Exists(PurchaseItem.objects.filter(purchase=OuterRef("pk"))))
+    while True:
+        batch = list(with_lines.filter(pk__gt=last).order_by("pk")[:chunk])
+        if not batch:
+            break
+        prefetch_related_objects(batch, "items")
+        items = []
+        for purchase in batch:
+            own = list(purchase.items.all())
+            totals = price_purchase_items(own, purchase.other_charges, purchase.amount_paid, purchase.cost_allocation)
+            for field, value in totals.items():
+                setattr(purchase, field, value)
+            costs.update(landed_costs(own))
+            items += own
+        # the rows are loaded whole, so write them back as upserts on the
+        # primary key: far cheaper to build than bulk_update's CASE per row
+        Purchase.objects.bulk_create(batch, update_conflicts=True, unique_fields=["id"],
+                                     update_fields=PURCHASE_TOTALS)
+        PurchaseItem.objects.bulk_create(items, update_conflicts=True, unique_fields=["id"],
+                                         update_fields=["line_total", "charges", "landed_cost"])
+        purchases, lines, last = purchases + len(batch), lines + len(items), batch[-1].pk
+
+    write_cost_prices(costs)
+    # balances were written without Purchase signals
+    rebuild_payables()
+    return {"purchases": purchases, "lines": lines, "products": len(costs)}
+
+
+def purchase_qty_by_product(purchase_id):
+    """{product_id: qty received} for one purchase, in one aggregate query."""
+    return {
+        pid: int(qty)
+        for pid, qty in PurchaseItem.objects.filter(purchase_id=purchase_id)
+        .values("product_id")
+        .annotate(q=Sum("qty"))
+        .values_list("product_id", "q")
+        if qty
+    }
+
+
+def reconcile_purchase_stock(purchase, before):
+    """Move stock by the change in received quantities since `before`."""
+    after = purchase_qty_by_product(purchase.pk)
+    deltas = {pid: after.get(pid, 0) - before.get(pid, 0) for pid in before.keys() | after.keys()}
+    adjust_stock(deltas, "PURCHASE_EDIT", purchase.purchase_no, allow_negative=True)
+
+
+@transaction.atomic
+def delete_purchase(purchase):
+    """
+    Delete a purchase, take its received quantities back out of stock and
+    put its products' cost prices back to their previous receipts.
+    """
+    received = purchase_qty_by_product(purchase.pk)
+    priors = receipt_prior_costs(purchase.pk)
+    adjust_stock({pid: -qty for pid, qty in received.items()}, "PURCHASE_DELETE",
+                 purchase.purchase_no, allow_negative=True)
+    purchase_id = purchase.pk
+    purchase.delete()
+    restore_cost_prices(purchase_id, priors)
@@ -1 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
 
+from . import catalog, payables, search
+from .models import Product, Purchase
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog(sender, **kwargs):
+    # after commit, so no process rebuilds from the uncommitted row
+    transaction.on_commit(catalog.invalidate)
+
+
+@receiver(pre_save, sender=Purchase)
+def remember_payable(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._payable_before = payables.stored_balance(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=Purchase)
+def update_payable(sender, instance, raw=False, **kwargs):
+    if not raw:
+        payables.move_balance(instance.__dict__.pop("_payable_before", None), payables.open_balance(instance))
+
+
+@receiver(post_delete, sender=Purchase)
+def drop_payable(sender, instance, **kwargs):
+    payables.move_balance(payables.open_balance(instance), None)
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, app_config, **kwargs):
+    # SQLite table rebuilds during migrate drop the FTS sync triggers
+    if app_config.label == "app":
+        search.ensure_index()
@@ -0,0 +1,139 @@
+# app/stock.py
+#
+# Queries over the StockMovement ledger.
+#
+# Product.quantity is the live balance; the ledger says how it got there.
+# Snapshots are taken for all products at once (manage.py snapshot_stock),
+# so "stock as of X" is the latest snapshot at or before X plus the
+# movements between the two: O(snapshot + recent delta), never a full
+# scan of the ledger.
+
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import catalog
+from .models import Product, StockMovement, StockSnapshot
+
+
+def _latest_snapshot_time(at):
+    return StockSnapshot.objects.filter(taken_at__lte=at).aggregate(t=Max("taken_at"))["t"]
+
+
+def stock_levels_as_of(at=None, product_ids=None):
+    """
+    {product_id: quantity on hand} at instant `at` (default: now) for the
+    given products, or all products that have any stock history.
+    """
+    at = at or timezone.now()
+    snap_at = _latest_snapshot_time(at)
+
+    levels = {}
+    movements = StockMovement.objects.filter(created_at__lte=at)
+    if snap_at is not None:
+        snaps = StockSnapshot.objects.filter(taken_at=snap_at)
+        if product_ids is not None:
+            snaps = snaps.filter(product_id__in=product_ids)
+        levels.update(snaps.values_list("product_id", "quantity"))
+        movements = movements.filter(created_at__gt=snap_at)
+
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+    for pid, qty in movements.values("product_id").annotate(q=Sum("qty")).values_list("product_id", "q"):
+        levels[pid] = levels.get(pid, 0) + qty
+    return levels
+
+
+def stock_as_of(product_id, at=None):
+    return stock_levels_as_of(at, [product_id]).get(product_id, 0)
+
+
+def take_snapshot(at=None):
+    """
+    Record every product's balance at `at` (default: now), built from the
+    previous snapshot plus the movements since. Returns rows written.
+    """
+    at = at or timezone.now()
+    levels = stock_levels_as_of(at)
+    StockSnapshot.objects.filter(taken_at=at).delete()
+    StockSnapshot.objects.bulk_create(
+        [StockSnapshot(product_id=pid, taken_at=at, quantity=qty) for pid, qty in levels.items()],
+        batch_size=5000,
+    )
+    return len(levels)
+
+
+def rebuild_quantities():
+    """
+    Recompute Product.quantity for every product from the ledger in one
+    UPDATE ... SET quantity = (SELECT SUM(qty) ...) statement, so millions
+    of movements are summed inside the database using the
+    (product, created_at) index. Returns the number of products updated.
+    """
+    ledger_sum = (
+        StockMovement.objects.filter(product=OuterRef("pk"))
+        .values("product")
+        .annotate(total=Sum("qty"))
+        .values("total")
+    )
+    updated = Product.objects.update(quantity=Coalesce(Subquery(ledger_sum), Value(0)))
+    catalog.invalidate()
+    return updated
+
+
+def drift():
+    """Products whose quantity disagrees with the ledger: {pk: (quantity, ledger)}."""
+    ledger_sum = (
+        StockMovement.objects.filter(product=OuterRef("pk"))
+        .values("product")
+        .annotate(total=Sum("qty"))
+        .values("total")
+    )
+    rows = (
+        Product.objects.annotate(ledger=Coalesce(Subquery(ledger_sum), Value(0)))
+        .values_list("pk", "quantity", "ledger")
+        .iterator(chunk_size=5000)
+    )
+    return {pk: (qty, ledger) for pk, qty, ledger in rows if qty != ledger}
+
+
+# ---------------------------
+# Reorder candidates
+# ---------------------------
+#
+# Products at or below their reorder level live in the partial index
+# product_reorder_idx on (quantity, id). Every query below repeats the
+# index's own condition, so SQLite answers it from that index alone and
+# the cost follows the number of low-stock products, not catalogue size.
+
+LOW_STOCK = Q(quantity__lte=F("reorder_level"))
+
+
+def low_stock_counts():
+    """{"low_stock": n, "out_of_stock": m} in one index-only query."""
+    return Product.objects.filter(LOW_STOCK).aggregate(
+        low_stock=Count("id"),
+        out_of_stock=Count("id", filter=Q(quantity__lte=0)),
+    )
+
+
+def low_stock_page(after=None, limit=50):
+    """
+    One page of reorder candidates, emptiest first, ordered by
+    (quantity, id). `after` is the (quantity, id) of the last row of the
+    previous page; keyset paging keeps deep pages as cheap as the first.
+    Returns (rows, next_cursor) where next_cursor is None on the last page.
+    """
+    qs = Product.objects.filter(LOW_STOCK)
+    if after is not None:
+        qty, pk = after
+        qs = qs.filter(Q(quantity__gt=qty) | Q(quantity=qty, id__gt=pk))
+
+    rows = list(
+        qs.order_by("quantity", "id")
+        .values("id", "product_id", "name", "quantity", "reorder_level", "supplier_name")[:limit + 1]
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (rows[-1]["quantity"], rows[-1]["id"]) if more else None
+    return rows, next_cursor
@@ -1,3 +1,375 @@
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.http import QueryDict
 from django.test import TestCase
+from django.urls import reverse
+
+from .models import (
+    InvoiceSequence, Product, Purchase, PurchaseItem, PurchaseOrder, Sales, SalesItem, StockMovement, Supplier,
+    SystemConfig, User,
+)
+from .pricing import allocate, price_purchase_items, price_sale_lines
+from .reorder import generate_draft_orders, suggest
+from .search import CANDIDATES, search_products
+from .services import delete_purchase, parse_sale_lines, receive_purchase
+
+
+def make_product(code, **fields):
+    fields = {"name": code, "quantity": 100, "reorder_level": 0, **fields}
+    return Product.objects.create(product_id=code, **fields)
+
+
+class PriceSaleLinesTests(TestCase):
+    def setUp(self):
+        SystemConfig.objects.create(default_tax=18)
+        self.untaxed = make_product("P1", selling_price=Decimal("9.99"), discount=Decimal("12.5"), tax=None)
+        self.taxed = make_product("P2", selling_price=Decimal("0.10"), discount=Decimal("5"), tax=Decimal("5"))
+        self.products = Product.objects.in_bulk([self.untaxed.pk, self.taxed.pk])
+
+    def line(self, product, qty=1, **values):
+        return {"product_id": product.pk, "qty": qty, "price": None, "discount": None, "tax": None, **values}
+
+    def test_null_product_tax_falls_back_to_default_tax(self):
+        lines = [self.line(self.untaxed, qty=3)]
+        totals = price_sale_lines(lines, self.products)
+
+        # 29.97 gross, 12.5% discount 3.75, 18% tax on 26.22 is 4.72
+        self.assertEqual(lines[0]["tax"], Decimal("18"))
+        self.assertEqual(lines[0]["total"], Decimal("30.94"))
+        self.assertEqual(totals, {
+            "subtotal": Decimal("26.22"),
+            "total_tax": Decimal("4.72"),
+            "grand_total": Decimal("30.94"),
+        })
+
+    def test_blank_posted_tax_is_priced_from_the_product(self):
+        data = QueryDict(mutable=True)
+        for product in (self.untaxed, self.taxed):
+            data.update({"product[]": str(product.pk), "qty[]": "1", "price[]": "", "discount[]": "", "tax[]": ""})
+        lines = parse_sale_lines(data)
+        price_sale_lines(lines, self.products)
+
+        self.assertEqual([line["tax"] for line in lines], [Decimal("18"), Decimal("5")])
+
+    def test_explicit_zero_tax_is_not_replaced(self):
+        lines = [self.line(self.untaxed, tax=Decimal("0"))]
+        totals = price_sale_lines(lines, self.products)
+
+        self.assertEqual(lines[0]["tax"], Decimal("0"))
+        self.assertEqual(totals["total_tax"], Decimal("0"))
+
+    def test_discount_rounds_half_up_to_cents(self):
+        # 5% of 0.10 is 0.005
+        lines = [self.line(self.taxed)]
+        totals = price_sale_lines(lines, self.products)
+
+        self.assertEqual(totals["subtotal"], Decimal("0.09"))
+        self.assertEqual(lines[0]["total"], Decimal("0.09"))
+
+    def test_totals_are_sums_of_rounded_lines(self):
+        lines = [self.line(self.untaxed, qty=3), self.line(self.untaxed, qty=3)]
+        totals = price_sale_lines(lines, self.products)
+
+        self.assertEqual(totals["grand_total"], sum(line["total"] for line in lines))
+        self.assertEqual(totals["grand_total"], Decimal("61.88"))
+
+    def test_product_values_win_without_overrides(self):
+        lines = [self.line(self.taxed, price=Decimal("1.00"), discount=Decimal("0"), tax=Decimal("0"))]
+        price_sale_lines(lines, self.products, allow_overrides=False)
+
+        self.assertEqual(
+            (lines[0]["price"], lines[0]["discount"], lines[0]["tax"]),
+            (Decimal("0.10"), Decimal("5"), Decimal("5")),
+        )
+
+
+class LandedCostTests(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(supplier_name="Acme", phone="1")
+        self.a = make_product("A", cost_price=Decimal("1.00"))
+        self.b = make_product("B", cost_price=Decimal("4.00"))
+
+    def items(self):
+        return [
+            PurchaseItem(product=self.a, qty=Decimal("10"), unit_price=Decimal("2.00"),
+                         discount=Decimal("1.00"), tax=Decimal("3.00")),
+            PurchaseItem(product=self.b, qty=Decimal("5"), unit_price=Decimal("4.00"),
+                         discount=Decimal("0"), tax=Decimal("0")),
+        ]
+
+    def purchase(self, number, **fields):
+        return Purchase(purchase_no=number, supplier=self.supplier, payment_type="cash",
+                        payment_status="paid", **fields)
+
+    def test_allocate_adds_up_to_the_total(self):
+        self.assertEqual(allocate(Decimal("10.00"), [1, 1, 1]),
+                         [Decimal("3.33"), Decimal("3.34"), Decimal("3.33")])
+        self.assertEqual(allocate(Decimal("1.00"), [0, 0]), [Decimal("0.50"), Decimal("0.50")])
+
+    def test_charges_by_value(self):
+        items = self.items()
+        totals = price_purchase_items(items, Decimal("3.90"), Decimal("10.00"))
+
+        # net values 19 and 20 (tax excluded) share the 3.90
+        self.assertEqual([item.charges for item in items], [Decimal("1.90"), Decimal("2.00")])
+        self.assertEqual([item.landed_cost for item in items], [Decimal("2.09"), Decimal("4.40")])
+        self.assertEqual(totals["grand_total"], Decimal("45.90"))
+        self.assertEqual(totals["balance"], Decimal("35.90"))
+
+    def test_charges_by_quantity(self):
+        items = self.items()
+        price_purchase_items(items, Decimal("3.90"), basis="QUANTITY")
+
+        self.assertEqual([item.charges for item in items], [Decimal("2.60"), Decimal("1.30")])
+        self.assertEqual([item.landed_cost for item in items], [Decimal("2.16"), Decimal("4.26")])
+
+    def test_receipt_sets_landed_cost_and_deleting_it_restores_prior_cost(self):
+        purchase = receive_purchase(self.purchase("PO-1", other_charges=Decimal("3.90")), self.items())
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.cost_price, Decimal("2.09"))
+
+        delete_purchase(purchase)
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.cost_price, self.b.cost_price), (Decimal("1.00"), Decimal("4.00")))
+
+    def test_deleting_receipts_in_any_order_restores_the_original_cost(self):
+        first = receive_purchase(self.purchase("PO-1"), self.items()[:1])
+        second = receive_purchase(self.purchase("PO-2"), [
+            PurchaseItem(product=self.a, qty=Decimal("1"), unit_price=Decimal("3.00"), discount=0, tax=0),
+        ])
+
+        delete_purchase(first)
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.cost_price, Decimal("3.00"))
+
+        delete_purchase(second)
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.cost_price, Decimal("1.00"))
+
+
+class SaleEditFormTests(TestCase):
+    def test_null_product_tax_renders_blank(self):
+        user = User.objects.create_user("cashier", password="pw")
+        product = make_product("P1", selling_price=Decimal("5.00"), discount=None, tax=None)
+        sale = Sales.objects.create(invoice_no="INV-1")
+        SalesItem.objects.create(sale=sale, product=product, qty=1, price=Decimal("5.00"))
+
+        self.client.force_login(user)
+        for name in ("sales_edit", "user_sales_edit"):
+            response = self.client.get(reverse(name, args=[sale.pk]))
+            self.assertContains(response, 'data-tax=""')
+            self.assertNotContains(response, '"None"')
+
+
+class SearchRankingTests(TestCase):
+    def setUp(self):
+        Product.objects.bulk_create(
+            Product(product_id=f"X{i}", name=f"Cola Zero {i}", quantity=1, reorder_level=0)
+            for i in range(CANDIDATES * 3)
+        )
+        make_product("COLA", name="Soft drink")
+        make_product("C-1", name="Cola", barcode="8901234567890")
+
+    def codes(self, query):
+        return [r["product_id"] for r in search_products(query, limit=5)]
+
+    def test_exact_code_comes_first(self):
+        self.assertEqual(self.codes("COLA")[0], "COLA")
+        self.assertEqual(self.codes("8901234567890"), ["C-1"])
+
+    def test_exact_name_is_found_among_many_matches(self):
+        # more than CANDIDATES products match "cola"; the exact code and
+        # the exact name still lead
+        self.assertEqual(self.codes("cola")[:2], ["COLA", "C-1"])
+        self.assertEqual(self.codes("Cola")[:2], ["COLA", "C-1"])
+
+
+def sale_form(*lines, **fields):
+    """POST data of the sale forms for (product, qty) lines."""
+    data = {"customer_name": "Walk-in", "date": "2026-05-01", **fields}
+    data.update({
+        "product[]": [str(product.pk) for product, _ in lines],
+        "qty[]": [str(qty) for _, qty in lines],
+        **{name: [""] * len(lines) for name in ("price[]", "discount[]", "tax[]")},
+    })
+    return data
+
+
+class SalePostingTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("cashier", password="pw"))
+        self.p1 = make_product("P1", selling_price=Decimal("10.00"), quantity=5, tax=Decimal("0"))
+        self.p2 = make_product("P2", selling_price=Decimal("20.00"), quantity=1, tax=Decimal("0"))
+
+    def numbers_used(self):
+        return sum(InvoiceSequence.objects.values_list("next_value", flat=True))
+
+    def test_post_takes_stock_out_and_bumps_version(self):
+        self.client.post(reverse("sales_add"), sale_form((self.p1, 2), (self.p2, 1)))
+
+        sale = Sales.objects.get()
+        self.assertEqual(sale.grand_total, Decimal("40.00"))
+        self.p1.refresh_from_db()
+        self.p2.refresh_from_db()
+        self.assertEqual((self.p1.quantity, self.p2.quantity), (3, 0))
+        self.assertEqual((self.p1.version, self.p2.version), (1, 1))
+        self.assertEqual(
+            sorted(StockMovement.objects.values_list("product__product_id", "qty", "reference")),
+            [("P1", -2, sale.invoice_no), ("P2", -1, sale.invoice_no)],
+        )
+
+    def test_oversell_posts_nothing(self):
+        self.client.post(reverse("sales_add"), sale_form((self.p1, 1)))
+        used = self.numbers_used()
+
+        # P1 is in stock but P2 is short: neither may be touched
+        self.client.post(reverse("sales_add"), sale_form((self.p1, 2), (self.p2, 3)))
+
+        self.assertEqual(Sales.objects.count(), 1)
+        self.p1.refresh_from_db()
+        self.p2.refresh_from_db()
+        self.assertEqual((self.p1.quantity, self.p2.quantity), (4, 1))
+        self.assertEqual((self.p1.version, self.p2.version), (1, 0))
+        self.assertEqual(self.numbers_used(), used)
+
+
+class IdempotentSubmitTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("cashier", password="pw"))
+        self.product = make_product("P1", selling_price=Decimal("10.00"), quantity=1, tax=Decimal("0"))
+
+    def submit(self, qty):
+        return self.client.post(reverse("sales_add"), sale_form((self.product, qty), idempotency_key="k1"))
+
+    def test_repeated_post_replays_the_first_response(self):
+        first = self.submit(1)
+        second = self.submit(1)
+
+        self.assertEqual(Sales.objects.count(), 1)
+        self.assertEqual((second.status_code, second["Location"]), (first.status_code, first["Location"]))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 0)
+
+    def test_failed_attempt_releases_the_key(self):
+        failed = self.submit(2)
+        self.assertEqual(failed["Location"], reverse("sales_add"))
+        self.assertEqual(Sales.objects.count(), 0)
+
+        Product.objects.filter(pk=self.product.pk).update(quantity=5)
+        self.submit(2)
+
+        self.assertEqual(Sales.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 3)
+
+
+class SaleStockReconciliationTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", password="pw")
+        self.client.force_login(self.admin)
+        self.kept, self.grown, self.dropped, self.added = (
+            make_product(code, selling_price=Decimal("1.00"), quantity=10, tax=Decimal("0"))
+            for code in ("KEPT", "GROWN", "DROPPED", "ADDED")
+        )
+
+    def quantities(self):
+        return {p.product_id: p.quantity for p in Product.objects.all()}
+
+    def sell(self, *lines):
+        self.client.post(reverse("sales_add"), sale_form(*lines))
+        return Sales.objects.latest("id")
+
+    def test_edit_moves_only_the_per_product_delta(self):
+        sale = self.sell((self.kept, 1), (self.grown, 2), (self.dropped, 3))
+        versions = dict(Product.objects.values_list("product_id", "version"))
+
+        self.client.post(reverse("sales_edit", args=[sale.pk]),
+                         sale_form((self.kept, 1), (self.grown, 5), (self.added, 4)))
+
+        self.assertEqual(self.quantities(), {"KEPT": 9, "GROWN": 5, "DROPPED": 10, "ADDED": 6})
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(reason="SALE_EDIT").values_list("product__product_id", "qty")),
+            [("ADDED", -4), ("DROPPED", 3), ("GROWN", -3)],
+        )
+        self.assertEqual(Product.objects.get(product_id="KEPT").version, versions["KEPT"])
+
+    def test_bulk_delete_puts_stock_back(self):
+        first = self.sell((self.kept, 1), (self.grown, 2))
+        second = self.sell((self.grown, 3))
+        kept = self.sell((self.dropped, 4))
+
+        self.client.post(reverse("sales_bulk_delete"), {"sale_ids": [first.pk, second.pk]})
+
+        self.assertEqual(list(Sales.objects.values_list("pk", flat=True)), [kept.pk])
+        self.assertFalse(SalesItem.objects.filter(sale_id__in=[first.pk, second.pk]).exists())
+        self.assertEqual(self.quantities(), {"KEPT": 10, "GROWN": 10, "DROPPED": 6, "ADDED": 10})
+
+    def test_bulk_delete_form_is_for_admins_only(self):
+        self.assertContains(self.client.get(reverse("sales_list")), 'id="bulk-delete-form"')
+
+        self.client.force_login(User.objects.create_user("cashier", password="pw"))
+        self.assertNotContains(self.client.get(reverse("sales_list")), 'id="bulk-delete-form"')
+
+
+class ImportSalesTests(TestCase):
+    def setUp(self):
+        make_product("P1", selling_price=Decimal("2.00"), tax=Decimal("0"))
+
+    def run_import(self, records, *args):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as fh:
+            fh.write("\n".join(json.dumps(r) for r in records))
+        self.addCleanup(os.remove, fh.name)
+        call_command("import_sales", fh.name, *args, stdout=StringIO(), stderr=StringIO())
+        return sorted(Sales.objects.values_list("invoice_no", "payment_status", "grand_total"))
+
+    def record(self, invoice, qty=1, **fields):
+        return {"invoice": invoice, "date": "2025-05-01", "product_id": "P1", "qty": qty, **fields}
+
+    def test_invoice_with_a_bad_record_is_skipped_whole(self):
+        imported = self.run_import([
+            self.record("A1"), self.record("A1", qty=-2), self.record("A1"),
+            self.record("B1", payment_status="credit"),
+            self.record("C1"), self.record("C1", payment_status="PART"),
+        ], "--keep-invoice-no")
+
+        self.assertEqual(imported, [("B1", "CREDIT", Decimal("2.00"))])
+
+    def test_over_long_invoice_numbers_are_skipped_not_truncated(self):
+        long_a, long_b = "HIST-2019-0000000001-A", "HIST-2019-0000000001-B"
+        imported = self.run_import([self.record(long_a), self.record(long_b), self.record("B1")],
+                                   "--keep-invoice-no")
+
+        self.assertEqual([invoice for invoice, _, _ in imported], ["B1"])
+
+
+class ReorderSuggestionTests(TestCase):
+    def setUp(self):
+        Supplier.objects.create(supplier_name="Acme", phone="1")
+        self.fast = make_product("FAST", quantity=2, reorder_level=5, supplier_name="acme", cost_price=Decimal("1.50"))
+        self.slow = make_product("SLOW", quantity=100, reorder_level=5, supplier_name="Acme")
+        self.today = date(2026, 5, 31)
+        sale = Sales.objects.create(invoice_no="INV-1", date=self.today - timedelta(days=10))
+        SalesItem.objects.create(sale=sale, product=self.fast, qty=30, price=Decimal("2.00"))
+
+    def test_fast_seller_below_its_reorder_point_is_suggested(self):
+        s = suggest(today=self.today)
+
+        # (30/30 + 30/90 + 30/365) / 3 units a day, stock for 7 + 30 days
+        self.assertEqual((s["product_id"], s["qty"], s["scanned"]), ([self.fast.pk], [16], 2))
+        self.assertAlmostEqual(s["daily_sales"][0], 0.4718, places=4)
+        self.assertAlmostEqual(s["days_of_cover"][0], 4.24, places=2)
+
+    def test_drafts_are_grouped_by_supplier(self):
+        stats = generate_draft_orders(today=self.today)
 
-# Create your tests here.
+        order = PurchaseOrder.objects.get()
+        self.assertEqual((stats["orders"], stats["unassigned"]), (1, 0))
+        self.assertEqual(order.supplier.supplier_name, "Acme")
+        self.assertEqual(order.total, Decimal("24.00"))
@@ -1,8 +1,10 @@
-from datetime import timedelta
-import random ,csv ,json ,os
-from io import BytesIO
+from datetime import date, timedelta
+import hashlib, random ,csv ,json ,os ,tempfile
+from io import BytesIO, TextIOWrapper
 from django.views import View
-from django.db.models import Sum
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.db.models import Count, Max, Sum
 from .forms import SubCategoryFormSet
 from .forms import SalesItemFormset
 from django.shortcuts import render, redirect, get_object_or_404
@@ -15,7 +17,7 @@ from django.contrib.auth import (
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.forms import PasswordChangeForm
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, FileResponse
 from django.db import transaction
 from django.contrib.admin.models import LogEntry
 try:
@@ -27,15 +29,33 @@ except Exception:
 # Local imports
 from .models import (
     Supplier, Product, Category, SubCategory,
-    Purchase, PurchaseItem,Sales, SalesItem,Customer,LoginOTP, PasswordResetOTP
+    Purchase, PurchaseItem,Sales, SalesItem,Customer,LoginOTP, PasswordResetOTP,
+    PriceRevision
 )
 from django.forms import inlineformset_factory
 from .forms import (
     RequestOTPForm, VerifyOTPForm, ResetPasswordForm, SubCategoryForm,
     UserForm, ProductForm, SupplierForm, CategoryForm,PurchaseForm, PurchaseItemFormSet,
-    SalesForm, SalesItemForm
+    SalesForm, SalesItemForm, PriceRevisionForm, PurchaseSearchForm
 )
 from .utils import create_otp_for_user, send_otp_email, generate_transaction_no
+from .catalog import scan
+from .datatable import RESOURCES as TABLE_RESOURCES, table_page
+from .idempotency import idempotent
+from .outbox import enqueue_sale, queued_ingestion_enabled, sale_status
+from .pricing import ZERO, as_decimal, price_purchase_items
+from .price_revision import apply_revision, preview_revision
+from .pagination import paginate
+from .payables import aging_report, aging_totals
+from .product_import import ImportFileError, ProductImporter
+from .search import search_products
+from .sequences import next_invoice_no
+from .services import (
+    PostingError, delete_purchase, delete_sales, parse_sale_header, parse_sale_lines,
+    post_sale, purchase_qty_by_product, receipt_prior_costs, receive_purchase, reconcile_purchase_stock,
+    record_movement, record_prior_costs, restore_cost_prices, update_cost_prices, update_sale
+)
+from .stock import low_stock_counts, low_stock_page
 
 User = get_user_model()
 
@@ -48,23 +68,6 @@ def admin_only(user):
     return user.is_superuser
 
 
-def calc_purchase_totals_from_formset(formset):
-    """Return subtotal computed by formset if set by BasePurchaseItemFormSet."""
-    return getattr(formset, "subtotal", 0)
-
-
-def compute_grand_and_balance(subtotal, discount_total, tax_total, other_charges, amount_paid):
-    subtotal = subtotal or 0
-    discount_total = discount_total or 0
-    tax_total = tax_total or 0
-    other_charges = other_charges or 0
-    amount_paid = amount_paid or 0
-
-    grand_total = subtotal - discount_total + tax_total + other_charges
-    balance = max(grand_total - amount_paid, 0)
-    return grand_total, balance
-
-
 # ---------------------------
 # AUTH: login / logout
 # ---------------------------
@@ -161,6 +164,7 @@ def admin_home(request):
     total_users = User.objects.filter(is_superuser=False).count()
     total_suppliers = Supplier.objects.count()
     total_products = Product.objects.count()
+    stock_alerts = low_stock_counts()
 
     # ======== NEW ANALYTICS DATA ========
     # Group Sales by date
@@ -187,6 +191,8 @@ def admin_home(request):
         "total_users": total_users,
         "total_suppliers": total_suppliers,
         "total_products": total_products,
+        "low_stock": stock_alerts["low_stock"],
+        "out_of_stock": stock_alerts["out_of_stock"],
 
         # chart data
         "sales_labels": sales_labels,
@@ -199,11 +205,18 @@ def admin_home(request):
 # User Management (admin)
 # ---------------------------
 
+USER_SORTS = {"username": "username", "id": "id"}
+
+
 @user_passes_test(admin_only)
 @login_required
 def users_list(request):
-    users = User.objects.filter(is_staff=True, is_superuser=False).order_by("username")
-    return render(request, "users_list.html", {"users": users})
+    users = User.objects.filter(is_staff=True, is_superuser=False)
+    try:
+        page = paginate(request, users, USER_SORTS, "username")
+    except ValueError:
+        return redirect("users_list")
+    return render(request, "users_list.html", {"users": page["rows"], "page": page})
 
 
 @user_passes_test(admin_only)
@@ -250,10 +263,16 @@ def delete_user(request, user_id):
 # Supplier CRUD
 # ---------------------------
 
+SUPPLIER_SORTS = {"name": "supplier_name", "id": "id"}
+
+
 @login_required
 def supplier_list(request):
-    suppliers = Supplier.objects.all()
-    return render(request, "supplier_list.html", {"suppliers": suppliers})
+    try:
+        page = paginate(request, Supplier.objects.all(), SUPPLIER_SORTS, "name")
+    except ValueError:
+        return redirect("supplier_list")
+    return render(request, "supplier_list.html", {"suppliers": page["rows"], "page": page})
 
 
 @login_required
@@ -291,6 +310,37 @@ def supplier_delete(request, supplier_id):
     return render(request, "supplier_confirm_delete.html", {"supplier": supplier})
 
 
+def _as_of(request):
+    try:
+        return date.fromisoformat(request.GET["as_of"])
+    except (KeyError, ValueError):
+        return timezone.localdate()
+
+
+@login_required
+@user_passes_test(admin_only)
+def supplier_payables(request):
+    """Outstanding payables per supplier with 0-30/31-60/61-90/90+ day aging."""
+    as_of = _as_of(request)
+    rows = aging_report(as_of)
+    return render(request, "supplier_payables.html", {
+        "rows": rows, "totals": aging_totals(rows), "as_of": as_of,
+    })
+
+
+@login_required
+@user_passes_test(admin_only)
+def supplier_payables_json(request):
+    """The same as JSON; ?supplier=<id> narrows it to one supplier."""
+    as_of = _as_of(request)
+    try:
+        supplier_id = int(request.GET["supplier"]) if request.GET.get("supplier") else None
+    except ValueError:
+        return JsonResponse({"error": "Invalid supplier"}, status=400)
+    rows = aging_report(as_of, supplier_id)
+    return JsonResponse({"as_of": as_of, "results": rows, "totals": aging_totals(rows)})
+
+
 # ---------------------------
 # Category / SubCategory
 # ---------------------------
@@ -434,10 +484,17 @@ def subcategory_delete(request, pk):
 # Product CRUD & Ajax
 # ---------------------------
 
+PRODUCT_SORTS = {"name": "name", "code": "product_id", "id": "id"}
+
+
 @login_required
 def product_list(request):
-    products = Product.objects.select_related("category", "subcategory").all()
-    return render(request, "product_list.html", {"products": products})
+    products = Product.objects.select_related("category", "subcategory")
+    try:
+        page = paginate(request, products, PRODUCT_SORTS, "name")
+    except ValueError:
+        return redirect("product_list")
+    return render(request, "product_list.html", {"products": page["rows"], "page": page})
 
 
 @login_required
@@ -451,7 +508,9 @@ def product_add(request):
 
         # Normal save
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                product = form.save()
+                record_movement(product.pk, product.quantity, "OPENING")
             return redirect("product_list")
 
     else:
@@ -460,6 +519,76 @@ def product_add(request):
     return render(request, "product_add_edit.html", {"form": form})
 
 
+@login_required
+@user_passes_test(admin_only)
+def product_import(request):
+    """
+    Upload a CSV or XLSX price list (see product_import.py). Rejected rows
+    come back as a CSV report download; otherwise back to the product list.
+    """
+    upload = request.FILES.get("file")
+    if request.method != "POST" or not upload:
+        messages.error(request, "Choose a CSV or XLSX file to import.")
+        return redirect("product_list")
+
+    fmt = "xlsx" if upload.name.lower().endswith((".xlsx", ".xlsm")) else "csv"
+    fh = upload.open("rb")
+    if fmt == "csv":
+        fh = TextIOWrapper(fh, encoding="utf-8-sig", newline="")
+
+    report = tempfile.TemporaryFile()
+    writer = TextIOWrapper(report, encoding="utf-8", newline="")
+    try:
+        stats = ProductImporter(writer).run(fh, fmt)
+    except ImportFileError as exc:
+        writer.close()
+        messages.error(request, f"Import failed: {exc}")
+        return redirect("product_list")
+
+    summary = (
+        f"{stats['created']} products created, {stats['updated']} updated, "
+        f"{stats['unchanged']} unchanged, {stats['errors']} rows rejected."
+    )
+    if not stats["errors"]:
+        writer.close()
+        messages.success(request, summary)
+        return redirect("product_list")
+
+    messages.warning(request, summary + " See the downloaded error report.")
+    writer.detach()   # keep the binary file open for the response
+    report.seek(0)
+    return FileResponse(report, as_attachment=True, filename="product-import-errors.csv",
+                        content_type="text/csv")
+
+
+@login_required
+@user_passes_test(admin_only)
+def price_revision(request):
+    """
+    Bulk selling-price change. "Preview" shows how many products the
+    filters and rule would reprice; "Apply" runs it (see price_revision.py).
+    """
+    form = PriceRevisionForm(request.POST or None)
+    preview = None
+
+    if request.method == "POST" and form.is_valid():
+        data = form.cleaned_data
+        filters = {k: data[k] for k in ("category", "subcategory", "brand", "status")}
+        if "apply" in request.POST:
+            revision = apply_revision(data["rule"], data["value"], user=request.user,
+                                      note=data["note"], **filters)
+            messages.success(request, f"Selling price revised on {revision.products} products.")
+            return redirect("price_revision")
+        preview = preview_revision(data["rule"], data["value"], **filters)
+
+    revisions = PriceRevision.objects.select_related(
+        "category", "subcategory", "created_by"
+    ).order_by("-created_at")[:20]
+    return render(request, "price_revision.html", {
+        "form": form, "preview": preview, "revisions": revisions,
+    })
+
+
 def get_subcategories(request):
     category_id = request.GET.get("category_id")
     subcats = SubCategory.objects.filter(category_id=category_id)
@@ -468,6 +597,74 @@ def get_subcategories(request):
     return JsonResponse({"SubCategories": data})
 
 
+SCAN_FIELDS = ("id", "product_id", "barcode", "name", "selling_price", "discount", "tax", "quantity", "status")
+
+
+@login_required
+def product_scan_json(request):
+    """Scanner lookup: ?code=<product_id or barcode> -> price, tax, discount and stock."""
+    entry = scan(request.GET.get("code", ""))
+    if entry is None:
+        return JsonResponse({"error": "Unknown product code"}, status=404)
+    return JsonResponse({field: getattr(entry, field) for field in SCAN_FIELDS})
+
+
+@login_required
+@cache_control(private=True, max_age=60)
+def product_search_json(request):
+    """
+    Typeahead: ?q=<text>&limit=<n> -> best matching products first. Backs
+    the product picker of the sale and purchase forms; answers may be
+    reused by the browser for a minute (stock figures are only a hint).
+    """
+    try:
+        limit = min(max(int(request.GET.get("limit", 20)), 1), 50)
+    except ValueError:
+        limit = 20
+    return JsonResponse({"results": search_products(request.GET.get("q", ""), limit)})
+
+
+@login_required
+def low_stock_json(request):
+    """
+    Paginated reorder candidates: ?after=<quantity>:<id>&limit=<n>.
+    Pass back the `next` value of one page to get the following one.
+    """
+    after = None
+    if request.GET.get("after"):
+        try:
+            qty, pk = request.GET["after"].split(":")
+            after = (int(qty), int(pk))
+        except ValueError:
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
+    try:
+        limit = min(max(int(request.GET.get("limit", 50)), 1), 200)
+    except ValueError:
+        limit = 50
+
+    rows, next_cursor = low_stock_page(after, limit)
+    return JsonResponse({
+        "results": rows,
+        "next": f"{next_cursor[0]}:{next_cursor[1]}" if next_cursor else None,
+        **low_stock_counts(),
+    })
+
+
+@login_required
+def datatable_json(request, resource):
+    """
+    Server-side data table for products, suppliers, sales or purchases:
+    ?columns=a,b &sort=[-]key &limit=<n> &after=<cursor> plus the
+    resource's filters (see datatable.RESOURCES).
+    """
+    if resource not in TABLE_RESOURCES:
+        return JsonResponse({"error": f"Unknown table {resource!r}"}, status=404)
+    try:
+        return JsonResponse(table_page(resource, request.GET))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+
 
 @login_required
 def product_edit(request, pk):
@@ -494,21 +691,99 @@ def product_delete(request, pk):
 # ---------------------------
 # Purchases (list, add, edit, delete)
 # ---------------------------
-def purchase_list(request):
-    search = request.GET.get("search", "")
+PURCHASES_PER_PAGE = 50
+PURCHASE_SORTS = {"date": "date", "number": "purchase_no"}
 
-    purchases = Purchase.objects.all().order_by("-id")
 
-    if search:
-        purchases = purchases.filter(invoice_number__icontains=search)
+@login_required
+def purchase_list(request):
+    """
+    Purchases newest first, 50 per page, filtered by PurchaseSearchForm.
+    Pages are keyset-paginated (see pagination.paginate) on (date, id) or
+    purchase_no, so deep pages cost the same as page 1.
+    """
+    search = PurchaseSearchForm(request.GET)
+    purchases = Purchase.objects.select_related("supplier")
+    if search.is_valid():
+        purchases = search.filter(purchases)
+    else:
+        purchases = purchases.none()
+
+    try:
+        page = paginate(request, purchases, PURCHASE_SORTS, "-date", PURCHASES_PER_PAGE)
+    except ValueError:
+        return redirect("purchase_list")
 
     context = {
         "title": "Purchase List",
-        "purchases": purchases,
+        "purchases": page["rows"],
         "search": search,
+        "page": page,
     }
     return render(request, "purchase_list.html", context)
 
+# ---------------------------
+# Line items on demand
+# ---------------------------
+# The list pages render headers only; their detail modals fetch the lines
+# from here when opened. Responses carry an ETag built from the header and
+# an aggregate over the lines (one small query), with Cache-Control
+# no-cache, so the browser revalidates and an unchanged document is a 304
+# without loading its items.
+
+def _etag(row):
+    return None if row is None else hashlib.md5(repr(tuple(row)).encode()).hexdigest()
+
+
+def _sale_items_etag(request, pk):
+    return _etag(
+        Sales.objects.filter(pk=pk)
+        .annotate(n=Count("items"), last=Max("items__id"), q=Sum("items__qty"), t=Sum("items__total"))
+        .values_list("invoice_no", "grand_total", "n", "last", "q", "t")
+        .first()
+    )
+
+
+def _purchase_items_etag(request, pk):
+    return _etag(
+        Purchase.objects.filter(pk=pk)
+        .annotate(n=Count("items"), last=Max("items__id"), q=Sum("items__qty"), t=Sum("items__line_total"),
+                  c=Sum("items__landed_cost"))
+        .values_list("purchase_no", "grand_total", "n", "last", "q", "t", "c")
+        .first()
+    )
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_sale_items_etag)
+def sale_items_json(request, pk):
+    sale = get_object_or_404(Sales.objects.only("invoice_no"), pk=pk)
+    items = (
+        sale.items.select_related("product").order_by("id")
+        .values("product__name", "qty", "price", "discount", "tax", "total")
+    )
+    return JsonResponse({
+        "invoice_no": sale.invoice_no,
+        "items": [{"product": i.pop("product__name"), **i} for i in items],
+    })
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_purchase_items_etag)
+def purchase_items_json(request, pk):
+    purchase = get_object_or_404(Purchase.objects.only("purchase_no"), pk=pk)
+    items = (
+        purchase.items.select_related("product").order_by("id")
+        .values("product__name", "qty", "unit_price", "discount", "tax", "charges", "landed_cost", "line_total")
+    )
+    return JsonResponse({
+        "purchase_no": purchase.purchase_no,
+        "items": [{"product": i.pop("product__name"), **i} for i in items],
+    })
+
+
 @transaction.atomic
 @login_required
 
@@ -546,63 +821,107 @@ def product_detail_json(request, pk):
     return JsonResponse(data)
 
 
+@login_required
+@idempotent
 def purchase_add(request):
-
+    """
+    Goods receipt: the header and every line are validated together, then
+    services.receive_purchase() posts lines, stock and cost prices in one
+    transaction.
+    """
     if request.method == 'POST':
         form = PurchaseForm(request.POST)
+        formset = PurchaseItemFormSet(request.POST, instance=Purchase())
 
-        if form.is_valid():
-            purchase = form.save()                     # Save purchase
-            create_purchase_transaction(purchase)      # Auto-generate transaction
-            return redirect('purchase_list')
-
+        if form.is_valid() and formset.is_valid():
+            items = [
+                f.instance for f in formset.forms
+                if f.has_changed() and not f.cleaned_data.get("DELETE")
+            ]
+            if items:
+                purchase = receive_purchase(form.save(commit=False), items)
+                messages.success(request, f"Purchase {purchase.purchase_no} received: {len(items)} items.")
+                return redirect('purchase_list')
+            messages.error(request, "Add at least one item.")
+        else:
+            messages.error(request, "Please fix the errors below.")
     else:
         form = PurchaseForm()
-
-    products = Product.objects.filter(status='active').order_by('name')
-    suppliers = Supplier.objects.all().order_by('supplier_name')
+        formset = PurchaseItemFormSet(instance=Purchase())
 
     return render(request, 'purchase_add_edit.html', {
         'form': form,
-        'products': products,
-        'suppliers': suppliers,
+        'formset': formset,
+        'suppliers': Supplier.objects.all().order_by('supplier_name'),
     })
 
 
-@transaction.atomic
+# header fields a purchase without lines keeps on edit
+HEADER_TOTALS = ("subtotal", "discount_total", "tax_total", "other_charges", "grand_total")
+
+
 @login_required
+@idempotent
+@transaction.atomic
 def purchase_edit(request, pk):
     purchase = get_object_or_404(Purchase, pk=pk)
     if request.method == "POST":
+        # header-only purchases (entered before line items were recorded)
+        # have nothing to price; their stored totals are kept as they are
+        had_lines = purchase.items.exists()
+        stored = {field: getattr(purchase, field) for field in HEADER_TOTALS}
         form = PurchaseForm(request.POST, instance=purchase)
         formset = PurchaseItemFormSet(request.POST, instance=purchase)
         if form.is_valid() and formset.is_valid():
             purchase_obj = form.save(commit=False)
 
-            subtotal = calc_purchase_totals_from_formset(formset)
-            purchase_obj.subtotal = subtotal
-
-            grand_total, balance = compute_grand_and_balance(
-                subtotal,
-                purchase_obj.discount_total,
-                purchase_obj.tax_total,
-                purchase_obj.other_charges,
-                purchase_obj.amount_paid
-            )
-            purchase_obj.grand_total = grand_total
-            purchase_obj.balance = balance
-
-            purchase_obj.save()
-            formset.save()
-            messages.success(request, "Purchase updated successfully.")
-            return redirect("purchase_list")
-
-        messages.error(request, "Please fix the errors below.")
+            items = [
+                f.instance for f in formset.forms
+                if f.cleaned_data and not f.cleaned_data.get("DELETE")
+            ]
+            if items:
+                # totals are always recomputed server-side from the line items
+                totals = price_purchase_items(
+                    items, purchase_obj.other_charges, purchase_obj.amount_paid, purchase_obj.cost_allocation,
+                )
+            elif not had_lines:
+                totals = {
+                    **stored,
+                    "balance": max(stored["grand_total"] - as_decimal(purchase_obj.amount_paid), ZERO),
+                }
+            else:
+                totals = None
+
+            if totals is not None:
+                for field, value in totals.items():
+                    setattr(purchase_obj, field, value)
+
+                received_before = purchase_qty_by_product(purchase.pk)
+                priors = receipt_prior_costs(purchase.pk)
+                record_prior_costs(items, purchase.pk)
+                purchase_obj.save()
+                formset.save()
+                reconcile_purchase_stock(purchase_obj, received_before)
+                PurchaseItem.objects.bulk_update(items, ["line_total", "charges", "landed_cost"])
+                update_cost_prices(items, purchase_obj.pk)
+                # products whose lines were removed lose this receipt's cost
+                removed = received_before.keys() - {item.product_id for item in items}
+                restore_cost_prices(purchase_obj.pk, {pid: priors.get(pid) for pid in removed})
+                messages.success(request, "Purchase updated successfully.")
+                return redirect("purchase_list")
+            messages.error(request, "Add at least one item.")
+        else:
+            messages.error(request, "Please fix the errors below.")
     else:
         form = PurchaseForm(instance=purchase)
-        formset = PurchaseItemFormSet(instance=purchase)
+        formset = PurchaseItemFormSet(instance=purchase, queryset=purchase.items.select_related("product"))
 
-    return render(request, "purchase_add_edit.html", {"form": form, "formset": formset, "title": "Edit Purchase"})
+    return render(request, "purchase_add_edit.html", {
+        "form": form,
+        "formset": formset,
+        "title": "Edit Purchase",
+        "suppliers": Supplier.objects.all().order_by("supplier_name"),
+    })
 
 
 @transaction.atomic
@@ -610,7 +929,7 @@ def purchase_edit(request, pk):
 def purchase_delete(request, pk):
     purchase = get_object_or_404(Purchase, pk=pk)
     if request.method == "POST":
-        purchase.delete()
+        delete_purchase(purchase)
         messages.success(request, "Purchase deleted.")
         return redirect("purchase_list")
     return render(request, "purchase_confirm_delete.html", {"purchase": purchase})
@@ -627,139 +946,90 @@ from .forms import SalesForm, SalesItemFormset
 from django.http import HttpResponse
 
 def generate_invoice_no():
-    last_sale = Sales.objects.order_by("id").last()
-    if not last_sale:
-        return "INV-0001"
-    try:
-        last_no = int(last_sale.invoice_no.split("-")[1])
-    except Exception:
-        last_no = last_sale.id
-    return f"INV-{last_no + 1:04d}"
+    """Next invoice number from the InvoiceSequence table (see sequences.py)."""
+    return next_invoice_no()
+
+@transaction.atomic
+def submit_sale(request):
+    """
+    Post the sale in request.POST, or append it to the outbox when
+    SALES_INGESTION_MODE is "queued". Returns the reserved invoice number.
+    A PostingError rolls the number's reservation back with the sale.
+    """
+    header = parse_sale_header(request.POST)
+    lines = parse_sale_lines(request.POST)
+    invoice_no = generate_invoice_no()
+
+    if queued_ingestion_enabled():
+        enqueue_sale(header, lines, invoice_no, user=request.user)
+        messages.success(request, f"Sale {invoice_no} received and queued for posting.")
+    else:
+        post_sale(header, lines, invoice_no=invoice_no)
+    return invoice_no
+
+
+@login_required
+def sale_status_json(request, invoice_no):
+    status = sale_status(invoice_no)
+    if status is None:
+        return JsonResponse({"error": "Unknown invoice"}, status=404)
+    return JsonResponse(status)
+
+
+SALES_SORTS = {"id": "id", "invoice": "invoice_no"}
+
 
 @login_required
 def sales_list(request):
-    sales = Sales.objects.all().order_by("-id")
-    return render(request, "sales_list.html", {"sales": sales})
+    try:
+        page = paginate(request, Sales.objects.all(), SALES_SORTS, "-id")
+    except ValueError:
+        return redirect("sales_list")
+    return render(request, "sales_list.html", {"sales": page["rows"], "page": page})
 
 
 @login_required
+@idempotent
 @transaction.atomic
 def sales_add(request):
     if request.method == "POST":
-
-        customer_name = request.POST.get("customer_name")
-        date = request.POST.get("date")
-
-        subtotal = float(request.POST.get("subtotal") or 0)
-        totaltax = float(request.POST.get("totaltax") or 0)
-        grandtotal = float(request.POST.get("grandtotal") or 0)
-
-        # create sale
-        sale = Sales.objects.create(
-            invoice_no = generate_invoice_no(),
-            customer_name = customer_name,
-            date = date,
-            subtotal = subtotal,
-            total_tax = totaltax,
-            grand_total = grandtotal,
-        )
-
-        # get item lists
-        products = request.POST.getlist("product[]")
-        qtys = request.POST.getlist("qty[]")
-        prices = request.POST.getlist("price[]")
-        discounts = request.POST.getlist("discount[]")
-        taxes = request.POST.getlist("tax[]")
-        totals = request.POST.getlist("total[]")
-
-        # loop through rows
-        for p, q, pr, d, t, tot in zip(products, qtys, prices, discounts, taxes, totals):
-            if p == "":
-                continue  # skip empty rows
-
-            product = Product.objects.get(id=p)
-
-            SalesItem.objects.create(
-                sale=sale,
-                product=product,
-                qty=int(q or 0),
-                price=float(pr or 0),
-                discount=float(d or 0),
-                tax=float(t or 0),
-                total=float(tot or 0),
-            )
-
-            # update stock
-            product.quantity -= int(q)
-            product.save()
-
-        # 🔥 AUTO CREATE SALE ACCOUNTING TRANSACTION
-        create_sales_transaction(sale)
+        try:
+            submit_sale(request)
+        except PostingError as exc:
+            messages.error(request, str(exc))
+            return redirect("sales_add")
 
         return redirect("sales_list")
 
     # GET request
     return render(request, "sales_add_edit.html", {
-        "products": Product.objects.all(),
         "today": timezone.now().date(),
     })
 
 
+@login_required
+@idempotent
+@transaction.atomic
 def sales_edit(request, pk):
-    sale = Sales.objects.get(id=pk)
-    items = sale.items.all()
+    sale = get_object_or_404(Sales, pk=pk)
 
     if request.method == "POST":
-        # Same saving structure as sales_add
-        customer_name = request.POST.get("customer_name")
-        date = request.POST.get("date")
-
-        subtotal = request.POST.get("subtotal") or 0
-        totaltax = request.POST.get("totaltax") or 0
-        grandtotal = request.POST.get("grandtotal") or 0
-
-        # Update sale
-        sale.customer_name = customer_name
-        sale.date = date
-        sale.subtotal = subtotal
-        sale.total_tax = totaltax
-        sale.grand_total = grandtotal
-        sale.save()
-
-        # Delete old items (clean update)
-        sale.items.all().delete()
-
-        # Recreate item rows
-        products = request.POST.getlist("product[]")
-        qtys = request.POST.getlist("qty[]")
-        prices = request.POST.getlist("price[]")
-        discounts = request.POST.getlist("discount[]")
-        taxes = request.POST.getlist("tax[]")
-        totals = request.POST.getlist("total[]")
-
-        for p, q, pr, d, t, tot in zip(products, qtys, prices, discounts, taxes, totals):
-            if p == "":
-                continue
-
-            product = Product.objects.get(id=p)
-
-            SalesItem.objects.create(
-                sale=sale,
-                product=product,
-                qty=q,
-                price=pr,
-                discount=d,
-                tax=t,
-                total=tot,
+        try:
+            update_sale(
+                sale,
+                parse_sale_header(request.POST),
+                parse_sale_lines(request.POST),
             )
+        except PostingError as exc:
+            messages.error(request, str(exc))
+            return redirect("sales_edit", pk=sale.pk)
 
         return redirect("sales_list")
 
     return render(request, "sales_add_edit.html", {
         "edit_mode": True,
         "sale": sale,
-        "items": items,
-        "products": Product.objects.all(),
+        "items": sale.items.select_related("product"),
         "today": sale.date,
     })
 
@@ -770,17 +1040,30 @@ def sales_edit(request, pk):
 def sales_delete(request, pk):
     sale = get_object_or_404(Sales, pk=pk)
 
-    # restore stock before deleting
-    for item in sale.items.all():
-        product = item.product
-        product.quantity += item.qty
-        product.save()
-
-    sale.delete()
+    # restores stock for all lines in one UPDATE
+    delete_sales([sale.pk])
     messages.success(request, "Sale deleted successfully.")
     return redirect("sales_list")
 
 
+@user_passes_test(admin_only)
+@login_required
+@transaction.atomic
+def sales_bulk_delete(request):
+    """Delete many sales at once (e.g. voiding a shift), restoring stock."""
+    if request.method != "POST":
+        return redirect("sales_list")
+
+    ids = [int(i) for i in request.POST.getlist("sale_ids") if i.isdigit()]
+    if not ids:
+        messages.error(request, "No sales selected.")
+        return redirect("sales_list")
+
+    deleted = delete_sales(ids)
+    messages.success(request, f"Deleted {deleted} sale{'s' if deleted != 1 else ''} and restored stock.")
+    return redirect("sales_list")
+
+
 # ---------------------------
 # Admin logs (kept here by request)
 # ---------------------------
@@ -810,128 +1093,55 @@ def user_home(request):
 
 @login_required
 def user_sales_list(request):
-    sales = Sales.objects.all().order_by("-id")
-    return render(request, "user_sales_list.html", {"sales": sales})
+    try:
+        page = paginate(request, Sales.objects.all(), SALES_SORTS, "-id")
+    except ValueError:
+        return redirect("user_sales_list")
+    return render(request, "user_sales_list.html", {"sales": page["rows"], "page": page})
 
 
 @login_required
+@idempotent
 @transaction.atomic
 def user_sales_add(request):
     if request.method == "POST":
-
-        customer_name = request.POST.get("customer_name")
-        date = request.POST.get("date")
-
-        subtotal = float(request.POST.get("subtotal") or 0)
-        totaltax = float(request.POST.get("totaltax") or 0)
-        grandtotal = float(request.POST.get("grandtotal") or 0)
-
-        # create sale
-        sale = Sales.objects.create(
-            invoice_no = generate_invoice_no(),
-            customer_name = customer_name,
-            date = date,
-            subtotal = subtotal,
-            total_tax = totaltax,
-            grand_total = grandtotal,
-        )
-
-        # get item lists
-        products = request.POST.getlist("product[]")
-        qtys = request.POST.getlist("qty[]")
-        prices = request.POST.getlist("price[]")
-        discounts = request.POST.getlist("discount[]")
-        taxes = request.POST.getlist("tax[]")
-        totals = request.POST.getlist("total[]")
-
-        # loop through rows
-        for p, q, pr, d, t, tot in zip(products, qtys, prices, discounts, taxes, totals):
-            if p == "":
-                continue  # skip empty rows
-
-            product = Product.objects.get(id=p)
-
-            SalesItem.objects.create(
-                sale=sale,
-                product=product,
-                qty=int(q or 0),
-                price=float(pr or 0),
-                discount=float(d or 0),
-                tax=float(t or 0),
-                total=float(tot or 0),
-            )
-
-            # update stock
-            product.quantity -= int(q)
-            product.save()
-
-        # 🔥 AUTO CREATE SALE ACCOUNTING TRANSACTION
-        create_sales_transaction(sale)
+        try:
+            submit_sale(request)
+        except PostingError as exc:
+            messages.error(request, str(exc))
+            return redirect("user_sales_add")
 
         return redirect("sales_list")
 
     # GET request
     return render(request, "user_sales_form.html", {
-        "products": Product.objects.all(),
         "today": timezone.now().date(),
     })
 
 
+@login_required
+@idempotent
+@transaction.atomic
 def user_sales_edit(request, pk):
-    sale = Sales.objects.get(id=pk)
-    items = sale.items.all()
+    sale = get_object_or_404(Sales, pk=pk)
 
     if request.method == "POST":
-        # Same saving structure as sales_add
-        customer_name = request.POST.get("customer_name")
-        date = request.POST.get("date")
-
-        subtotal = request.POST.get("subtotal") or 0
-        totaltax = request.POST.get("totaltax") or 0
-        grandtotal = request.POST.get("grandtotal") or 0
-
-        # Update sale
-        sale.customer_name = customer_name
-        sale.date = date
-        sale.subtotal = subtotal
-        sale.total_tax = totaltax
-        sale.grand_total = grandtotal
-        sale.save()
-
-        # Delete old items (clean update)
-        sale.items.all().delete()
-
-        # Recreate item rows
-        products = request.POST.getlist("product[]")
-        qtys = request.POST.getlist("qty[]")
-        prices = request.POST.getlist("price[]")
-        discounts = request.POST.getlist("discount[]")
-        taxes = request.POST.getlist("tax[]")
-        totals = request.POST.getlist("total[]")
-
-        for p, q, pr, d, t, tot in zip(products, qtys, prices, discounts, taxes, totals):
-            if p == "":
-                continue
-
-            product = Product.objects.get(id=p)
-
-            SalesItem.objects.create(
-                sale=sale,
-                product=product,
-                qty=q,
-                price=pr,
-                discount=d,
-                tax=t,
-                total=tot,
+        try:
+            update_sale(
+                sale,
+                parse_sale_header(request.POST),
+                parse_sale_lines(request.POST),
             )
+        except PostingError as exc:
+            messages.error(request, str(exc))
+            return redirect("user_sales_edit", pk=sale.pk)
 
         return redirect("user_sales_list")
 
     return render(request, "user_sales_form.html", {
         "edit_mode": True,
         "sale": sale,
-        "items": items,
-        "products": Product.objects.all(),
+        "items": sale.items.select_related("product"),
         "today": sale.date,
     })
 
@@ -942,13 +1152,8 @@ def user_sales_edit(request, pk):
 def user_sales_delete(request, pk):
     sale = get_object_or_404(Sales, pk=pk)
 
-    # restore stock before deleting
-    for item in sale.items.all():
-        product = item.product
-        product.quantity += item.qty
-        product.save()
-
-    sale.delete()
+    # restores stock for all lines in one UPDATE
+    delete_sales([sale.pk])
     messages.success(request, "Sale deleted successfully.")
     return redirect("user_sales_list")
 
@@ -96,6 +96,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'app.idempotency.idempotency_key',
             ],
         },
     },
@@ -111,6 +112,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # take the write lock when a transaction starts instead of
+            # upgrading from a read lock mid-way, which fails immediately
+            # with "database is locked" when another writer is active
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -169,4 +177,40 @@ MESSAGE_TAGS = {
     messages.ERROR: "danger",
 }
 
-AUTH_USER_MODEL = 'app.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'app.User'
+
+
+# Invoice numbering (app/sequences.py)
+# Numbers are reserved per worker process in blocks of this size. With 1,
+# numbering is gap-free: a sale that fails rolls its number back. Larger
+# blocks cut contention on the sequence row but leave gaps: each process
+# start skips what was left of its blocks (0001 -> 0021 -> 0041 with 20),
+# and a sale that fails after taking a cached number uses it up. Sales
+# queued through the outbox that end FAILED also keep their number.
+INVOICE_NUMBER_BLOCK_SIZE = 1
+FINANCIAL_YEAR_START_MONTH = 4   # April
+
+# Sale ingestion (app/outbox.py)
+# "sync"   - sales are posted inside the request
+# "queued" - sales are appended to SaleOutbox and committed in batches by
+#            `manage.py process_sale_outbox`
+SALES_INGESTION_MODE = "sync"
+SALE_OUTBOX_LEASE_SECONDS = 300
+SALE_OUTBOX_MAX_ATTEMPTS = 3
+SALE_OUTBOX_RETRY_SECONDS = 30   # first retry delay; doubles per attempt
+
+# Pricing (app/pricing.py)
+# When False, sale lines always use the product's price, discount and tax
+# and any values typed into the form are ignored.
+PRICING_ALLOW_LINE_OVERRIDES = True
+
+# Stock (app/services.py): attempts for transactions that hit a lock
+# timeout or deadlock before giving up; short stock is never retried.
+STOCK_CONFLICT_RETRIES = 3
+
+# Purchase and sale forms post five fields per line; Django's default of
+# 1000 fields would reject a goods receipt of more than ~200 lines.
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 10000
+
+# Idempotency keys (app/idempotency.py), purged by `manage.py purge_idempotency_keys`
+IDEMPOTENCY_KEY_TTL_HOURS = 24
@@ -43,6 +43,8 @@ urlpatterns = [
     path("suppliers/add/", views.supplier_add, name="supplier_add"),
     path("suppliers/edit/<int:supplier_id>/", views.supplier_edit, name="supplier_edit"),
     path("suppliers/delete/<int:supplier_id>/", views.supplier_delete, name="supplier_delete"),
+    path("suppliers/payables/", views.supplier_payables, name="supplier_payables"),
+    path("api/suppliers/payables/", views.supplier_payables_json, name="supplier_payables_json"),
 
 
     # -----------------------
@@ -51,9 +53,15 @@ urlpatterns = [
 
     path("products/", views.product_list, name="product_list"),
     path("products/add/", views.product_add, name="product_add"),
+    path("products/import/", views.product_import, name="product_import"),
+    path("products/price-revision/", views.price_revision, name="price_revision"),
     path("products/edit/<int:pk>/", views.product_edit, name="product_edit"),
     path("products/delete/<int:pk>/", views.product_delete, name="product_delete"),
     path("get-subcategories/", views.get_subcategories, name="get_subcategories"),
+    path("api/products/search/", views.product_search_json, name="product_search_json"),
+    path("api/products/scan/", views.product_scan_json, name="product_scan_json"),
+    path("api/products/low-stock/", views.low_stock_json, name="low_stock_json"),
+    path("api/table/<str:resource>/", views.datatable_json, name="datatable_json"),
 
    
     # -----------------------
@@ -76,6 +84,7 @@ urlpatterns = [
     path('api/product/<int:pk>/', views.product_detail_json, name='product_detail_json'),
     path("purchases/<int:pk>/edit/", views.purchase_edit, name="purchase_edit"),
     path("purchases/<int:pk>/delete/", views.purchase_delete, name="purchase_delete"),
+    path("api/purchases/<int:pk>/items/", views.purchase_items_json, name="purchase_items_json"),
 
 
     # -----------------------
@@ -86,6 +95,9 @@ urlpatterns = [
     path("sales/add/", views.sales_add, name="sales_add"),
     path("sales/<int:pk>/edit/", views.sales_edit, name="sales_edit"),
     path("sales/<int:pk>/delete/", views.sales_delete, name="sales_delete"),
+    path("sales/bulk-delete/", views.sales_bulk_delete, name="sales_bulk_delete"),
+    path("api/sales/status/<str:invoice_no>/", views.sale_status_json, name="sale_status_json"),
+    path("api/sales/<int:pk>/items/", views.sale_items_json, name="sale_items_json"),
     
 
 